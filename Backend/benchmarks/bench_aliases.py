@@ -0,0 +1,59 @@
+"""Alias rewrite (apply_phrase_matchers) latency against input length.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_aliases --sizes 100 1000 10000
+
+"clauses" rewrites each clause of the input on its own, as extraction does;
+"whole" rewrites the input as one text, as with CROSS_CLAUSE_MATCHING=1. A
+matcher hit scans the text rewritten so far, so only the first stays linear.
+"""
+import argparse
+import random
+import time
+
+from benchmarks.corpus import SAMPLES
+
+
+def build_input(nlp, n_tokens, seed=0):
+    rnd = random.Random(seed)
+    parts = []
+    count = 0
+    while count < n_tokens:
+        sample = rnd.choice(SAMPLES).rstrip(".")
+        parts.append(sample)
+        count += len(nlp.make_doc(sample))
+    return (". ".join(parts) + ".").lower()
+
+
+def best_time(rewrite, docs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for doc in docs:
+            rewrite(doc)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000, 3000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from src.components.app import nlp, apply_phrase_matchers, clause_texts
+
+    print(f"{'tokens':>8} {'regions':>8} {'mode':<8} {'rewrite ms':>11} {'us/token':>9}")
+    for size in args.sizes:
+        text = build_input(nlp, size)
+        whole = nlp(text)
+        clauses = list(nlp.pipe(clause_texts(text)))
+        regions = sum(len(apply_phrase_matchers(doc)[1]) for doc in clauses)
+        for mode, docs in [("clauses", clauses), ("whole", [whole])]:
+            best = best_time(apply_phrase_matchers, docs, args.repeat)
+            print(f"{len(whole):>8} {regions:>8} {mode:<8} {best * 1000:>11.2f} {best / len(whole) * 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
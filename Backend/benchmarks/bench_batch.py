@@ -0,0 +1,49 @@
+"""Throughput of parse_inputs_batch (nlp.pipe) against a parse_input_to_data loop.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_batch --size 2000 --batch-size 64 --n-process 1
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import build_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args()
+
+    # Default configuration, with a fresh clause memo
+    os.environ["CLAUSE_MEMO_DB"] = os.path.join(tempfile.mkdtemp(), "clause-memo.sqlite3")
+    from src.components.app import CLAUSE_MEMO, parse_input_to_data, parse_inputs_batch
+
+    corpus = build_corpus(args.size)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        looped = [parse_input_to_data(text) for text in corpus]
+        loop_time = time.perf_counter() - start
+
+        # The loop would otherwise have warmed the memo for the batch
+        if CLAUSE_MEMO is not None:
+            CLAUSE_MEMO.clear()
+        start = time.perf_counter()
+        batched = parse_inputs_batch(corpus, batch_size=args.batch_size, n_process=args.n_process)
+        batch_time = time.perf_counter() - start
+
+    assert batched == looped, "batch results differ from the single-request path"
+    print(f"inputs: {len(corpus)}")
+    print(f"loop:   {len(corpus) / loop_time:8.1f} inputs/s")
+    print(f"batch:  {len(corpus) / batch_time:8.1f} inputs/s  "
+          f"(batch_size={args.batch_size}, n_process={args.n_process}, {loop_time / batch_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Bulk CSV throughput: rows per minute through BulkCalculator, CSV in and out.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_bulk --rows 1000000 --chunk-rows 20000
+
+A synthetic tenant file (fleet kilometres by vehicle, meter kWh, cafeteria
+kilograms, spend) is written to a temporary file first; the timed part reads
+it, calculates and writes the results CSV. The first rows are also checked
+against ColumnarCalculator.calculate on the equivalent record dicts.
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import tempfile
+import time
+
+from src.components.bulk import BulkCalculator, RESULT_FIELDS
+from src.components.columnar import ColumnarCalculator
+from src.components.factors import load_registry
+
+FACTORS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "components", "factors.json")
+
+
+def write_file(path, rows, seed, factors):
+    rnd = random.Random(seed)
+    # A fleet/cafeteria-sized subset of the factor tables, plus one unknown food
+    modes, foods = factors.transport.names[:6], factors.food.names[:5] + ("mystery",)
+    header = (["id"] + [f"transport.{m}" for m in modes] + [f"food.{f}" for f in foods]
+              + ["electricity_kwh", "shopping_spend", "shopping_type", "water_liters"])
+    records = []
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for i in range(rows):
+            km = [round(rnd.uniform(0, 400), 1) if rnd.random() < 0.5 else "" for _ in modes]
+            kg = [round(rnd.uniform(0, 50), 2) if rnd.random() < 0.5 else "" for _ in foods]
+            kwh = round(rnd.uniform(0, 2000), 1)
+            spend = round(rnd.uniform(0, 50000)) if rnd.random() < 0.7 else ""
+            kind = rnd.choice(["clothes", "gadgets", "groceries", ""])
+            water = round(rnd.uniform(0, 5000)) if rnd.random() < 0.3 else ""
+            writer.writerow([f"site-{i}"] + km + kg + [kwh, spend, kind, water])
+            if i < 5000:
+                record = {
+                    "transport_data": {m: v for m, v in zip(modes, km) if v != ""},
+                    "food_data": {f: v for f, v in zip(foods, kg) if v != ""},
+                    "electricity_kwh": kwh,
+                    "shopping_spend": spend or 0,
+                    "water_liters": water or 0,
+                }
+                if kind:
+                    record["shopping_type"] = kind
+                records.append(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--chunk-rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    factors = load_registry(FACTORS_PATH)
+    directory = tempfile.mkdtemp()
+    source, target = os.path.join(directory, "records.csv"), os.path.join(directory, "results.csv")
+    records = write_file(source, args.rows, args.seed, factors)
+    print(f"input: {args.rows} rows, {os.path.getsize(source) / 1e6:.1f} MB")
+
+    bulk = BulkCalculator(factors, chunk_rows=args.chunk_rows)
+    started = time.perf_counter()
+    with open(source, encoding="utf-8-sig", newline="") as f, open(target, "w", newline="") as out:
+        schema, chunks = bulk.read_csv(f)
+        for text in bulk.iter_csv(schema, chunks):
+            out.write(text)
+    seconds = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(f"{bulk.rows} rows in {seconds:.2f} s: {bulk.rows / seconds * 60 / 1e6:.2f} M rows/min "
+          f"({bulk.rows / seconds:,.0f} rows/s), peak RSS {peak / 1e6:.1f} MB")
+
+    expected = ColumnarCalculator(factors).calculate(records)
+    mismatches = 0
+    with open(target, newline="") as f:
+        for i, row in zip(range(len(records)), csv.DictReader(f)):
+            want = expected.row(i)
+            got = {field: float(row[field]) for field in RESULT_FIELDS[:8]}
+            if any(got[field] != want.get(field, 0.0) for field in got) or int(row["trees_required"]) != want["trees_required"]:
+                mismatches += 1
+    print(f"checked {len(records)} rows against ColumnarCalculator.calculate: {mismatches} mismatches")
+    raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Clause memo: cold vs warm parse latency, and sharing between worker processes.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_clause_memo --size 300 --repeat 2
+
+Uses a fresh memo file. Results with the memo (cold and warm) are compared
+with the plain pipeline and the run exits non-zero on any difference. A
+second process then parses the same corpus against the file the first one
+filled, the way another gunicorn worker would.
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import build_corpus
+
+
+def timed_parse(app, corpus):
+    results, seconds = [], []
+    for text in corpus:
+        start = time.perf_counter()
+        results.append(app.parse_input_to_data(text))
+        seconds.append(time.perf_counter() - start)
+    return results, seconds
+
+
+def summary(seconds):
+    ms = sorted(s * 1000 for s in seconds)
+    return f"mean {statistics.mean(ms):7.2f} ms  p50 {ms[len(ms) // 2]:7.2f}  p95 {ms[int(len(ms) * 0.95)]:7.2f}"
+
+
+def other_worker(corpus, queue):
+    from src.components import app
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.parse_input_to_data(corpus[0])
+        app.CLAUSE_MEMO.hits = app.CLAUSE_MEMO.misses = 0
+        _, seconds = timed_parse(app, corpus)
+    queue.put((summary(seconds), app.CLAUSE_MEMO.stats()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("WARMUP", "0")
+    os.environ["CLAUSE_MEMO_DB"] = os.path.join(tempfile.mkdtemp(), "clause-memo.sqlite3")
+    from src.components import app
+
+    corpus = build_corpus(args.size, args.seed)
+    memo = app.CLAUSE_MEMO
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.CLAUSE_MEMO = None
+        app.parse_input_to_data(corpus[0])  # warm up
+        plain, plain_seconds = timed_parse(app, corpus)
+        app.CLAUSE_MEMO = memo
+        memo.clear()
+        cold, cold_seconds = timed_parse(app, corpus)
+        warm_seconds = []
+        for _ in range(args.repeat):
+            warm, seconds = timed_parse(app, corpus)
+            warm_seconds.extend(seconds)
+
+    mismatches = sum(a != b for a, b in zip(plain, cold)) + sum(a != b for a, b in zip(plain, warm))
+    print(f"inputs: {len(corpus)}, memo rows: {memo.stats()['size']}")
+    print(f"no memo:     {summary(plain_seconds)}")
+    print(f"memo (cold): {summary(cold_seconds)}")
+    print(f"memo (warm): {summary(warm_seconds)}")
+
+    # Another worker process starts with an empty PARSE_CACHE but the shared file
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    worker = ctx.Process(target=other_worker, args=(corpus, queue))
+    worker.start()
+    line, stats = queue.get()
+    worker.join()
+    print(f"2nd process: {line}  (hit rate {stats['hit_rate']:.0%})")
+
+    if mismatches:
+        print(f"{mismatches} results differ from the pipeline without the memo")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Bulk report export: reports per second into a ZIP, one process against a pool.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_export --reports 200 --processes 4
+
+The baseline renders the same inputs one after the other with build_report,
+as a loop over /api/download-report would. Each export then writes a ZIP
+with export_reports for both formats, in one process and on the pool, and
+is checked for one entry per report plus a manifest line for each.
+"""
+import argparse
+import contextlib
+import csv
+import functools
+import io
+import os
+import tempfile
+import time
+import zipfile
+
+from benchmarks.bench_serving import BENCH_POPULATION_DB
+from benchmarks.corpus import build_corpus
+
+
+def check_zip(path, n):
+    """Problems with the export at ``path`` of ``n`` items, as strings."""
+    with zipfile.ZipFile(path) as archive:
+        names = set(archive.namelist())
+        manifest = list(csv.DictReader(io.TextIOWrapper(archive.open("manifest.csv"), encoding="utf-8")))
+    problems = []
+    if len(manifest) != n:
+        problems.append(f"{len(manifest)} manifest lines for {n} items")
+    documents = [row["file"] for row in manifest if row["status"] == "ok"]
+    missing = [name for name in documents if name not in names]
+    if missing:
+        problems.append(f"{len(missing)} files in the manifest are not in the ZIP")
+    if len(names) != len(documents) + 1:
+        problems.append(f"{len(names) - 1} documents in the ZIP for {len(documents)} ok manifest lines")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.setdefault("POPULATION_DB", BENCH_POPULATION_DB)
+    from src.components.app import build_report, get_report_renderer, render_export_chunk
+    from src.components.export import export_reports
+
+    items = [{"id": f"user-{i}", "user_input": text} for i, text in enumerate(build_corpus(args.reports))]
+    directory = tempfile.mkdtemp()
+    get_report_renderer()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in items:  # fill the parse cache, as in bench_report
+            build_report(item["user_input"])
+        started = time.perf_counter()
+        for item in items:
+            build_report(item["user_input"])
+        baseline = time.perf_counter() - started
+    print(f"{len(items)} reports; build_report loop (docx): {len(items) / baseline:.1f} reports/s")
+
+    failures = 0
+    for fmt in ["docx", "html"]:
+        for processes in sorted({1, args.processes}):
+            path = os.path.join(directory, f"{fmt}-{processes}.zip")
+            render = functools.partial(render_export_chunk, fmt=fmt)
+            with contextlib.redirect_stdout(io.StringIO()):
+                summary = export_reports(items, render, path, fmt=fmt, processes=processes, chunk_size=args.chunk,
+                                         progress_path=path + ".progress")
+            problems = check_zip(path, len(items)) + ([f"{summary['failed']} failed"] if summary["failed"] else [])
+            failures += bool(problems)
+            print(f"export {fmt:<4} x{processes:<2} {summary['reports_per_s']:>7.1f} reports/s  "
+                  f"render p50 {summary['render_ms']['p50']} ms p95 {summary['render_ms']['p95']} ms  "
+                  f"zip {summary['zip_bytes'] / 1e6:.1f} MB  {'; '.join(problems) or 'ok'}")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
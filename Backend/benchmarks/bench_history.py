@@ -0,0 +1,105 @@
+"""History store: insert cost and trend-query latency for users with years of entries.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_history --users 200 --years 3 --per-day 2
+
+Entries are synthetic calculate_carbon results, so nothing is parsed. After
+loading, the incrementally maintained rollups are checked against a GROUP BY
+over the entries table, and rollup queries are timed against that scan.
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from src.components.history import CATEGORIES, PERIODS, HistoryStore, period_start
+from src.components.streaming import CATEGORY_FIELDS
+
+
+def fake_result(rnd):
+    result = {field: round(rnd.uniform(0, 20), 2) for field in CATEGORY_FIELDS.values()}
+    result["total_emission"] = round(sum(result.values()), 2)
+    result["factor_version"] = "1"
+    return result
+
+
+def scan_rollups(store, user_id, period):
+    # What a rollup query would cost without the rollup table
+    by_start = {}
+    for row in store._connect().execute(
+        f"SELECT day, total_emission, {', '.join(CATEGORIES)} FROM entries WHERE user_id = ?", (user_id,)
+    ):
+        start = period_start(datetime.date.fromisoformat(row["day"]), period).isoformat()
+        totals = by_start.setdefault(start, [0, 0.0] + [0.0] * len(CATEGORIES))
+        totals[0] += 1
+        for i, value in enumerate(row[1:]):
+            totals[i + 1] += value
+    return [{
+        "start": start,
+        "entries": totals[0],
+        "total_emission": round(totals[1], 2),
+        "categories": {name: round(value, 2) for name, value in zip(CATEGORIES, totals[2:])},
+    } for start, totals in sorted(by_start.items())]
+
+
+def timed(fn, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--per-day", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", help="database path (default: a temporary file)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+    store = HistoryStore(path)
+    rnd = random.Random(0)
+    first_day = datetime.date(2022, 1, 1)
+    days = [first_day + datetime.timedelta(days=i) for i in range(365 * args.years)]
+
+    started = time.perf_counter()
+    for user in range(args.users):
+        store.record_many(f"user{user}", [
+            (day, fake_result(rnd)) for day in days for _ in range(args.per_day)
+        ])
+    load_seconds = time.perf_counter() - started
+    total_entries = args.users * len(days) * args.per_day
+    print(f"loaded {total_entries} entries in {load_seconds:.1f} s "
+          f"({load_seconds / total_entries * 1e6:.0f} us per entry, rollups included)")
+
+    single = timed(lambda: store.record("user0", fake_result(rnd), day=days[-1]), args.repeat)
+    print(f"single insert (own transaction): {single:.2f} ms")
+
+    mismatches = 0
+    print(f"{'period':<7} {'rows':>6} {'rollup ms':>10} {'scan ms':>9}")
+    for period in PERIODS:
+        user = f"user{args.users // 2}"
+        rollups = store.rollups(user, period)
+        if rollups != scan_rollups(store, user, period):
+            mismatches += 1
+            print(f"{period}: rollups differ from a scan of the entries")
+        query = timed(lambda: store.rollups(user, period), args.repeat)
+        scan = timed(lambda: scan_rollups(store, user, period), max(1, args.repeat // 5))
+        print(f"{period:<7} {len(rollups):>6} {query:>10.2f} {scan:>9.2f}")
+
+    ranged = timed(lambda: store.rollups("user1", "week", start=days[-90], end=days[-1]), args.repeat)
+    print(f"last 90 days by week: {ranged:.2f} ms")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Parse latency against input size, with clause-segmented and cross-clause extraction.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_long_inputs --sizes 1 4 16 64 100
+
+Sizes are in KB. "regex ms" is everything except the spaCy pass, which is
+linear on its own; with clause segmentation it should grow linearly too.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.corpus import SAMPLES
+
+
+def build_input(size_kb, seed=0):
+    rnd = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size_kb * 1024:
+        sample = rnd.choice(SAMPLES).rstrip(".")
+        parts.append(sample)
+        length += len(sample) + 2
+    return ". ".join(parts) + "."
+
+
+def measure(app, text, repeat):
+    stages = defaultdict(float)
+
+    def observe(name, seconds):
+        stages[name] += seconds
+
+    from src.components.timing import add_stage_observer, remove_stage_observer
+
+    best_total = best_regex = float("inf")
+    add_stage_observer(observe)
+    try:
+        for _ in range(repeat):
+            if app.CLAUSE_MEMO is not None:
+                app.CLAUSE_MEMO.clear()
+            stages.clear()
+            start = time.perf_counter()
+            app.parse_input_to_data(text)
+            total = time.perf_counter() - start
+            best_total = min(best_total, total)
+            best_regex = min(best_regex, total - stages["spacy"])
+    finally:
+        remove_stage_observer(observe)
+    return best_total, best_regex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16, 64, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", metavar="PATH", help="write machine-readable results ('-' for stdout)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("WARMUP", "0")
+    # Not a memo warmed by earlier runs (or other processes); measure() empties it between calls
+    os.environ["CLAUSE_MEMO_DB"] = os.path.join(tempfile.mkdtemp(), "clause-memo.sqlite3")
+    from src.components import app
+
+    rows = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.parse_input_to_data(SAMPLES[0])  # warm up
+        for size in args.sizes:
+            text = build_input(size)
+            for mode, cross in [("clauses", False), ("cross_clause", True)]:
+                app.CROSS_CLAUSE_MATCHING = cross
+                total, regex = measure(app, text, args.repeat)
+                rows.append({
+                    "size_kb": size, "mode": mode,
+                    "total_ms": round(total * 1000, 2), "regex_ms": round(regex * 1000, 2),
+                    "regex_ms_per_kb": round(regex * 1000 / size, 3),
+                })
+    app.CROSS_CLAUSE_MATCHING = False
+
+    if args.json == "-":
+        json.dump(rows, sys.stdout, indent=1)
+        print()
+        return
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=1)
+    print(f"{'KB':>5} {'mode':<13} {'total ms':>10} {'regex ms':>10} {'regex ms/KB':>12}")
+    for row in rows:
+        print(f"{row['size_kb']:>5} {row['mode']:<13} {row['total_ms']:>10.1f} "
+              f"{row['regex_ms']:>10.1f} {row['regex_ms_per_kb']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
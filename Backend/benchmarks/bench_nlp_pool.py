@@ -0,0 +1,127 @@
+"""Burst load on /api/calculate: in-worker parsing against the shared NLP pool.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_nlp_pool --nlp-workers 2 --clients 32 --duration 15
+
+Both runs use gunicorn with the same number of processes parsing: N sync
+workers parsing in-process, or N NLP_WORKERS behind more (cheap) gunicorn
+workers. Every request carries a new input, so nothing is served from the
+parse cache. Without the pool, excess requests wait in the listen backlog
+for as long as it takes; with it, they are turned away with 429/503 once
+the queue is full or their deadline (NLP_TIMEOUT) passes, and accepted
+requests keep a bounded latency. Clients honour Retry-After.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.bench_serving import BACKEND_DIR, BENCH_POPULATION_DB, fresh_clause_memo_db, free_port, percentile
+from benchmarks.corpus import build_corpus
+
+
+def start_gunicorn(port, workers, env):
+    env = dict(os.environ, WARMUP="1", CLAUSE_MEMO_DB=fresh_clause_memo_db(), LOG_LEVEL="WARNING", POPULATION_DB=BENCH_POPULATION_DB, **env)
+    command = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--workers", str(workers),
+               "--bind", f"127.0.0.1:{port}", "--timeout", "120", "src.components.app:app"]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.5)
+    server.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def client(port, next_input, stop, outcomes):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    while not stop.is_set():
+        body = json.dumps({"user_input": next_input()})
+        started = time.perf_counter()
+        try:
+            connection.request("POST", "/api/calculate", body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            status = "error"
+        outcomes.append((status, time.perf_counter() - started))
+        if status in (429, 503):
+            # Well-behaved clients back off as told
+            stop.wait(float(response.getheader("Retry-After", 1)))
+
+
+def burst(port, clients, duration, corpus, offset):
+    stop = threading.Event()
+    outcomes = []
+    numbers = iter(range(offset, 10 ** 9))
+    # Shared by the client threads; next() on an iterator is not thread-safe
+    lock = threading.Lock()
+
+    def next_input():
+        with lock:
+            n = next(numbers)
+        return f"{corpus[n % len(corpus)]} and walked {n} km"
+
+    threads = [threading.Thread(target=client, args=(port, next_input, stop, outcomes)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nlp-workers", type=int, default=2)
+    parser.add_argument("--http-workers", type=int, default=16, help="gunicorn workers in front of the pool")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--queue", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    corpus = build_corpus(2000)
+    runs = [
+        ("in-worker", args.nlp_workers, {}),
+        ("nlp-pool", args.http_workers, {"NLP_WORKERS": str(args.nlp_workers), "NLP_QUEUE": str(args.queue),
+                                         "NLP_TIMEOUT": str(args.timeout)}),
+    ]
+    print(f"{args.clients} clients for {args.duration:.0f} s, {args.nlp_workers} parsing processes")
+    print(f"{'mode':<10} {'ok/s':>7} {'ok p50':>8} {'ok p99':>8} {'ok max':>8} {'reject p99':>10}  statuses")
+    for name, workers, env in runs:
+        port = free_port()
+        server = start_gunicorn(port, workers, env)
+        try:
+            burst(port, args.clients, 2, corpus, 10 ** 6)  # warm up
+            outcomes = burst(port, args.clients, args.duration, corpus, 0)
+        finally:
+            server.terminate()
+            server.wait(30)
+        statuses = {}
+        for status, _ in outcomes:
+            statuses[status] = statuses.get(status, 0) + 1
+        ok = sorted(seconds * 1000 for status, seconds in outcomes if status == 200)
+        rejected = sorted(seconds * 1000 for status, seconds in outcomes if status in (429, 503))
+        print(f"{name:<10} {len(ok) / args.duration:>7.1f} {statistics.median(ok):>8.1f} "
+              f"{percentile(ok, 0.99):>8.1f} {ok[-1]:>8.1f} "
+              f"{percentile(rejected, 0.99) if rejected else float('nan'):>10.1f}  {dict(sorted(statuses.items(), key=str))}")
+
+
+if __name__ == "__main__":
+    main()
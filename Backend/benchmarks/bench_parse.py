@@ -0,0 +1,50 @@
+"""Latency of parse_input_to_data over a fixed corpus.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_parse --size 200 --repeat 3
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from benchmarks.corpus import build_corpus
+
+
+def run(parse, corpus, repeat):
+    timings = []
+    for _ in range(repeat):
+        for text in corpus:
+            start = time.perf_counter()
+            parse(text)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    from src.components.app import parse_input_to_data
+    import_time = time.perf_counter() - start
+
+    corpus = build_corpus(args.size, args.seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse_input_to_data(corpus[0])  # warm up
+        timings = run(parse_input_to_data, corpus, args.repeat)
+
+    timings.sort()
+    ms = [t * 1000 for t in timings]
+    print(f"import: {import_time:.2f} s")
+    print(f"calls: {len(ms)}  mean: {statistics.mean(ms):.2f} ms  "
+          f"p50: {ms[len(ms) // 2]:.2f} ms  p99: {ms[int(len(ms) * 0.99) - 1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
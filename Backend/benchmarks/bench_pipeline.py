@@ -0,0 +1,220 @@
+"""Per-stage latency and throughput of parse_input_to_data, checked against golden outputs.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_pipeline --per-kind 20 --repeat 3 --json results.json
+
+Every input's emission numbers, from every repetition, are compared with
+benchmarks/golden/pipeline.json and the run exits non-zero on any difference,
+so a speedup cannot silently change results. After an intended change in
+output, regenerate with --update-golden.
+
+The pipeline runs in its default configuration, clause memo included, against
+a fresh memo file that is emptied before each repetition.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.corpus import KINDS, build_mixed_corpus
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden", "pipeline.json")
+
+# The fields that make up a result's emission numbers
+GOLDEN_FIELDS = [
+    "transport_total", "electricity_kwh", "food_total", "shopping_spend", "flight_km",
+    "water_liters", "plastic_kg", "total_emission", "trees_required", "category_percentages",
+    "badges",
+]
+
+
+def golden_view(result):
+    return {field: result[field] for field in GOLDEN_FIELDS if field in result}
+
+
+def latency_summary(seconds):
+    ms = sorted(s * 1000 for s in seconds)
+    if not ms:
+        return {"calls": 0}
+    return {
+        "calls": len(ms),
+        "mean_ms": round(statistics.mean(ms), 4),
+        "p50_ms": round(ms[len(ms) // 2], 4),
+        "p99_ms": round(ms[max(int(len(ms) * 0.99) - 1, 0)], 4),
+    }
+
+
+def run(parse, corpus, repeat, reset=None):
+    """(per-call records, results by text, inputs whose result changed between repetitions).
+
+    A record has the kind, total and per-stage seconds; ``reset`` runs before
+    each repetition.
+    """
+    from src.components.timing import add_stage_observer, remove_stage_observer
+
+    current = defaultdict(float)
+
+    def observe(name, seconds):
+        current[name] += seconds
+
+    records = []
+    results = {}
+    unstable = []
+    add_stage_observer(observe)
+    try:
+        for _ in range(repeat):
+            if reset is not None:
+                reset()
+            for kind, text in corpus:
+                current.clear()
+                start = time.perf_counter()
+                result = parse(text)
+                total = time.perf_counter() - start
+                records.append((kind, total, dict(current)))
+                view = golden_view(result)
+                if results.setdefault(text, view) != view:
+                    unstable.append({"input": text, "expected": results[text], "actual": view})
+    finally:
+        remove_stage_observer(observe)
+    return records, results, unstable
+
+
+def summarize(records, elapsed):
+    by_kind = defaultdict(list)
+    for record in records:
+        by_kind[record[0]].append(record)
+
+    def stages_of(group):
+        names = sorted({name for _, _, stages in group for name in stages})
+        # A stage that did not run in a call counts as zero for that call
+        return {name: latency_summary([stages.get(name, 0.0) for _, _, stages in group]) for name in names}
+
+    return {
+        "throughput_per_s": round(len(records) / elapsed, 2) if elapsed else None,
+        "total": latency_summary([total for _, total, _ in records]),
+        "stages": stages_of(records),
+        "kinds": {
+            kind: {"total": latency_summary([total for _, total, _ in group]), "stages": stages_of(group)}
+            for kind, group in by_kind.items()
+        },
+    }
+
+
+def check_golden(results, golden):
+    mismatches = []
+    checked = 0
+    for text, expected in golden.get("results", {}).items():
+        if text not in results:
+            continue
+        checked += 1
+        if results[text] != expected:
+            mismatches.append({"input": text, "expected": expected, "actual": results[text]})
+    return {"checked": checked, "mismatches": mismatches}
+
+
+def environment(nlp):
+    import spacy
+
+    return {
+        "python": platform.python_version(),
+        "spacy": spacy.__version__,
+        "model": f"{nlp.meta.get('name')}-{nlp.meta.get('version')}",
+    }
+
+
+def print_table(summary, out):
+    print(f"throughput: {summary['throughput_per_s']} inputs/s", file=out)
+    print(f"{'stage':<16} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}", file=out)
+    rows = [("total", summary["total"])] + sorted(summary["stages"].items())
+    for name, stats in rows:
+        print(f"{name:<16} {stats['mean_ms']:>9.3f} {stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f}", file=out)
+    print(file=out)
+    print(f"{'kind':<16} {'calls':>6} {'mean ms':>9} {'p99 ms':>9}", file=out)
+    for kind in KINDS:
+        if kind in summary["kinds"]:
+            stats = summary["kinds"][kind]["total"]
+            print(f"{kind:<16} {stats['calls']:>6} {stats['mean_ms']:>9.3f} {stats['p99_ms']:>9.3f}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--per-kind", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS)
+    parser.add_argument("--json", metavar="PATH", help="write machine-readable results ('-' for stdout)")
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--update-golden", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.setdefault("WARMUP", "0")
+    # Not a memo warmed by earlier runs (or other processes)
+    os.environ["CLAUSE_MEMO_DB"] = os.path.join(tempfile.mkdtemp(), "clause-memo.sqlite3")
+    from src.components.app import CLAUSE_MEMO, nlp, parse_input_to_data
+
+    corpus = build_mixed_corpus(args.per_kind, args.seed, args.kinds)
+    reset = CLAUSE_MEMO.clear if CLAUSE_MEMO is not None else None
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse_input_to_data(corpus[0][1])  # warm up
+        start = time.perf_counter()
+        records, results, unstable = run(parse_input_to_data, corpus, args.repeat, reset)
+        elapsed = time.perf_counter() - start
+
+    env = environment(nlp)
+    summary = summarize(records, elapsed)
+    report = {
+        "environment": env,
+        "config": {"per_kind": args.per_kind, "repeat": args.repeat, "seed": args.seed, "kinds": args.kinds},
+        **summary,
+        # Repetitions after the first reuse memo entries made by earlier inputs of the run
+        "unstable": unstable,
+    }
+
+    if args.update_golden:
+        os.makedirs(os.path.dirname(args.golden), exist_ok=True)
+        with open(args.golden, "w", encoding="utf-8") as f:
+            json.dump({"environment": env, "results": results}, f, indent=1, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        report["golden"] = {"updated": args.golden, "inputs": len(results)}
+    elif os.path.exists(args.golden):
+        with open(args.golden, encoding="utf-8") as f:
+            golden = json.load(f)
+        report["golden"] = check_golden(results, golden)
+        if golden.get("environment") != env:
+            # Lemma-based fallbacks depend on the model, so numbers may legitimately differ
+            report["golden"]["environment"] = golden.get("environment")
+    else:
+        report["golden"] = None
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=1, ensure_ascii=False)
+        print()
+    else:
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=1, ensure_ascii=False)
+        print_table(summary, sys.stdout)
+
+    if unstable:
+        print(f"{len(unstable)} inputs gave different results across repetitions", file=sys.stderr)
+        return 1
+    golden = report["golden"] or {}
+    mismatches = golden.get("mismatches", [])
+    if mismatches:
+        print(f"{len(mismatches)} of {golden['checked']} inputs differ from {args.golden}", file=sys.stderr)
+        if "environment" in golden:
+            print(f"(golden recorded with {golden['environment']}, running {env})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
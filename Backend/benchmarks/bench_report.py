@@ -0,0 +1,46 @@
+"""Reports per second for /api/download-report, single worker, warm parse cache.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_report --size 50 --repeat 3
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from benchmarks.bench_serving import BENCH_POPULATION_DB
+from benchmarks.corpus import build_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("POPULATION_DB", BENCH_POPULATION_DB)
+    from src.components.app import app
+
+    client = app.test_client()
+    corpus = build_corpus(args.size)
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for text in corpus:  # fill the parse cache so only rendering is timed
+            client.post("/api/calculate", json={"user_input": text})
+        for _ in range(args.repeat):
+            for text in corpus:
+                start = time.perf_counter()
+                response = client.post("/api/download-report", json={"user_input": text})
+                timings.append(time.perf_counter() - start)
+                assert response.status_code in (200, 500), response.status_code
+
+    timings.sort()
+    ms = [t * 1000 for t in timings]
+    print(f"reports: {len(ms)}  {len(ms) / sum(timings):.1f} reports/s  "
+          f"p50: {ms[len(ms) // 2]:.2f} ms  p99: {ms[int(len(ms) * 0.99) - 1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Tips/badges rules: one result at a time against one vectorized pass over a batch.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_rules --results 100000
+
+Results are synthetic calculate_carbon outputs, with a share of values sitting
+exactly on rule thresholds. RuleSet.apply (the single-request path) and
+RuleSet.apply_many must give the same tips and badges for every one;
+"matches only" is the vectorized threshold-table pass without building the
+message lists.
+"""
+import argparse
+import os
+import random
+import time
+
+from src.components.rules import load_rules, result_columns
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "components", "rules.json")
+
+
+def synthetic_results(rules, n, seed):
+    rnd = random.Random(seed)
+    thresholds = sorted({float(rule["threshold"]) for kind in ["tips", "badges"] for rule in rules.source[kind]})
+    return [
+        {field: rnd.choice(thresholds) if rnd.random() < 0.2 else round(rnd.uniform(0, 3000) * rnd.random() ** 3, 2)
+         for field in rules.fields}
+        for _ in range(n)
+    ]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=100000)
+    parser.add_argument("--rules", default=RULES_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rules, compile_seconds = timed(lambda: load_rules(args.rules))
+    results = synthetic_results(rules, args.results, args.seed)
+    columns = result_columns(results, rules.fields)
+
+    single, single_seconds = timed(lambda: [rules.apply(result) for result in results])
+    batch, batch_seconds = timed(lambda: rules.apply_many(columns))
+    _, match_seconds = timed(lambda: rules.matches(columns))
+    mismatches = sum(1 for a, b in zip(single, batch) if a != b)
+
+    n = len(results)
+    print(f"{len(rules.source['tips'])} tip + {len(rules.source['badges'])} badge rules, "
+          f"compiled in {compile_seconds * 1000:.1f} ms; {n} results")
+    for name, seconds in [("apply (per result)", single_seconds), ("apply_many", batch_seconds),
+                          ("matches only", match_seconds)]:
+        print(f"{name:<20} {seconds * 1000:>9.1f} ms  {seconds / n * 1e6:>6.2f} us/result")
+    print(f"apply vs apply_many: {mismatches} mismatches")
+    raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
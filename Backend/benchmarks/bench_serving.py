@@ -0,0 +1,150 @@
+"""Load test: gunicorn sync workers against the async (ASGI) serving mode.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_serving --workers 2 --duration 20 --slow-clients 4 --fast-clients 8
+
+Each mode is started as a real server with the same number of processes
+doing CPU work (gunicorn --workers N vs. uvicorn with ASYNC_WORKERS=N).
+"Slow" clients keep requesting DOCX reports for inputs the parse cache has
+not seen; half the "fast" clients poll /api/cache/stats, the other half a
+cached /api/calculate. The interesting numbers are the fast clients' tail
+latencies while reports are being rendered.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.corpus import build_corpus
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHED_INPUT = "took the metro 10 km to office"
+# Benchmark results stay out of the real population percentiles
+BENCH_POPULATION_DB = os.path.join(tempfile.gettempdir(), "carbon-bench-population.sqlite3")
+
+
+def fresh_clause_memo_db():
+    """An empty clause memo for one server, so no mode starts with clauses another one parsed."""
+    return os.path.join(tempfile.mkdtemp(), "clause-memo.sqlite3")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, workers):
+    env = dict(os.environ, WARMUP="1", CLAUSE_MEMO_DB=fresh_clause_memo_db(), LOG_LEVEL="WARNING", POPULATION_DB=BENCH_POPULATION_DB)
+    if mode == "sync":
+        command = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--workers", str(workers),
+                   "--bind", f"127.0.0.1:{port}", "--timeout", "120", "src.components.app:app"]
+    else:
+        env["ASYNC_WORKERS"] = str(workers)
+        command = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--port", str(port),
+                   "--log-level", "warning", "--no-access-log", "src.components.asgi:app"]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.5)
+    server.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def client(port, requests, stop, latencies, statuses):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    i = 0
+    while not stop.is_set():
+        method, path, body = requests(i)
+        i += 1
+        started = time.perf_counter()
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            status = "error"
+        latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+def run_load(port, args):
+    corpus = build_corpus(10000, args.seed)
+    stop = threading.Event()
+    groups = {"report": ([], {}), "calculate": ([], {}), "stats": ([], {})}
+    threads = []
+    for c in range(args.slow_clients):
+        def slow(i, c=c):
+            return "POST", "/api/download-report", {"user_input": f"{corpus[(i * args.slow_clients + c) % len(corpus)]} day {i}"}
+        threads.append(threading.Thread(target=client, args=(port, slow, stop, *groups["report"])))
+    for c in range(args.fast_clients):
+        if c % 2:
+            fast, group = (lambda i: ("GET", "/api/cache/stats", None)), groups["stats"]
+        else:
+            fast, group = (lambda i: ("POST", "/api/calculate", {"user_input": CACHED_INPUT})), groups["calculate"]
+        threads.append(threading.Thread(target=client, args=(port, fast, stop, *group)))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return groups
+
+
+def percentile(ms, q):
+    return ms[min(len(ms) - 1, int(len(ms) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--slow-clients", type=int, default=4)
+    parser.add_argument("--fast-clients", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{args.workers} CPU processes, {args.slow_clients} report + {args.fast_clients} cheap clients, "
+          f"{args.duration:.0f} s per mode")
+    print(f"{'mode':<6} {'class':<9} {'requests':>8} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+    for mode in args.modes:
+        port = free_port()
+        server = start_server(mode, port, args.workers)
+        try:
+            # Unmeasured warmup: fork-time page faults, first report fonts
+            warm = argparse.Namespace(**{**vars(args), "duration": 2})
+            run_load(port, warm)
+            groups = run_load(port, args)
+        finally:
+            server.terminate()
+            server.wait(30)
+        for name, (latencies, statuses) in groups.items():
+            if not latencies:
+                continue
+            ms = sorted(s * 1000 for s in latencies)
+            print(f"{mode:<6} {name:<9} {len(ms):>8} {len(ms) / args.duration:>7.1f} {statistics.median(ms):>8.1f} "
+                  f"{percentile(ms, 0.99):>8.1f} {ms[-1]:>8.1f}  {dict(sorted(statuses.items(), key=str))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Concurrent /recognize requests against the stub backend.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_speech --clients 8 --delay 0.5
+
+Each client uploads its own tone and checks that the transcript carries the
+digest of that audio (no cross-request contamination). A long recording with
+pauses is then transcribed as one segment and split, to show the parallel
+speed-up and that segments are stitched back in order.
+"""
+import argparse
+import io
+import math
+import os
+import struct
+import sys
+import threading
+import time
+import wave
+
+
+def wav_bytes(parts, rate=16000):
+    """PCM WAV from (seconds, frequency) parts; frequency None is silence."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        for seconds, freq in parts:
+            count = int(seconds * rate)
+            if freq is None:
+                out.writeframes(b"\x00\x00" * count)
+            else:
+                out.writeframes(struct.pack(
+                    f"<{count}h", *(int(8000 * math.sin(2 * math.pi * freq * i / rate)) for i in range(count))))
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--delay", type=float, default=0.5, help="simulated recognizer seconds per request")
+    parser.add_argument("--realtime", type=float, default=0.1,
+                        help="simulated recognizer seconds per second of audio, for the long recording")
+    args = parser.parse_args()
+
+    os.environ.update(
+        WARMUP="0", SPEECH_BACKEND="stub", SPEECH_STUB_TEXT="{digest}",
+        SPEECH_STUB_DELAY=str(args.delay), SPEECH_WORKERS="4", SPEECH_QUEUE=str(args.clients),
+    )
+    from src.components import app
+    from src.components.speech import StubBackend, SpeechService, load_audio, split_on_silence
+
+    client = app.app.test_client()
+    expect = StubBackend(text="{digest}", delay=0)
+
+    def post(data):
+        return client.post("/recognize", data={"audio": (io.BytesIO(data), "audio.wav")},
+                           content_type="multipart/form-data")
+
+    results = {}
+
+    def run(i):
+        data = wav_bytes([(1, 300 + 40 * i)])
+        response = post(data)
+        results[i] = response.status_code == 200 and response.json["text"] == expect.transcribe(load_audio(io.BytesIO(data)))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    mismatches = sum(not ok for ok in results.values())
+    print(f"{args.clients} concurrent clients, {mismatches} contaminated or failed")
+
+    audio = load_audio(io.BytesIO(wav_bytes([(12, 440), (1, None), (12, 660), (1, None), (12, 880)])))
+
+    class ProportionalStub(StubBackend):
+        # Real recognizers take time roughly proportional to the audio length
+        def transcribe(self, audio):
+            time.sleep(len(audio.frame_data) / audio.sample_width / audio.sample_rate * args.realtime)
+            return super().transcribe(audio)
+
+    service = SpeechService(ProportionalStub(text="{digest}", delay=0), max_workers=4, max_queue=0)
+    segments = split_on_silence(audio, max_segments=4, min_segment=10)
+    start = time.perf_counter()
+    service.transcribe(audio)
+    whole = time.perf_counter() - start
+    start = time.perf_counter()
+    stitched = service.transcribe_segments(segments)
+    split = time.perf_counter() - start
+    in_order = stitched.split() == [expect.transcribe(segment) for segment in segments]
+    print(f"38 s recording: whole {whole:.2f} s, {len(segments)} segments {split:.2f} s, in order: {in_order}")
+    sys.exit(1 if mismatches or not in_order else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Import time and per-worker memory, with and without fork-shared preloading.
+
+Run from the Backend directory (Linux only, reads /proc):
+
+    python -m benchmarks.bench_startup --workers 4
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+IMPORT_SNIPPET = (
+    "import time, resource; t = time.perf_counter(); "
+    "import src.components.app; "
+    "print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+)
+
+
+def memory_kb():
+    """(rss, private) of this process in kB; private is what a forked worker does not share."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields.get("Rss", 0), fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+
+
+def cold_import():
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", IMPORT_SNIPPET],
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[-2]), int(out[-1])
+
+
+def preloaded_workers(n):
+    # Import once, then fork n workers that each handle one request
+    import contextlib
+    import io
+
+    from src.components import app as app_module
+
+    client = app_module.app.test_client()
+    if hasattr(app_module, "freeze_for_fork"):
+        app_module.freeze_for_fork()
+    results = []
+    for _ in range(n):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            with contextlib.redirect_stdout(io.StringIO()):
+                client.post("/api/calculate", json={"user_input": "took the metro 10 km, ate 200 g rice"})
+            os.write(write_fd, ("%d %d" % memory_kb()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            results.append(tuple(int(x) for x in f.read().split()))
+        os.waitpid(pid, 0)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    imports = [cold_import() for _ in range(args.runs)]
+    best = min(imports)
+    print(f"cold import: {best[0]:.2f} s  max RSS {best[1] / 1024:.0f} MB (best of {args.runs})")
+
+    start = time.perf_counter()
+    workers = preloaded_workers(args.workers)
+    elapsed = time.perf_counter() - start
+    for i, (rss, private) in enumerate(workers):
+        print(f"preloaded worker {i}: RSS {rss / 1024:.0f} MB, private {private / 1024:.0f} MB")
+    print(f"preload + fork of {args.workers} workers: {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
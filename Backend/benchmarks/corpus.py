@@ -0,0 +1,144 @@
+import json
+import os
+import random
+
+# Fixed, hand-written inputs in the style users type into the tracker
+SAMPLES = [
+    "I drove my car 20 km and ate 200g chicken, drank 2 litres of bottled water, bought a shirt for 500 rs, used 10 kwh electricity, 300 g plastic",
+    "took the metro 10 km to office",
+    "drank 2 litres of tap water",
+    "I took a domestic flight of 1200 km",
+    "flew 800 km international flight and then took a cab 15 km",
+    "ate rice and dal with paneer, had some coffee",
+    "bought groceries for 1200 rupees and 2 kg of rice",
+    "spent ₹3000 on gadgets, my laptop charger",
+    "used 5 kg of hdpe plastic and 3 kwh",
+    "commuted by bus 12 km, then auto 3 km and walked 2 km",
+    "electricity 25 kWh used, 1.5 kg beef, 500 g potato, 250 ml milk",
+    "went by train 150 km and back by diesel train 150 km",
+    "I had 2 eggs, a banana and a burger",
+    "bought new jeans and shoes",
+    "rode my bike 8 km, e-rickshaw 2 km",
+    "plastic: pvc 200 g",
+    "water bottled 3 l",
+    "100 km car trip then 50 miles in a cab",
+    "ate chocolate 100 g and icecream 200 g and pizza",
+    "nothing much happened today",
+    "I used a car for 30 km. Then I ate 0.5 kg of mutton and 300 g of rice. Later I bought clothes for 2000 rs.",
+    "morning: metro 14 km. lunch: 200 g paneer, 150 g roti. evening: 2 l bottled water, uber 9 km",
+    "my electric car 40 km, electric scooter 5 km",
+    "bought a phone",
+    "ordered a pizza and a soft drink for 600 rupees",
+    "domestic flight 700 km, international flight 5000 km",
+]
+
+# Inputs whose aliases hide inside longer ones or overlap across categories;
+# every mixed corpus with alias-heavy inputs ends with them, so the golden
+# outputs pin how they resolve
+ALIAS_OVERLAPS = [
+    "1 kg junk snacks",
+    "ate 100 g dairy milk drink",
+    "ate 200 g kulfi",
+    "ate 200 g cottage cheese",
+    "ate 200 g dahi",
+    "took electric scooter 5 km, had black tea",
+    # Aliases resolve within their clause: "bike" in the second sentence stays
+    # bicycle and the scooter stays bike (a whole-text rewrite turned both into bicycle)
+    "my electric car 40 km, electric scooter 5 km. rode my bike 8 km.",
+    "electric scooter 5 km. rode my bike 8 km, electric scooter 5 km.",
+]
+
+
+def build_corpus(size=100, seed=0):
+    """Return ``size`` inputs: every sample once, then seeded multi-sentence mixes."""
+    rnd = random.Random(seed)
+    corpus = list(SAMPLES[:size])
+    while len(corpus) < size:
+        corpus.append(" ".join(rnd.choice(SAMPLES) for _ in range(rnd.randint(2, 8))))
+    return corpus
+
+
+ALIASES_PATH = os.path.join(os.path.dirname(__file__), "..", "src", "components", "aliases.json")
+
+KINDS = ["one_liner", "multi_category", "diary", "alias_heavy", "numeric_heavy"]
+
+_QUANTITIES = [1, 2, 3, 5, 8, 10, 12, 15, 20, 25, 40, 50, 100, 150, 250, 500]
+_DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_ALIAS_TEMPLATES = {
+    "transport": ["took the {alias} {n} km", "{alias} {n} km", "travelled {n} km by {alias}"],
+    "food": ["ate {n} g {alias}", "{n} g of {alias}", "had {alias} {n} g"],
+    "shopping": ["bought a {alias} for {n} rs", "spent ₹{n} on {alias}", "got {alias}"],
+    "water": ["drank {n} l {alias}", "{alias} {n} litres"],
+    "plastic": ["used {n} g {alias}", "threw away a {alias}"],
+}
+
+
+def _load_aliases():
+    with open(ALIASES_PATH, encoding="utf-8") as f:
+        aliases = json.load(f)
+    # Sorted so the corpus does not depend on dict order in aliases.json
+    return {
+        category: sorted({alias for variants in mapping.values() for alias in variants})
+        for category, mapping in aliases.items()
+    }
+
+
+def _one_liner(rnd, aliases):
+    return rnd.choice([s for s in SAMPLES if len(s) < 60])
+
+
+def _multi_category(rnd, aliases):
+    return ", ".join(rnd.sample(SAMPLES, rnd.randint(3, 5)))
+
+
+def _diary(rnd, aliases):
+    entries = []
+    for day in rnd.sample(_DAYS, rnd.randint(4, 7)):
+        sentences = [rnd.choice(SAMPLES).rstrip(".") for _ in range(rnd.randint(3, 6))]
+        entries.append(f"{day}: " + ". ".join(sentences) + ".")
+    return " ".join(entries)
+
+
+def _alias_phrase(rnd, aliases):
+    category = rnd.choice(sorted(_ALIAS_TEMPLATES))
+    template = rnd.choice(_ALIAS_TEMPLATES[category])
+    return template.format(alias=rnd.choice(aliases[category]), n=rnd.choice(_QUANTITIES))
+
+
+def _alias_heavy(rnd, aliases):
+    return ", ".join(_alias_phrase(rnd, aliases) for _ in range(rnd.randint(4, 10)))
+
+
+def _numeric_heavy(rnd, aliases):
+    parts = []
+    for _ in range(rnd.randint(6, 14)):
+        n = rnd.choice(_QUANTITIES)
+        parts.append(rnd.choice([
+            f"{n} km", f"{n} kwh", f"{n} g", f"{n} kg", f"{n} l", f"₹{n}", f"{n} rs",
+            f"car {n} km", f"{n} kwh used", f"{n} g rice", f"{n} ml milk", f"flight of {n * 10} km",
+        ]))
+    return " ".join(parts)
+
+
+_GENERATORS = {
+    "one_liner": _one_liner,
+    "multi_category": _multi_category,
+    "diary": _diary,
+    "alias_heavy": _alias_heavy,
+    "numeric_heavy": _numeric_heavy,
+}
+
+
+def build_mixed_corpus(per_kind=20, seed=0, kinds=KINDS):
+    """``per_kind`` seeded inputs of each kind, as (kind, text) pairs.
+
+    Kinds: short one-liners, multi-category days, long multi-day diaries,
+    inputs dense with aliases from aliases.json, and inputs dense with numbers
+    and units. The alias-heavy inputs are followed by ALIAS_OVERLAPS.
+    """
+    rnd = random.Random(seed)
+    aliases = _load_aliases()
+    corpus = [(kind, _GENERATORS[kind](rnd, aliases)) for kind in kinds for _ in range(per_kind)]
+    if "alias_heavy" in kinds:
+        corpus += [("alias_heavy", text) for text in ALIAS_OVERLAPS]
+    return corpus
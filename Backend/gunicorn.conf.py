@@ -0,0 +1,23 @@
+import os
+
+# Load spaCy, the alias matchers and the report assets once in the master;
+# forked workers share those pages copy-on-write. PRELOAD=0 restores the
+# old behaviour of every worker importing the app itself.
+preload_app = os.environ.get("PRELOAD", "1") == "1"
+
+if preload_app:
+    os.environ.setdefault("WARMUP_REPORTS", "1")
+
+
+def when_ready(server):
+    if preload_app:
+        from src.components.app import freeze_for_fork, start_nlp_pool
+        freeze_for_fork()
+        # NLP_WORKERS > 0: parse processes forked from this master, like the workers
+        start_nlp_pool()
+
+
+def on_exit(server):
+    if preload_app:
+        from src.components.app import stop_nlp_pool
+        stop_nlp_pool()
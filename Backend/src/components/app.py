@@ -1,19 +1,49 @@
-from flask import Flask, request, send_file,jsonify
+from flask import Flask, request, send_file,jsonify, g, Response, stream_with_context
 import re
 import os
-from io import BytesIO
+import bisect
+import copy
+import shutil
+import tempfile
+from io import BufferedReader, BytesIO, TextIOWrapper
 import math
 import spacy
-from spacy.matcher import PhraseMatcher
 import json
+import hashlib
+import functools
+import itertools
+import gc
+import datetime
+import time
+import logging
+import threading
 from flask_cors import CORS
-import speech_recognition as sr
-from docx import Document
-from docx.shared import Inches, Pt
-import matplotlib.pyplot as plt
 
-import sys
-print("Starting app...", file=sys.stderr)
+from .bulk import PARQUET_MIMETYPES, BulkCalculator, BulkFormatError
+from .cache import TTLCache
+from .columnar import ColumnarCalculator
+from .export import FORMATS as EXPORT_FORMATS, export_reports
+from .factors import FactorFileError, load_registry
+from .history import PERIODS, HistoryStore
+from .jobs import FileJobQueue, QueueFull
+from .keywords import KeywordIndex, compile_keyword_patterns
+from .memo import ClauseMemo
+from .nlp_pool import NLPPool, NLPPoolError, NLPOverloaded
+from .quantiles import PopulationStore
+from .rules import RuleFileError, load_rules
+from .logs import log_event
+from .metrics import Registry
+from .timing import add_stage_observer, stage
+from .streaming import CATEGORY_FIELDS, EntryError, RunningTotals, batched, iter_entries
+from .speech import (SpeechService, SpeechNotUnderstood, SpeechBackendError, SpeechOverloaded,
+                     SpeechDeadlineExceeded, AudioTooLarge, make_backend, read_limited, load_audio,
+                     split_on_silence)
+from .snapshot import build_matchers, build_snapshot, load_snapshot, save_snapshot, snapshot_key
+
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+log_event("starting", sampled=False)
+IMPORT_STARTED = time.perf_counter()
+STARTUP = {'ready': False, 'import_seconds': None, 'warmup_seconds': None, 'warmed': [], 'alias_snapshot': None}
 
 
 app = Flask(__name__)
@@ -21,134 +51,58 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 
 # Constants
 
-nlp = spacy.load("en_core_web_sm")
-
-TRANSPORT_FACTORS = {
-    "personal": {
-        "car": 0.12,
-        "bike": 0.08,
-        "electric_car": 0.04,
-        "electric_scooter": 0.02,
-        "bicycle": 0.0,
-        "walk": 0.0
-    },
-    "public": {
-        "bus": 0.06,
-        "metro": 0.04,
-        "train": 0.05,
-        "diesel_train": 0.07,
-        "auto": 0.09,
-        "cab": 0.13,
-        "e_rickshaw": 0.01
-    },
-    "air": {
-        "flight_domestic": 0.18,
-        "flight_international": 0.22
-    }
-}
-
-SHOPPING_FACTORS = {
-    "clothes": 2.0,
-    "gadgets": 6.0,
-    "groceries": 1.2
-}
-
-SHOPPING_COST_ESTIMATES = {
-    "clothes": {"rupee_per_kg": 500},
-    "gadgets": {"rupee_per_kg": 3000},
-    "groceries": {"rupee_per_kg": 150}
-}
-
-WATER_FACTORS = {
-    "tap": 0.25,
-    "bottled": 1.5
-}
-
-PLASTIC_FACTORS = {
-    "PET": 6.0,
-    "HDPE": 4.0,
-    "PVC": 5.0
-}
-
-FOOD_FACTORS = {
-    "meat": 7.0,
-    "beef": 60.0,
-    "lamb": 24.0,
-    "chicken": 6.0,
-    "fish": 5.0,
-    "egg": 4.5,
-    "milk": 3.0,
-    "paneer": 4.0,
-    "cheese": 10.0,
-    "yogurt": 2.2,
-    "curd": 2.2,
-    "butter": 12.0,
-    "ghee": 9.0,
-    "cream": 6.0,
-    
-    "rice": 2.5,
-    "basmati": 2.4,
-    "brown rice": 2.2,
-    "wheat": 1.3,
-    "flour": 1.2,
-    "maida": 1.4,
-    "bread": 1.8,
-    "chapati": 1.3,
-    "roti": 1.3,
-    "paratha": 2.0,
-    "poha": 1.2,
-    "idli": 1.5,
-    "dosa": 1.7,
-    "upma": 1.6,
-
-    "potato": 0.4,
-    "onion": 0.3,
-    "tomato": 0.4,
-    "carrot": 0.3,
-    "spinach": 0.2,
-    "cabbage": 0.3,
-    "cauliflower": 0.3,
-    "brinjal": 0.4,
-    "okra": 0.4,
-
-    "apple": 0.4,
-    "banana": 0.3,
-    "orange": 0.5,
-    "grapes": 0.6,
-    "mango": 0.7,
-    "pineapple": 0.7,
-    "papaya": 0.5,
-    "pomegranate": 0.6,
-
-    "vegetables": 0.5,
-    "fruits": 0.4,
-    "vegan": 1.2,
-    "junk": 7.0,
-    "processed": 8.0,
-
-    "chocolate": 19.0,
-    "icecream": 3.5,
-    "coffee": 17.0,
-    "tea": 1.8,
-    "sugar": 1.2,
-    "oil": 6.0,
-    "chips": 5.5,
-    "biscuit": 3.2,
-    "noodles": 4.0,
-    "pizza": 6.0,
-    "burger": 7.5,
-    "soft drink": 3.0,
-    "juice": 2.0
-}
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Only lemmas and like_num are used downstream, so the parser and NER are skipped
+nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
+
+# Parse-result cache shared by calculate, download-report and download-tips
+PARSE_CACHE = TTLCache(
+    maxsize=int(os.environ.get("PARSE_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("PARSE_CACHE_TTL", 600))
+)
+
+# Per-clause extraction results shared by every worker on the host (see
+# extract_activities); CLAUSE_MEMO_SIZE=0 turns it off
+CLAUSE_MEMO_SIZE = int(os.environ.get("CLAUSE_MEMO_SIZE", 100000))
+CLAUSE_MEMO = ClauseMemo(
+    os.environ.get("CLAUSE_MEMO_DB", os.path.join(tempfile.gettempdir(), "carbon-clause-memo.sqlite3")),
+    maxsize=CLAUSE_MEMO_SIZE
+) if CLAUSE_MEMO_SIZE > 0 else None
+# Bump when the layout or the meaning of the clause events changes
+CLAUSE_EVENTS_FORMAT = 5
+# Lemmas (and so the fallbacks) depend on the spaCy and model versions
+CLAUSE_MEMO_PREFIX = f"{CLAUSE_EVENTS_FORMAT}:{spacy.__version__}:{nlp.meta.get('name')}-{nlp.meta.get('version')}"
+
+# Extraction (alias rewrites included) stays within a clause unless CROSS_CLAUSE_MATCHING=1
+CLAUSE_BREAKS = {".", "!", "?", ";"}
+CROSS_CLAUSE_MATCHING = os.environ.get("CROSS_CLAUSE_MATCHING", "0") == "1"
+
+# Batch parsing (/api/calculate/batch)
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 64))
+BATCH_MAX_INPUTS = int(os.environ.get("BATCH_MAX_INPUTS", 10000))
+BATCH_MAX_PROCESSES = int(os.environ.get("BATCH_MAX_PROCESSES", os.cpu_count() or 1))
+
+# Streaming uploads (/api/calculate/stream); longer lines are rejected, not buffered
+STREAM_MAX_LINE_BYTES = int(os.environ.get("STREAM_MAX_LINE_BYTES", 64 * 1024))
+STREAM_BATCH_CHARS = int(os.environ.get("STREAM_BATCH_CHARS", 16 * 1024))
+# /api/calculate/bulk: records per vectorized chunk, and Parquet uploads kept in memory up to this size
+BULK_CHUNK_ROWS = int(os.environ.get("BULK_CHUNK_ROWS", 20000))
+BULK_SPOOL_BYTES = int(os.environ.get("BULK_SPOOL_BYTES", 32 * 1024 * 1024))
+NDJSON_MIMETYPES = {'application/x-ndjson', 'application/jsonl', 'application/json-lines'}
+
+# Emission factors live in factors.json; edits are picked up by running
+# workers (see reload_factors_if_changed) and every result carries the version;
+# the registry is loaded into TABLES, below
+FACTORS_PATH = os.environ.get("FACTORS_FILE", os.path.join(os.path.dirname(__file__), "factors.json"))
+
+# Tip and badge rules live in rules.json and are reloaded the same way
+RULES_PATH = os.environ.get("RULES_FILE", os.path.join(os.path.dirname(__file__), "rules.json"))
+RULES = load_rules(RULES_PATH)
+rules_mtime = os.stat(RULES_PATH).st_mtime_ns
 
 
 # Utility
-def flatten_transport_factors():
-    all_factors = {}
-    for key, category in TRANSPORT_FACTORS.items():
-        all_factors.update(category)
-    return all_factors
-
 def convert_to_standard(num, unit):
     if num is None:
         return 0
@@ -174,38 +128,718 @@ def convert_to_standard(num, unit):
     return value
 
 def is_overlapping(new_span, spans):
-    for span in spans:
-        if not (new_span[1] <= span[0] or new_span[0] >= span[1]):
-            return True
-    return False
+    # spans is kept sorted (bisect.insort) and non-overlapping, so only the
+    # last span starting before new_span ends can overlap it
+    i = bisect.bisect_left(spans, (new_span[1],))
+    return i > 0 and spans[i - 1][1] > new_span[0]
 
 base_dir = os.path.dirname(__file__)  # gets folder of app.py
 file_path = os.path.join(base_dir, "aliases.json")
-with open(file_path, encoding="utf-8") as f:
-    raw_aliases = json.load(f)
 
-phrase_matchers = {}
+# Tokenized aliases and the keyword automaton, rebuilt whenever aliases.json,
+# the factor tables or the spaCy/model version change
+ALIAS_SNAPSHOT_PATH = os.environ.get("ALIAS_SNAPSHOT", os.path.join(base_dir, "aliases.snapshot"))
+
+def pattern_keywords(factors=None):
+    """Every keyword the extraction regexes are compiled for."""
+    factors = factors or TABLES.factors
+    return (list(factors.transport.names) + [item.lower() for item in factors.food.names]
+            + list(factors.shopping.names))
+
+def factor_tables_json(factors=None):
+    return (factors or TABLES.factors).tables_json()
+
+def build_alias_tables(force=False, factors=None):
+    """(raw_aliases, phrase_matchers, keyword index, mtime, digest) of aliases.json; nothing is swapped in.
+
+    Built from the snapshot when it matches, else from aliases.json (and the
+    snapshot is rewritten). ``factors`` is the registry the keyword index is
+    built for (default the current one).
+    """
+    factors = factors or TABLES.factors
+    mtime = os.stat(file_path).st_mtime_ns
+    with open(file_path, "rb") as f:
+        content = f.read()
+
+    key = snapshot_key(content, factor_tables_json(factors), nlp)
+    snapshot = None if force else load_snapshot(ALIAS_SNAPSHOT_PATH, key)
+    if snapshot is not None:
+        STARTUP['alias_snapshot'] = 'loaded'
+    else:
+        aliases = json.loads(content.decode("utf-8"))
+        snapshot = build_snapshot(nlp, aliases, pattern_keywords(factors), key)
+        saved = save_snapshot(ALIAS_SNAPSHOT_PATH, snapshot)
+        STARTUP['alias_snapshot'] = 'built' if saved else 'built (not saved)'
+
+    # Every extraction pattern contains its keyword literally, so a keyword that
+    # does not occur in the text cannot match; one scan tells us which pattern
+    # sets to run.
+    keyword_index = KeywordIndex.from_state(snapshot["keywords"])
+    return snapshot["aliases"], build_matchers(nlp, snapshot), keyword_index, mtime, hashlib.sha256(content).hexdigest()
+
+def tables_version(factors, digest):
+    """Hash of the factor file (version included) and aliases; part of every parse cache key."""
+    return hashlib.sha256((factors.digest + digest).encode("utf-8")).hexdigest()[:16]
+
+class Tables:
+    """The factor registry and everything extraction builds on it, swapped in as one object.
+
+    A reload builds a new Tables and replaces TABLES in one assignment. A
+    parse reads TABLES once and passes that object down, so it never mixes
+    old and new tables, whatever thread the reload ran in.
+    """
+
+    def __init__(self, factors, patterns, aliases):
+        self.factors = factors
+        self.patterns = patterns
+        self.transport_patterns, self.food_patterns, self.shopping_patterns = patterns
+        self.aliases = aliases
+        self.raw_aliases, self.phrase_matchers, self.keyword_index, self.aliases_mtime, self.aliases_digest = aliases
+        self.version = tables_version(factors, self.aliases_digest)
+
+    def with_aliases(self, aliases):
+        return Tables(self.factors, self.patterns, aliases)
+
+def load_aliases(force=False):
+    """(Re)build the alias matchers and keyword index, then swap them in with a new tables version."""
+    global TABLES
+    with TABLES_LOCK:
+        TABLES = TABLES.with_aliases(build_alias_tables(force))
+
+def reload_aliases_if_changed():
+    global TABLES
+    try:
+        mtime = os.stat(file_path).st_mtime_ns
+    except OSError:
+        return False
+    if mtime == TABLES.aliases_mtime:
+        return False
+    with TABLES_LOCK:
+        # Another thread may have reloaded while this one waited
+        if mtime == TABLES.aliases_mtime:
+            return False
+        TABLES = TABLES.with_aliases(build_alias_tables())
+    return True
+
+# Badge images and the DOCX report template; python-docx and matplotlib are
+# only imported when the first report is rendered (or during warmup)
+report_renderer = None
+
+def get_report_renderer():
+    global report_renderer
+    if report_renderer is None:
+        from .report import ReportRenderer
+        report_renderer = ReportRenderer(os.path.join(base_dir, "badges"))
+    return report_renderer
+
+def build_report(user_input, timeout=None, cohort=None):
+    result = parse_input_cached(user_input, timeout=timeout)
+    result['population'] = population_comparison(result, cohort)
+    result['badges'] = result.get('badges', []) + population_badges(result['population'])
+    with stage("report"):
+        return get_report_renderer().render(result)
+
+def build_report_job(payload):
+    return build_report(payload['user_input'], cohort=payload.get('cohort'))
+
+# Asynchronous report jobs; state lives in REPORT_JOB_DIR so any worker can answer
+REPORT_JOBS = FileJobQueue(
+    job_dir=os.environ.get("REPORT_JOB_DIR", os.path.join(tempfile.gettempdir(), "carbon-report-jobs")),
+    build=build_report_job,
+    suffix=".docx",
+    max_workers=int(os.environ.get("REPORT_JOB_WORKERS", 2)),
+    max_queue=int(os.environ.get("REPORT_JOB_QUEUE", 16)),
+    ttl=float(os.environ.get("REPORT_JOB_TTL", 3600))
+)
+
+# Bulk report export (/api/download-report/bulk): one job renders every item
+# on its own pool of EXPORT_PROCESSES forked processes, EXPORT_CHUNK items per
+# task, and streams the documents into a ZIP in the job directory
+EXPORT_PROCESSES = int(os.environ.get("EXPORT_PROCESSES", os.cpu_count() or 1))
+EXPORT_CHUNK = int(os.environ.get("EXPORT_CHUNK", 8))
+EXPORT_MAX_ITEMS = int(os.environ.get("EXPORT_MAX_ITEMS", 10000))
+
+def stored_result(result):
+    """A report-ready result from a stored one (an earlier result or a history entry); ValueError if unusable."""
+    if not isinstance(result, dict):
+        raise ValueError("result must be an object")
+    # History entries keep the breakdown under "categories", by category name
+    categories = result.get('categories')
+    if not isinstance(categories, dict):
+        categories = {category: result.get(field, 0) for category, field in CATEGORY_FIELDS.items()}
+    values = {'total_emission': result.get('total_emission')}
+    values.update((field, categories.get(category, 0)) for category, field in CATEGORY_FIELDS.items())
+    for field, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"result.{field} must be a number")
+    values['trees_required'] = math.ceil(values['total_emission'] / TABLES.factors.tree_factor)
+    return apply_rules(values)
+
+def render_export_chunk(items, fmt="docx", cohort=None):
+    """(document, error, seconds) for each export item; runs in an export pool process."""
+    started = time.perf_counter()
+    results = [None] * len(items)
+    texts = []
+    for i, item in enumerate(items):
+        if 'result' in item:
+            try:
+                results[i] = stored_result(item['result'])
+            except ValueError as e:
+                results[i] = {'error': str(e)}
+        else:
+            texts.append(i)
+    if texts:
+        for i, result in zip(texts, parse_inputs_batch([items[i].get('user_input') for i in texts])):
+            results[i] = result
+    # The parse is batched, so each item is charged an equal share of it
+    shared = (time.perf_counter() - started) / len(items)
+
+    rendered = []
+    for result in results:
+        if 'error' in result:
+            rendered.append((None, result['error'], shared))
+            continue
+        started = time.perf_counter()
+        try:
+            result['population'] = population_comparison(result, cohort)
+            result['badges'] = result.get('badges', []) + population_badges(result['population'])
+            with stage("report"):
+                if fmt == "docx":
+                    data = get_report_renderer().render(result)
+                else:
+                    from .report import render_html
+                    data = render_html(result)
+            rendered.append((data, None, shared + time.perf_counter() - started))
+        except Exception as e:
+            rendered.append((None, str(e) or e.__class__.__name__, shared + time.perf_counter() - started))
+    return rendered
+
+def build_report_export(payload, path, progress_path):
+    # Imported (and for DOCX, the template built) before the pool forks, so every process shares them
+    if payload['format'] == "docx":
+        get_report_renderer()
+    else:
+        from . import report  # noqa: F401
+    render = functools.partial(render_export_chunk, fmt=payload['format'], cohort=payload.get('cohort'))
+    export_reports(payload['items'], render, path, fmt=payload['format'], processes=EXPORT_PROCESSES,
+                   chunk_size=EXPORT_CHUNK, progress_path=progress_path)
+
+REPORT_EXPORTS = FileJobQueue(
+    job_dir=os.environ.get("REPORT_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "carbon-report-exports")),
+    build=build_report_export,
+    suffix=".zip",
+    max_workers=int(os.environ.get("EXPORT_JOB_WORKERS", 1)),
+    max_queue=int(os.environ.get("EXPORT_JOB_QUEUE", 4)),
+    ttl=float(os.environ.get("REPORT_JOB_TTL", 3600)),
+    to_file=True
+)
+
+# Per-user history (/api/history/...); opened in the worker on first use
+HISTORY_DB = os.environ.get("HISTORY_DB", os.path.join(tempfile.gettempdir(), "carbon-history.sqlite3"))
+HISTORY_MAX_ENTRIES = int(os.environ.get("HISTORY_MAX_ENTRIES", 1000))
+USER_ID_PATTERN = re.compile(r"[A-Za-z0-9_.@-]{1,128}")
+history_store = None
+
+def get_history_store():
+    global history_store
+    if history_store is None:
+        history_store = HistoryStore(HISTORY_DB)
+    return history_store
+
+def parse_day(value):
+    """A date from an ISO "YYYY-MM-DD" string (None passes through); ValueError otherwise."""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("dates must be YYYY-MM-DD strings")
+    return datetime.date.fromisoformat(value)
+
+# Population percentiles ("lower than N% of users"): a quantile sketch per
+# cohort and category, merged across workers through POPULATION_DB
+POPULATION_DB = os.environ.get("POPULATION_DB", os.path.join(tempfile.gettempdir(), "carbon-population.sqlite3"))
+POPULATION_MIN_COUNT = int(os.environ.get("POPULATION_MIN_COUNT", 20))
+POPULATION_REFRESH = float(os.environ.get("POPULATION_REFRESH", 30))
+POPULATION_FLUSH_EVERY = int(os.environ.get("POPULATION_FLUSH_EVERY", 100))
+POPULATION_CATEGORIES = {"total": "total_emission", **CATEGORY_FIELDS}
+# Cohorts clients may name (comma-separated); each one gets its own rows in
+# POPULATION_DB, so unlisted names are rejected rather than created
+POPULATION_COHORTS = frozenset(
+    name.strip() for name in os.environ.get("POPULATION_COHORTS", "").split(",") if name.strip()
+) | {"all"}
+population_store = None
+
+def get_population_store():
+    global population_store
+    if population_store is None:
+        population_store = PopulationStore(POPULATION_DB, POPULATION_CATEGORIES, flush_every=POPULATION_FLUSH_EVERY,
+                                           refresh_interval=POPULATION_REFRESH)
+    return population_store
+
+def parse_cohort(value):
+    """A cohort name from POPULATION_COHORTS (None passes through); ValueError otherwise."""
+    if value is None:
+        return None
+    if not (isinstance(value, str) and value in POPULATION_COHORTS):
+        raise ValueError(f"unknown cohort; expected one of {', '.join(sorted(POPULATION_COHORTS))}")
+    return value
+
+def observe_result(result, cohort=None):
+    """Add a result to the "all" population and to its cohort's."""
+    cohorts = ("all", cohort) if cohort and cohort != "all" else ("all",)
+    get_population_store().observe(
+        {category: result.get(field, 0) for category, field in POPULATION_CATEGORIES.items()}, cohorts=cohorts
+    )
 
-for category, mapping in raw_aliases.items():
-    matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
-    for standard, variants in mapping.items():
-        matcher.add(standard, [nlp.make_doc(alias) for alias in variants])
-    phrase_matchers[category] = matcher
+def population_comparison(result, cohort=None):
+    """Percent of the cohort's results below this one, per category; None while the cohort is too small."""
+    cohort = cohort or "all"
+    store = get_population_store()
+    with stage("population"):
+        percentiles = {}
+        for category, field in POPULATION_CATEGORIES.items():
+            percentiles[category], count = store.percentile(cohort, category, result.get(field, 0))
+        if count < POPULATION_MIN_COUNT:
+            return None
+        median, _ = store.quantiles(cohort, "total", qs=(0.5,))
+    return {'cohort': cohort, 'count': count, 'percentiles': percentiles, 'median_total': median['p50']}
+
+def population_badges(comparison):
+    # Depend on everyone else's results, so they are added per request and never cached
+    if comparison and comparison['percentiles']['total'] <= 25:
+        return ["Lower Than Most"]
+    return []
+
+# Speech recognition runs on a bounded pool, created in the worker on first use
+SPEECH_BACKEND = os.environ.get("SPEECH_BACKEND", "google")
+SPEECH_WORKERS = int(os.environ.get("SPEECH_WORKERS", 2))
+SPEECH_QUEUE = int(os.environ.get("SPEECH_QUEUE", 4))
+SPEECH_TIMEOUT = float(os.environ.get("SPEECH_TIMEOUT", 15))
+SPEECH_MAX_BYTES = int(os.environ.get("SPEECH_MAX_BYTES", 10 * 1024 * 1024))
+# Recordings longer than twice this are split on pauses and transcribed in parallel
+SPEECH_MIN_SEGMENT = float(os.environ.get("SPEECH_MIN_SEGMENT", 10))
+speech_service = None
+
+def get_speech_service():
+    global speech_service
+    if speech_service is None:
+        speech_service = SpeechService(
+            make_backend(SPEECH_BACKEND, timeout=SPEECH_TIMEOUT),
+            max_workers=SPEECH_WORKERS,
+            max_queue=SPEECH_QUEUE,
+            timeout=SPEECH_TIMEOUT
+        )
+    return speech_service
+
+# Parsing on a pool of NLP processes shared by all gunicorn workers; started
+# by the master (gunicorn.conf.py) when NLP_WORKERS > 0, otherwise every
+# worker parses in-process
+NLP_WORKERS = int(os.environ.get("NLP_WORKERS", 0))
+NLP_QUEUE = int(os.environ.get("NLP_QUEUE", 32))
+NLP_TIMEOUT = float(os.environ.get("NLP_TIMEOUT", 5))
+NLP_CLIENTS = int(os.environ.get("NLP_CLIENTS", 64))
+nlp_pool = None
+
+def parse_in_pool(user_input):
+    # Runs in an NLP worker; factor/alias edits are picked up there too
+    reload_tables_if_changed()
+    return parse_input_to_data(user_input)
+
+def start_nlp_pool():
+    global nlp_pool
+    if nlp_pool is None and NLP_WORKERS > 0:
+        nlp_pool = NLPPool(parse_in_pool, workers=NLP_WORKERS, max_queue=NLP_QUEUE,
+                           timeout=NLP_TIMEOUT, clients=NLP_CLIENTS).start()
+    return nlp_pool
+
+def stop_nlp_pool():
+    global nlp_pool
+    if nlp_pool is not None:
+        nlp_pool.stop()
+        nlp_pool = None
+
+def request_timeout():
+    """The caller's own deadline in seconds (X-Request-Timeout header), or None."""
+    try:
+        timeout = float(request.headers.get('X-Request-Timeout', ''))
+    except ValueError:
+        return None
+    return timeout if timeout > 0 else None
+
+def nlp_pool_error(e):
+    # Queue full: back off and retry; deadline passed or no workers: try later
+    response = jsonify({'error': f'Parser is busy: {e}'})
+    response.headers['Retry-After'] = '1' if isinstance(e, NLPOverloaded) else '5'
+    return response, 429 if isinstance(e, NLPOverloaded) else 503
+
+# Prometheus-style metrics for /metrics; values are per worker process
+METRICS = Registry()
+STAGE_SECONDS = METRICS.histogram(
+    "carbon_stage_seconds", "Time spent in each parse/report/speech stage.", ["stage"]
+)
+REQUEST_SECONDS = METRICS.histogram(
+    "carbon_http_request_seconds", "HTTP request latency by endpoint.", ["endpoint"]
+)
+REQUESTS = METRICS.counter(
+    "carbon_http_requests_total", "HTTP requests by endpoint and status code.", ["endpoint", "status"]
+)
+add_stage_observer(lambda name, seconds: STAGE_SECONDS.observe(seconds, stage=name))
+
+def cache_metrics():
+    stats = PARSE_CACHE.stats()
+    yield ("carbon_parse_cache_entries", "gauge", "Entries in the parse cache.", [({}, stats["size"])])
+    yield ("carbon_parse_cache_hits_total", "counter", "Parse cache hits.", [({}, stats["hits"])])
+    yield ("carbon_parse_cache_misses_total", "counter", "Parse cache misses.", [({}, stats["misses"])])
+    yield ("carbon_parse_cache_evictions_total", "counter", "Parse cache evictions.", [({}, stats["evictions"])])
+
+def report_queue_metrics():
+    stats = REPORT_JOBS.stats()
+    yield ("carbon_report_jobs_pending", "gauge", "Report jobs queued or running.", [({}, stats["depth"])])
+    yield ("carbon_report_jobs_max_queue", "gauge", "Report job queue limit.", [({}, stats["max_queue"])])
+    stats = REPORT_EXPORTS.stats()
+    yield ("carbon_report_exports_pending", "gauge", "Bulk report exports queued or running.", [({}, stats["depth"])])
+    yield ("carbon_report_exports_max_queue", "gauge", "Bulk report export queue limit.", [({}, stats["max_queue"])])
+
+def speech_metrics():
+    if speech_service is None:
+        return
+    stats = speech_service.stats()
+    yield ("carbon_speech_in_flight", "gauge", "Recognitions running or queued.", [({}, stats["in_flight"])])
+    yield ("carbon_speech_requests_total", "counter", "Recognitions by outcome.",
+           [({"outcome": outcome}, count) for outcome, count in sorted(stats["outcomes"].items())])
+
+METRICS.register_collector(cache_metrics)
+METRICS.register_collector(report_queue_metrics)
+METRICS.register_collector(speech_metrics)
+
+def clause_memo_metrics():
+    if CLAUSE_MEMO is None:
+        return
+    stats = CLAUSE_MEMO.stats()
+    yield ("carbon_clause_memo_hits_total", "counter", "Clause memo hits in this worker.", [({}, stats["hits"])])
+    yield ("carbon_clause_memo_misses_total", "counter", "Clause memo misses in this worker.", [({}, stats["misses"])])
+    yield ("carbon_clause_memo_errors_total", "counter", "Clause memo SQLite errors in this worker.", [({}, stats["errors"])])
+
+METRICS.register_collector(clause_memo_metrics)
+
+def nlp_pool_metrics():
+    # Pool-wide values (shared memory), the same from every worker
+    if nlp_pool is None:
+        return
+    stats = nlp_pool.stats()
+    yield ("carbon_nlp_pool_workers_alive", "gauge", "NLP worker processes running.", [({}, stats["alive"])])
+    yield ("carbon_nlp_pool_depth", "gauge", "Parses waiting in the NLP pool queue.", [({}, stats["depth"])])
+    yield ("carbon_nlp_pool_max_queue", "gauge", "NLP pool queue limit.", [({}, stats["max_queue"])])
+    yield ("carbon_nlp_pool_busy", "gauge", "NLP workers parsing right now.", [({}, stats["busy"])])
+    yield ("carbon_nlp_pool_queue_wait_seconds_total", "counter", "Time parses spent queued.",
+           [({}, stats["queue_wait_seconds_total"])])
+    yield ("carbon_nlp_pool_dequeued_total", "counter", "Parses taken off the queue.", [({}, stats["dequeued"])])
+    yield ("carbon_nlp_pool_requests_total", "counter", "NLP pool parses by outcome.",
+           [({"outcome": outcome}, count) for outcome, count in stats["outcomes"].items()])
+
+METRICS.register_collector(nlp_pool_metrics)
+
+def population_metrics():
+    if population_store is None:
+        return
+    stats = population_store.stats()
+    yield ("carbon_population_observed_total", "counter", "Results added to the population sketches by this worker.",
+           [({}, stats["observed"])])
+    yield ("carbon_population_pending", "gauge", "Observations not yet written to POPULATION_DB.", [({}, stats["pending"])])
+    yield ("carbon_population_errors_total", "counter", "Population store SQLite errors in this worker.",
+           [({}, stats["errors"])])
+
+METRICS.register_collector(population_metrics)
     
-def apply_phrase_matchers(user_input):
-    doc = nlp(user_input)
-    replaced_text = user_input
-
-    for category, matcher in phrase_matchers.items():
-        matches = matcher(doc)
-        for match_id, start, end in matches:
-            span = doc[start:end]
+# Keyword pattern tables, compiled once; "{kw}" stands for the mode/item name
+TRANSPORT_PATTERN_TEMPLATES = [
+    r"{kw}.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
+    r"(\d+(\.\d+)?)\s*(km|kilometers?|miles).*?{kw}",
+    r"(rode|used|took|travelled|drove|drive|commuted|covered|went by|on a).*?{kw}.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
+    r"distance.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles).*?{kw}",
+    r"i.*?{kw}.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
+    r"{kw}.*?(covered|went|ran|moved|trip|journey|ride|travelled).*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
+    r"{kw}.*?(\d+(\.\d+)?)(km|kilometers?|miles).*?(ride|travel)?",
+    r"{kw}.*?(commuted|traveled|used).*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
+    r"drove\s+(\d+(\.\d+)?)\s*(km|kilometers?|miles)\s+in\s+a\s+{kw}",
+    r"used\s+a\s+{kw}\s+for\s+(\d+(\.\d+)?)\s*(km|kilometers?|miles)"
+]
+
+FOOD_PATTERN_TEMPLATES = [
+    r"(\d+(\.\d+)?)\s*(kg|kgs|g|gram|grams|ml|milliliters?|l|liters?|litres?)\s+(of\s+)?{kw}\b",
+    r"{kw}\s*(amount|weighed|weighing|measured|totaled)?\s*(is|was)?\s*(about|around)?\s*(\d+(\.\d+)?)\s*(kg|g|grams|ml|l|liters?|litres?)\b",
+    r"(ate|had|consumed)\s+(about|around)?\s*(\d+(\.\d+)?)\s*(kg|g|grams|ml|l|liters?)\s+(of\s+)?{kw}\b",
+    r"\b{kw}\b.*?(about|around)?\s*(\d+(\.\d+)?)\s*(kg|g|ml|l)",
+    r"{kw}\s*[:\-]?\s*(\d+(\.\d+)?)\s*(kg|g|ml|l)"
+]
+
+SHOPPING_RUPEE_PATTERN_TEMPLATES = [
+    r"{kw}.*?(for|cost|price|worth|at)?\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?",
+    r"(bought|purchased|got|ordered).*?{kw}.*?(for|cost|price|worth|at)?\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?",
+    r"spent\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?\s*(on)?\s*{kw}",
+    r"₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?\s*(for|on)?\s*{kw}",
+    r"purchase of\s*{kw}.*?(cost|price|was)?\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?",
+    r"my\s*{kw}.*?(cost|price|was)?\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?",
+]
+
+SHOPPING_WEIGHT_PATTERN_TEMPLATES = [
+    r"(bought|purchased|got)?\s*(\d+(\.\d+)?)\s*(kg|kgs|kilograms?)\s+(of\s+)?{kw}",
+    r"{kw}.*?(amount|weighed|weighing)?\s*(is|was)?\s*(\d+(\.\d+)?)\s*(kg|kgs|kilograms?)",
+]
+
+def compile_factor_patterns(factors):
+    """(transport, food, shopping) pattern tables for the names in a factor registry.
+
+    Shopping maps each category to its (rupee patterns, weight patterns).
+    """
+    rupee = compile_keyword_patterns(factors.shopping.names, SHOPPING_RUPEE_PATTERN_TEMPLATES)
+    weight = compile_keyword_patterns(factors.shopping.names, SHOPPING_WEIGHT_PATTERN_TEMPLATES)
+    return (
+        compile_keyword_patterns(factors.transport.names, TRANSPORT_PATTERN_TEMPLATES),
+        compile_keyword_patterns([item.lower() for item in factors.food.names], FOOD_PATTERN_TEMPLATES),
+        {item: (rupee[item], weight[item]) for item in factors.shopping.names},
+    )
+
+def build_tables(factors):
+    """A Tables for ``factors``: its extraction patterns and the alias tables built on it."""
+    return Tables(factors, compile_factor_patterns(factors), build_alias_tables(factors=factors))
+
+# Held while a reload builds and swaps TABLES (or RULES), so two threads
+# noticing the same edit build it once
+TABLES_LOCK = threading.Lock()
+factors_mtime = os.stat(FACTORS_PATH).st_mtime_ns
+TABLES = build_tables(load_registry(FACTORS_PATH))
+
+def reload_factors_if_changed():
+    """Swap in new tables (registry, patterns, keyword index and aliases) if factors.json changed.
+
+    The new Tables is built in full, under TABLES_LOCK, and replaces TABLES in
+    one assignment; requests on other threads keep the Tables they started
+    with (see Tables), so each sees either the old tables or the new ones.
+    Nothing is swapped if any step fails.
+    A file that fails validation, or changes content without changing its
+    version, is logged and ignored; the current tables stay in service.
+    """
+    global TABLES, factors_mtime
+    try:
+        mtime = os.stat(FACTORS_PATH).st_mtime_ns
+    except OSError:
+        return False
+    if mtime == factors_mtime:
+        return False
+    with TABLES_LOCK:
+        if mtime == factors_mtime:
+            return False
+        # Recorded even if the file is rejected, so it is reported once and not on every request
+        factors_mtime = mtime
+        try:
+            factors = load_registry(FACTORS_PATH)
+        except (OSError, FactorFileError) as e:
+            log_event("factors_rejected", level=logging.ERROR, sampled=False, error=str(e))
+            return False
+        current = TABLES.factors
+        if factors.digest == current.digest:
+            return False
+        if factors.version == current.version:
+            log_event("factors_rejected", level=logging.ERROR, sampled=False,
+                      error=f"factors changed but version is still {factors.version!r}")
+            return False
+
+        TABLES = build_tables(factors)
+    log_event("factors_reloaded", sampled=False, previous=current.version, version=factors.version)
+    return True
+
+def reload_rules_if_changed():
+    """Swap in a new RULES if rules.json changed; rejected files are logged and ignored, as for factors.json."""
+    global RULES, rules_mtime
+    try:
+        mtime = os.stat(RULES_PATH).st_mtime_ns
+    except OSError:
+        return False
+    if mtime == rules_mtime:
+        return False
+    with TABLES_LOCK:
+        if mtime == rules_mtime:
+            return False
+        rules_mtime = mtime
+        try:
+            rules = load_rules(RULES_PATH)
+        except (OSError, RuleFileError) as e:
+            log_event("rules_rejected", level=logging.ERROR, sampled=False, error=str(e))
+            return False
+        if rules.digest == RULES.digest:
+            return False
+        if rules.version == RULES.version:
+            log_event("rules_rejected", level=logging.ERROR, sampled=False,
+                      error=f"rules changed but version is still {rules.version!r}")
+            return False
+        previous = RULES.version
+        RULES = rules
+    log_event("rules_reloaded", sampled=False, previous=previous, version=rules.version)
+    return True
+
+def reload_tables_if_changed():
+    """Pick up edits to factors.json, aliases.json and rules.json; True if anything was reloaded."""
+    reloaded = reload_factors_if_changed()
+    reloaded = reload_rules_if_changed() or reloaded
+    return reload_aliases_if_changed() or reloaded
+
+ELECTRICITY_PATTERNS = [re.compile(p) for p in [
+    r"(\d+(\.\d+)?)\s*(kwh|kilowatt-hours?)",
+    r"(used|consumed).*?(\d+(\.\d+)?)\s*(kwh|kilowatt-hours?)",
+    r"electricity.*?(\d+(\.\d+)?)\s*(kwh|kilowatt-hours?)",
+    r"(\d+(\.\d+)?)\s*(kwh|kilowatt-hours?)\s*used"
+]]
+
+FLIGHT_PATTERNS = [re.compile(p) for p in [
+    r"(\d+(\.\d+)?)\s*(km|kilometers?|miles)\s+(domestic|international|business|economy)?\s*flight",
+    r"(domestic|international|business|economy)?\s*flight\s+of\s+(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
+    r"flight.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles).*?(domestic|international|business|economy)?"
+]]
+
+WATER_PATTERNS = [re.compile(p) for p in [
+    r"(\d+(\.\d+)?)\s*(liters?|litres?|l|ml).*?(tap|bottled)?\s*water",
+    r"(tap|bottled)\s*water.*?(\d+(\.\d+)?)\s*(liters?|litres?|l|ml)",
+    r"water\s*(tap|bottled).*?(\d+(\.\d+)?)\s*(liters?|litres?|l|ml)",
+    r"drank\s*(\d+(\.\d+)?)\s*(liters?|litres?|l|ml)\s*of\s*(tap|bottled)?\s*water"
+]]
+
+PLASTIC_PATTERNS = [re.compile(p) for p in [
+    r"used\s*(\d+(\.\d+)?)\s*(kg|g|gram|grams)\s*(of\s*)?(pet|hdpe|pvc)?\s*plastic",
+    r"(\d+(\.\d+)?)\s*(kg|g|gram|grams)\s*(of\s*)?(pet|hdpe|pvc)?\s*plastic",
+    r"plastic.*?(pet|hdpe|pvc)?\s*(\d+(\.\d+)?)\s*(kg|g|gram|grams)"
+]]
+
+@functools.lru_cache(maxsize=4096)
+def alias_phrase_pattern(phrase):
+    return re.compile(rf"\b{re.escape(phrase)}\b", re.IGNORECASE)
+
+def apply_phrase_matchers(doc, tables=None):
+    """The alias-rewritten text of ``doc`` and the rewritten regions in it.
+
+    Same text as the original rewrite: for each matcher hit, category by
+    category in aliases.json order, every occurrence of the hit's text in the
+    text so far is replaced by its label, so a later hit can rewrite part of
+    an earlier label again (food "black tea" -> "tea", then shopping "tea" ->
+    "groceries"). Each piece of the text remembers the doc characters it
+    came from, which maps every rewritten region back to doc tokens without
+    parsing the new text. Regions are (label, text, start, end) in text
+    order: the last label written there, the text it ended up as, and the
+    doc tokens it replaced.
+
+    A hit whose text still occurs costs one scan of the text so far;
+    extraction works clause by clause, so that text stays short.
+    """
+    text = source_text = doc.text
+    folded = text.casefold()
+    # [length, node, source offset]; node None is doc text, otherwise a label
+    # (source offset None) -- nodes merge when a rewrite covers several
+    pieces = [[len(text), None, 0]]
+    parent, labels, sources = [], [], []
+
+    def root(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def split(piece, offset):
+        length, node, source = piece
+        right = [length - offset, node, None if source is None else source + offset]
+        return [offset, node, source], right
+
+    for matcher in (tables or TABLES).phrase_matchers.values():
+        for match_id, start, end in matcher(doc):
+            phrase = doc[start:end].text
+            # Most hits repeat a phrase an earlier one already replaced; a
+            # substring test rules those out faster than the regex
+            if phrase.casefold() not in folded:
+                continue
+            hits = [match.span() for match in alias_phrase_pattern(phrase).finditer(text)]
+            if not hits:
+                continue
             label = nlp.vocab.strings[match_id]
-            replaced_text = re.sub(rf"\b{re.escape(span.text)}\b", label, replaced_text, flags=re.IGNORECASE)
+            # Cut pieces at the hit boundaries, then swap each hit's pieces
+            # for one label piece (from the last hit, so indexes stay valid)
+            starts = list(itertools.accumulate((piece[0] for piece in pieces), initial=0))
+            for cut in sorted({offset for hit in hits for offset in hit}):
+                k = bisect.bisect_right(starts, cut) - 1
+                if starts[k] < cut < starts[-1]:
+                    pieces[k:k + 1] = split(pieces[k], cut - starts[k])
+                    starts.insert(k + 1, cut)
+            for a, b in reversed(hits):
+                first, last = bisect.bisect_left(starts, a), bisect.bisect_left(starts, b)
+                node = len(parent)
+                parent.append(node)
+                labels.append(label)
+                lo, hi = len(source_text), 0
+                for length, other, source in pieces[first:last]:
+                    if other is None:
+                        lo, hi = min(lo, source), max(hi, source + length)
+                    elif root(other) != node:
+                        other = root(other)
+                        lo, hi = min(lo, sources[other][0]), max(hi, sources[other][1])
+                        parent[other] = node
+                sources.append((lo, hi))
+                pieces[first:last] = [[len(label), node, None]]
+            chunks = []
+            pos = 0
+            for a, b in hits:
+                chunks.append(text[pos:a])
+                chunks.append(label)
+                pos = b
+            chunks.append(text[pos:])
+            text = "".join(chunks)
+            folded = text.casefold()
+
+    # Consecutive pieces of one node make a region; regions over the same
+    # doc tokens merge
+    regions = []
+    pos = 0
+    for length, node, source in pieces:
+        if node is not None:
+            node = root(node)
+            lo, hi = sources[node]
+            span = doc.char_span(lo, hi, alignment_mode="expand")
+            if regions and (regions[-1][0] == node or span.start < regions[-1][4]):
+                regions[-1][0] = node
+                regions[-1][2] = pos + length
+                regions[-1][3] = min(regions[-1][3], span.start)
+                regions[-1][4] = max(regions[-1][4], span.end)
+            else:
+                regions.append([node, pos, pos + length, span.start, span.end])
+        pos += length
+    return text, [(labels[node], text[a:b], start, end) for node, a, b, start, end in regions]
+
+LABEL_LEMMAS = {}
+
+def label_word(label):
+    # A one-word label stands for its lemma, as it did when the fallback read
+    # the rewritten text ("fruits" -> "fruit"); longer labels stay whole
+    label = label.lower()
+    if " " in label:
+        return label
+    if label not in LABEL_LEMMAS:
+        LABEL_LEMMAS[label] = nlp(label)[0].lemma_.lower()
+    return LABEL_LEMMAS[label]
+
+def canonical_words(doc, aliases):
+    """Yield (word, token) pairs with rewritten regions collapsed to the text they were rewritten to."""
+    spans = {start: (rewritten, end) for label, rewritten, start, end in aliases}
+    i = 0
+    while i < len(doc):
+        if i in spans:
+            rewritten, end = spans[i]
+            yield label_word(rewritten), doc[end - 1]
+            i = end
+        else:
+            yield doc[i].lemma_.lower(), doc[i]
+            i += 1
 
-    return replaced_text
+def is_clause_break(token):
+    return token.text in CLAUSE_BREAKS or (token.is_space and "\n" in token.text)
 
-def detect_shopping_spacy(doc):
+def detect_shopping_spacy(words):
+    """(spend, category) from (word, token) pairs; each is the last one seen, or None."""
     shopping_keywords = {
         "clothes": [
             "shirt", "jeans", "clothes", "dress", "saree", "tshirt", "hoodie", "shoes",
@@ -223,12 +857,12 @@ def detect_shopping_spacy(doc):
         ]
     }
 
-    spend = 0
+    spend = None
     category = None
 
-    for token in doc:
+    for word, token in words:
         for cat, keywords in shopping_keywords.items():
-            if token.lemma_ in keywords:
+            if word in keywords:
                 category = cat
 
         if token.text.lower() in ["rs", "rupees"]:
@@ -242,161 +876,18 @@ def detect_shopping_spacy(doc):
     return spend, category
 
 
-def detect_food_spacy(doc):
-    food_data = {}
-    for token in doc:
-        word = token.lemma_.lower()
-        if word in FOOD_FACTORS:
-            food_data[word] = food_data.get(word, 0) + 0.15  # Default to 150g
-    return food_data
+def detect_food_spacy(words, factors):
+    """Food names of ``factors`` among (word, token) pairs, in order; each counts as a default 150 g."""
+    return [word for word, token in words if word in factors.food]
 
 
 # Tips and Rewards
-def generate_tips(result):
-    tips = []
-
-    transport = result.get("transport_total", 0)
-    if transport > 100:
-        tips.extend([
-            f"Your transport emissions are very high ({transport} kg CO₂). Try limiting long-distance travel or combining errands to reduce trips.",
-            "Switch to an electric or hybrid vehicle if possible.",
-            "Use apps for ride-sharing or carpooling to reduce solo trips.",
-            "Consider working remotely if your job allows to reduce commuting."
-        ])
-    elif transport > 50:
-        tips.extend([
-            f"Your transport emissions are quite high ({transport} kg CO₂). Use public transport more often.",
-            "Try biking or walking for short distances.",
-            "Plan your week to reduce unnecessary trips.",
-        ])
-
-    food = result.get("food_total", 0)
-    if food > 70:
-        tips.extend([
-            f"Your food emissions are high ({food} kg CO₂). Reduce consumption of red meat and dairy.",
-            "Buy local and seasonal produce to reduce transport-related emissions.",
-            "Avoid food waste — freeze leftovers or plan meals in advance.",
-            "Explore vegetarian or vegan recipes once or twice a week."
-        ])
-    elif food > 30:
-        tips.extend([
-            f"Your food-related emissions are {food} kg CO₂. Include more plant-based meals in your diet.",
-            "Cut back on processed and packaged foods.",
-            "Reduce portion sizes and compost food waste where possible.",
-        ])
-
-    plastic = result.get("plastic_kg", 0)
-    if plastic > 5:
-        tips.extend([
-            f"You used {plastic} kg of plastic. Switch to glass, metal, or cloth alternatives.",
-            "Carry a reusable bag, bottle, and straw when going out.",
-            "Avoid products with excessive packaging.",
-            "Buy in bulk to reduce plastic waste from packaging."
-        ])
-    elif plastic > 2:
-        tips.extend([
-            f"You used {plastic} kg of plastic. Try using shampoo bars and refillable containers.",
-            "Opt for biodegradable packaging whenever possible.",
-            "Participate in local plastic recycling or cleanup programs.",
-        ])
-
-    electricity = result.get("electricity_kwh", 0)
-    if electricity > 50:
-        tips.extend([
-            f"You consumed {electricity} kWh of electricity. Switch to LED lights and unplug electronics when not in use.",
-            "Use a programmable thermostat to optimize cooling/heating.",
-            "Consider installing solar panels if you have the option.",
-            "Wash clothes in cold water and air-dry them when possible."
-        ])
-    elif electricity > 20:
-        tips.extend([
-            f"Your electricity usage is {electricity} kWh. Reduce screen time and power-hungry devices.",
-            "Turn off appliances at the socket instead of leaving them on standby.",
-            "Use smart plugs to schedule or monitor appliance use.",
-        ])
-
-    shopping = result.get("shopping_spend", 0)
-    if shopping > 50:
-        tips.extend([
-            f"Your shopping emissions are {shopping} kg CO₂. Avoid fast fashion; buy durable, timeless pieces.",
-            "Support local businesses and eco-conscious brands.",
-            "Think twice before buying: do I really need this?",
-            "Repair and reuse items before replacing them."
-        ])
-    elif shopping > 10:
-        tips.extend([
-            f"Shopping contributed {shopping} kg CO₂. Try thrift stores and second-hand platforms.",
-            "Limit impulse buys and unsubscribe from promotional emails.",
-            "Choose digital or paperless alternatives where possible."
-        ])
-
-    water = result.get("water_liters", 0)
-    if water > 200:
-        tips.extend([
-            f"You used {water} liters of water. Install low-flow showerheads and dual-flush toilets.",
-            "Collect rainwater for gardening and cleaning.",
-            "Run dishwashers and washing machines only with full loads.",
-            "Avoid washing vehicles frequently or use waterless products."
-        ])
-    elif water > 100:
-        tips.extend([
-            f"Water consumption at {water} liters — shorten shower time to under 5 minutes.",
-            "Turn off taps while brushing or shaving.",
-            "Fix leaks promptly — even slow drips waste liters daily.",
-        ])
-
-    total = result.get("total_emission", 0)
-    if total > 2000:
-        tips.extend([
-            f"Your total footprint is very high ({total} kg CO₂). A deep audit of your lifestyle could help — track and measure monthly emissions.",
-            "Set goals to reduce 10% each month through small changes in every area.",
-            "Get involved in community greening efforts or tree planting.",
-        ])
-    elif total > 1000:
-        tips.extend([
-            f"Total emissions of {total} kg CO₂ can be improved by tackling 2–3 habits at a time.",
-            "Set personal sustainability challenges (like a no-buy month or plastic-free week).",
-            "Educate others around you — collective change amplifies impact.",
-        ])
-    elif total < 200:
-        tips.extend([
-            "Great job! Your total carbon footprint is impressively low — you're on a sustainable path.",
-            "Keep up your eco-friendly choices and inspire others by sharing your habits.",
-            "Try offsetting what little CO₂ you emit via verified carbon offset platforms.",
-        ])
-    elif total < 100:
-        tips.append("Excellent! You're living one of the lowest-impact lifestyles according to your total carbon footprint. You could mentor others on how to reduce theirs!")
-
-    return tips
-
-def assign_badges(result):
-    badges = []
-
-    if result["total_emission"] < 100:
-        badges.append("Low Carbon Hero")
-    
-    if result["total_emission"] < 4000:
-        badges.append("Below Global Average")
-
-    if result.get("plastic_kg", 0) < 1:
-        badges.append("Plastic Reducer")
-
-    if result.get("transport_total", 0) < 10:
-        badges.append("Eco Commuter")
-
-    if result.get("food_total", 0) < 5:
-        badges.append("Green Eater")
-
-    if result.get("electricity_kwh", 0) < 10:
-        badges.append("Energy Saver")
-
-    if result.get("shopping_spend", 0) < 2:
-        badges.append("Minimal Shopper")
-
-    if result.get("water_liters", 0) < 10:
-        badges.append("Water Wise")
-
-    return badges
+def apply_rules(result):
+    """Set a result's tips and badges from the current rules.json."""
+    rules = RULES
+    result["tips"], result["badges"] = rules.apply(result)
+    result["rules_version"] = rules.version
+    return result
 
 # Main Calculation
 def calculate_carbon(
@@ -410,19 +901,22 @@ def calculate_carbon(
     water_liters=0,
     water_type="tap",
     plastic_kg=0,
-    plastic_type="PET"
+    plastic_type="PET",
+    factors=None
 ):
     result = {}
     total = 0
     unknowns = {"food": [], "plastic": []}
+    # One registry for the whole calculation, even if a reload swaps TABLES;
+    # parses pass the one their extraction used
+    factors = factors or TABLES.factors
 
     # Transport
-    all_transport = flatten_transport_factors()
     transport_emissions = 0
     transport_details = {}
 
     for mode, km in transport_data.items():
-        factor = all_transport.get(mode.lower(), 0)
+        factor = factors.transport.factor(mode)
         emission = round(km * factor, 2)
         transport_details[mode] = emission
         transport_emissions += emission
@@ -432,7 +926,7 @@ def calculate_carbon(
     total += transport_emissions
 
     # Electricity
-    elec_emission = round(electricity_kwh * 0.7, 2)
+    elec_emission = round(electricity_kwh * factors.electricity_factor, 2)
     result["electricity_kwh"] = elec_emission
     total += elec_emission
 
@@ -440,11 +934,9 @@ def calculate_carbon(
     food_emissions = 0
     food_breakdown = {}
     for item, qty in food_data.items():
-        item_lower = item.lower()
-        factor = FOOD_FACTORS.get(item_lower, None)
-        if factor is None:
+        if item not in factors.food:
             unknowns["food"].append(item)
-            factor = 5.0
+        factor = factors.food.factor(item)
         emission = round(qty * factor, 2)
         food_breakdown[item] = emission
         food_emissions += emission
@@ -454,9 +946,8 @@ def calculate_carbon(
     total += food_emissions
 
     # Shopping
-    shop_data = SHOPPING_COST_ESTIMATES.get(shopping_type.lower(), {"rupee_per_kg": 100})
-    shop_factor = SHOPPING_FACTORS.get(shopping_type.lower(), 1.5)
-    estimated_kg = shopping_spend / shop_data["rupee_per_kg"]
+    shop_factor = factors.shopping.factor(shopping_type)
+    estimated_kg = shopping_spend / factors.shopping_cost.factor(shopping_type)
     shop_emission = round(estimated_kg * shop_factor, 2)
     result["shopping_spend"] = shop_emission
     total += shop_emission
@@ -464,23 +955,22 @@ def calculate_carbon(
     # Flights
     if flight_km > 0 and flight_type:
         key = "flight_" + flight_type.lower()
-        air_factor = TRANSPORT_FACTORS["air"].get(key, 0.18)
+        air_factor = factors.air.factor(key)
         flight_emission = round(flight_km * air_factor, 2)
         result["flight_km"] = flight_emission
         total += flight_emission
 
     # Water
-    water_factor = WATER_FACTORS.get(water_type.lower(), 0.25)
+    water_factor = factors.water.factor(water_type)
     water_emission = round((water_liters / 100) * water_factor, 2)
     result["water_liters"] = water_emission
     total += water_emission
 
     # Plastic
     plastic_type = plastic_type.upper()
-    plastic_factor = PLASTIC_FACTORS.get(plastic_type, None)
-    if plastic_factor is None:
+    if plastic_type not in factors.plastic:
         unknowns["plastic"].append(plastic_type)
-        plastic_factor = 5.0
+    plastic_factor = factors.plastic.factor(plastic_type)
     plastic_emission = round(plastic_kg * plastic_factor, 2)
     result["plastic_kg"] = plastic_emission
     total += plastic_emission
@@ -501,267 +991,391 @@ def calculate_carbon(
     result["total_emission"] = round(total, 2)
     result["unknown_inputs"] = unknowns
     
-    trees_required = math.ceil(result['total_emission'] / 0.7)
+    trees_required = math.ceil(result['total_emission'] / factors.tree_factor)
     result["trees_required"] = trees_required
-    result["tips"] = generate_tips(result)
-    result["badges"] = assign_badges(result)
+    result["factor_version"] = factors.version
+    with stage("tips_badges"):
+        apply_rules(result)
     
     return result
 
+RECORD_NUMBER_FIELDS = ["electricity_kwh", "shopping_spend", "flight_km", "water_liters", "plastic_kg"]
+RECORD_TYPE_FIELDS = ["shopping_type", "flight_type", "water_type", "plastic_type"]
+
+def is_record_number(value):
+    # Flask's JSON parser accepts NaN and Infinity, which no amount can be
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value) and value >= 0)
+
+def validate_record(record):
+    if not isinstance(record, dict):
+        return "record must be an object"
+    for field in ["transport_data", "food_data"]:
+        values = record.get(field, {})
+        if not isinstance(values, dict) or not all(is_record_number(v) for v in values.values()):
+            return f"{field} must map names to finite, non-negative numbers"
+    for field in RECORD_NUMBER_FIELDS:
+        if not is_record_number(record.get(field, 0)):
+            return f"{field} must be a finite, non-negative number"
+    for field in RECORD_TYPE_FIELDS:
+        if not isinstance(record.get(field, ""), str):
+            return f"{field} must be a string"
+    return None
+
+def calculate_carbon_records(records):
+    """calculate_carbon for many structured records at once; invalid ones get an error entry."""
+    results = [None] * len(records)
+    valid = []
+    for i, record in enumerate(records):
+        error = validate_record(record)
+        if error:
+            results[i] = {'error': error}
+        else:
+            valid.append(i)
+
+    # Columnar engine for structured records (/api/calculate/structured)
+    columns = ColumnarCalculator(TABLES.factors).calculate([records[i] for i in valid])
+    rules = RULES
+    with stage("tips_badges"):
+        outputs = rules.apply_many({field: getattr(columns, field) for field in rules.fields})
+    for row, i in enumerate(valid):
+        if not math.isfinite(columns.total_emission[row]):
+            # Every amount is finite, but together they overflow
+            results[i] = {'error': "amounts are too large to calculate"}
+            continue
+        result = columns.row(row)
+        result["tips"], result["badges"] = outputs[row]
+        result["rules_version"] = rules.version
+        results[i] = result
+
+    return results
+
 def extract_number(groups):
     for g in groups:
         if g and re.match(r"^\d+(\.\d+)?$", g):
             return float(g)
     return 0
 
-def parse_input_to_data(user_input):
-    user_input = user_input.lower()
-    
-    transport_data = {}
-    food_data = {}
-    electricity_kwh = 0
-    shopping_spend = 0
-    shopping_type = "clothes"
-    flight_km = 0
-    flight_type = "domestic"
-    water_liters = 0
-    water_type = "tap"
-    plastic_kg = 0
-    plastic_type = "PET"
-
-    alias_applied = apply_phrase_matchers(user_input)
+def parse_input_to_data(user_input, tables=None):
+    tables = tables or TABLES
+    activity = extract_activities([user_input.lower()], tables=tables)[0]
+    with stage("calculate"):
+        return calculate_carbon(**activity, factors=tables.factors)
+
+def parse_input_cached(user_input, timeout=None):
+    """parse_input_to_data behind PARSE_CACHE; repeat inputs skip spaCy and regex work.
+
+    Misses go to the NLP pool when it runs (raising NLPPoolError when it is
+    saturated or ``timeout`` seconds pass); otherwise they parse in-process.
+    """
+    reload_tables_if_changed()
+    tables = TABLES
+    key = (tables.version, user_input.lower().strip())
+    result = PARSE_CACHE.get(key)
+    if result is None:
+        if nlp_pool is not None:
+            with stage("nlp_pool"):
+                result = nlp_pool.run(user_input, timeout=timeout)
+        else:
+            result = parse_input_to_data(user_input, tables)
+        PARSE_CACHE.set(key, result)
+    # Callers get their own copy so they can't alter what is cached
+    result = copy.deepcopy(result)
+    if result.get('rules_version') != RULES.version:
+        # Cached (or parsed in the pool) under an older rules.json
+        apply_rules(result)
+    return result
 
-    # Extract matched labels from aliases
-    doc = nlp(alias_applied)
-    matched_items = set()
-    for category, matcher in phrase_matchers.items():
-        matches = matcher(doc)
-        for match_id, start, end in matches:
-            label = nlp.vocab.strings[match_id]
-            matched_items.add(label.lower())
+def parse_inputs_batch(user_inputs, batch_size=BATCH_SIZE, n_process=1):
+    """Parse many inputs with nlp.pipe; failures are reported per item."""
+    results = [None] * len(user_inputs)
+    valid = []
+    for i, user_input in enumerate(user_inputs):
+        if isinstance(user_input, str):
+            valid.append(i)
+        else:
+            results[i] = {'error': 'user_input must be a string'}
+
+    texts = [user_inputs[i].lower() for i in valid]
+    tables = TABLES
+    activities = extract_activities(texts, batch_size=batch_size, n_process=n_process, tables=tables)
+    for i, activity in zip(valid, activities):
+        try:
+            results[i] = calculate_carbon(**activity, factors=tables.factors)
+        except Exception as e:
+            results[i] = {'error': str(e)}
+
+    return results
+
+# Event lists of extract_clause_events
+CLAUSE_EVENTS = [
+    "transport", "electricity", "food", "shopping", "flight", "water", "plastic",
+    "aliases", "food_fallback", "shopping_fallback",
+]
+
+def concat_clause_events(parts):
+    """One events dict for the clauses ``parts`` of a text, in order; every event starts with its clause index."""
+    events = {name: [] for name in CLAUSE_EVENTS}
+    for ci, part in enumerate(parts):
+        for name in CLAUSE_EVENTS:
+            events[name].extend([ci, *event] for event in part[name])
+    return events
+
+def table_ranks(table):
+    return {kw: i for i, kw in enumerate(table)}
+
+def ordered_keywords(ranks, found):
+    """The keywords in ``found`` that have a rank (i.e. patterns), in table order."""
+    return sorted((kw for kw in found if kw in ranks), key=ranks.__getitem__)
+
+def extract_clause_events(doc, tables=None):
+    """What one clause contributes: event lists by name (CLAUSE_EVENTS).
+
+    ``doc`` is the clause alone (see clause_texts), so its events depend on
+    its text and nothing else and can be memoized by it; combine_clause_events()
+    replays the events of a text's clauses in the order the extraction loops
+    would meet them in the whole text.
+    """
+    tables = tables or TABLES
+    # One spaCy pass feeds the alias matchers and the lemma-based fallbacks
+    with stage("alias_rewrite"):
+        user_input, aliases = apply_phrase_matchers(doc, tables)
+        keywords = tables.keyword_index.find(user_input)
+
+    events = {name: [] for name in CLAUSE_EVENTS}
+    # Only the labels the rewrite leaves in the text; an alias hidden inside a
+    # longer one must not count as matched (it would trigger the shopping fallback)
+    for label, rewritten, start, end in aliases:
+        events["aliases"].append((label.lower(),))
 
-    user_input = alias_applied
-    
     # --- TRANSPORT ---
-    matched_transport_spans = []
-    all_transport_modes = flatten_transport_factors().keys()
-
-    for mode in all_transport_modes:
-        patterns = [
-            rf"{mode}.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
-            rf"(\d+(\.\d+)?)\s*(km|kilometers?|miles).*?{mode}",
-            rf"(rode|used|took|travelled|drove|drive|commuted|covered|went by|on a).*?{mode}.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
-            rf"distance.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles).*?{mode}",
-            rf"i.*?{mode}.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
-            rf"{mode}.*?(covered|went|ran|moved|trip|journey|ride|travelled).*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
-            rf"{mode}.*?(\d+(\.\d+)?)(km|kilometers?|miles).*?(ride|travel)?",
-            rf"{mode}.*?(commuted|traveled|used).*?(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
-            rf"drove\s+(\d+(\.\d+)?)\s*(km|kilometers?|miles)\s+in\s+a\s+{mode}",
-            rf"used\s+a\s+{mode}\s+for\s+(\d+(\.\d+)?)\s*(km|kilometers?|miles)"
-        ]
-        for pattern in patterns:
-            for match in re.finditer(pattern, user_input):
-                span = match.span()
-                if is_overlapping(span, matched_transport_spans):
-                    continue
-                groups = match.groups()
-                num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
-                unit = next((g for g in groups if g and g.lower() in ["km", "kilometers", "miles"]), None)
-                if num and unit:
-                    km = convert_to_standard(num, unit)
-                    transport_data[mode] = transport_data.get(mode, 0) + km
-                    matched_transport_spans.append(span)
+    with stage("transport"):
+        matched_transport_spans = []
+        for mode in ordered_keywords(table_ranks(tables.transport_patterns), keywords):
+            for p, pattern in enumerate(tables.transport_patterns[mode]):
+                for match in pattern.finditer(user_input):
+                    span = match.span()
+                    if is_overlapping(span, matched_transport_spans):
+                        continue
+                    groups = match.groups()
+                    num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
+                    unit = next((g for g in groups if g and g.lower() in ["km", "kilometers", "miles"]), None)
+                    if num and unit:
+                        events["transport"].append((mode, p, convert_to_standard(num, unit)))
+                        bisect.insort(matched_transport_spans, span)
 
     # --- ELECTRICITY ---
-    matched_electricity_spans = []
-    electricity_patterns = [
-        r"(\d+(\.\d+)?)\s*(kwh|kilowatt-hours?)",
-        r"(used|consumed).*?(\d+(\.\d+)?)\s*(kwh|kilowatt-hours?)",
-        r"electricity.*?(\d+(\.\d+)?)\s*(kwh|kilowatt-hours?)",
-        r"(\d+(\.\d+)?)\s*(kwh|kilowatt-hours?)\s*used"
-    ]
-    for pattern in electricity_patterns:
-        for match in re.finditer(pattern, user_input):
-            span = match.span()
-            if is_overlapping(span, matched_electricity_spans):
-                continue
-            groups = match.groups()
-            for group in groups:
-                if group and re.match(r"\d+(\.\d+)?", group):
-                    electricity_kwh += convert_to_standard(group, "kwh")
-                    matched_electricity_spans.append(span)
-                    break
-
-    # --- FOOD ---
-    matched_food_spans = []
-    for item in FOOD_FACTORS:
-        item = item.lower()
-        patterns = [
-            rf"(\d+(\.\d+)?)\s*(kg|kgs|g|gram|grams|ml|milliliters?|l|liters?|litres?)\s+(of\s+)?{item}\b",
-            rf"{item}\s*(amount|weighed|weighing|measured|totaled)?\s*(is|was)?\s*(about|around)?\s*(\d+(\.\d+)?)\s*(kg|g|grams|ml|l|liters?|litres?)\b",
-            rf"(ate|had|consumed)\s+(about|around)?\s*(\d+(\.\d+)?)\s*(kg|g|grams|ml|l|liters?)\s+(of\s+)?{item}\b",
-            rf"\b{item}\b.*?(about|around)?\s*(\d+(\.\d+)?)\s*(kg|g|ml|l)",
-            rf"{item}\s*[:\-]?\s*(\d+(\.\d+)?)\s*(kg|g|ml|l)"
-        ]
-        for pattern in patterns:
-            for match in re.finditer(pattern, user_input):
+    with stage("electricity"):
+        matched_electricity_spans = []
+        for p, pattern in enumerate(ELECTRICITY_PATTERNS):
+            for match in pattern.finditer(user_input):
                 span = match.span()
-                if is_overlapping(span, matched_food_spans):
+                if is_overlapping(span, matched_electricity_spans):
                     continue
                 groups = match.groups()
-                num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
-                unit = next((g for g in groups if g and g.lower() in ["kg", "kgs", "g", "gram", "grams", "ml", "l", "liters", "litres", "milliliters"]), None)
-                if num and unit:
-                    value = convert_to_standard(num, unit)
-                    food_data[item] = food_data.get(item, 0) + value
-                    matched_food_spans.append(span)
+                for group in groups:
+                    if group and re.match(r"\d+(\.\d+)?", group):
+                        events["electricity"].append((p, convert_to_standard(group, "kwh")))
+                        bisect.insort(matched_electricity_spans, span)
+                        break
+
+    # --- FOOD ---
+    with stage("food"):
+        matched_food_spans = []
+        for item in ordered_keywords(table_ranks(tables.food_patterns), keywords):
+            for p, pattern in enumerate(tables.food_patterns[item]):
+                for match in pattern.finditer(user_input):
+                    span = match.span()
+                    if is_overlapping(span, matched_food_spans):
+                        continue
+                    groups = match.groups()
+                    num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
+                    unit = next((g for g in groups if g and g.lower() in ["kg", "kgs", "g", "gram", "grams", "ml", "l", "liters", "litres", "milliliters"]), None)
+                    if num and unit:
+                        events["food"].append((item, p, convert_to_standard(num, unit)))
+                        bisect.insort(matched_food_spans, span)
 
     # --- SHOPPING ---
-    matched_shopping_spans = []
-
-    for item in SHOPPING_FACTORS.keys():
-        # Rupee-based
-        rupee_patterns = [
-            rf"{item}.*?(for|cost|price|worth|at)?\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?",
-            rf"(bought|purchased|got|ordered).*?{item}.*?(for|cost|price|worth|at)?\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?",
-            rf"spent\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?\s*(on)?\s*{item}",
-            rf"₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?\s*(for|on)?\s*{item}",
-            rf"purchase of\s*{item}.*?(cost|price|was)?\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?",
-            rf"my\s*{item}.*?(cost|price|was)?\s*₹?\s*(\d+(\.\d+)?)\s*(rs|rupees)?",
-        ]
-        for pattern in rupee_patterns:
-            for match in re.finditer(pattern, user_input):
+    with stage("shopping"):
+        matched_shopping_spans = []
+        for item in ordered_keywords(table_ranks(tables.shopping_patterns), keywords):
+            rupee_patterns, weight_patterns = tables.shopping_patterns[item]
+            # Rupee-based, then weight-based (in kg, at 100 per kg)
+            for p, (pattern, scale) in enumerate(
+                [(pattern, 1) for pattern in rupee_patterns] + [(pattern, 100) for pattern in weight_patterns]
+            ):
+                for match in pattern.finditer(user_input):
+                    span = match.span()
+                    if is_overlapping(span, matched_shopping_spans):
+                        continue
+                    groups = match.groups()
+                    num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
+                    if num:
+                        events["shopping"].append((item, p, float(num) * scale))
+                        bisect.insort(matched_shopping_spans, span)
+
+    # --- FLIGHT ---
+    with stage("flight"):
+        matched_flight_spans = []
+        for p, pattern in enumerate(FLIGHT_PATTERNS):
+            for match in pattern.finditer(user_input):
                 span = match.span()
-                if is_overlapping(span, matched_shopping_spans):
+                if is_overlapping(span, matched_flight_spans):
                     continue
                 groups = match.groups()
+                log_event("flight_match", level=logging.DEBUG, groups=groups)
+                distance = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
+                unit = next((g for g in groups if g in ["km", "kilometers", "miles"]), None)
+                ftype = next((g for g in groups if g in ["domestic", "international", "business", "economy"]), None)
+                km = convert_to_standard(distance, unit) if distance and unit else None
+                if ftype or km is not None:
+                    events["flight"].append((p, km, ftype))
+                if km is not None:
+                    bisect.insort(matched_flight_spans, span)
+
+    # --- WATER / PLASTIC ---
+    # Only the first pattern match with an amount counts (types seen before it
+    # still apply), so each clause records its matches up to that one
+    with stage("water"):
+        for p, pattern in enumerate(WATER_PATTERNS):
+            for match in pattern.finditer(user_input):
+                groups = match.groups()
                 num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
-                if num:
-                    shopping_spend += float(num)
-                    shopping_type = item
-                    matched_shopping_spans.append(span)
-
-        # Weight-based
-        weight_patterns = [
-            rf"(bought|purchased|got)?\s*(\d+(\.\d+)?)\s*(kg|kgs|kilograms?)\s+(of\s+)?{item}",
-            rf"{item}.*?(amount|weighed|weighing)?\s*(is|was)?\s*(\d+(\.\d+)?)\s*(kg|kgs|kilograms?)",
-        ]
-        for pattern in weight_patterns:
-            for match in re.finditer(pattern, user_input):
-                span = match.span()
-                if is_overlapping(span, matched_shopping_spans):
-                    continue
+                unit = next((g for g in groups if g and g.lower() in ["liters", "litres", "l", "ml"]), None)
+                wtype = next((g for g in groups if g and g.lower() in ["tap", "bottled"]), None)
+                liters = convert_to_standard(num, unit) if num and unit else None
+                if wtype or liters is not None:
+                    events["water"].append((p, liters, wtype.lower() if wtype else None))
+                if liters is not None:
+                    break
+
+    with stage("plastic"):
+        for p, pattern in enumerate(PLASTIC_PATTERNS):
+            for match in pattern.finditer(user_input):
                 groups = match.groups()
                 num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
-                if num:
-                    shopping_spend += float(num) * 100
-                    shopping_type = item
-                    matched_shopping_spans.append(span)
+                unit = next((g for g in groups if g and g.lower() in ["kg", "g", "gram", "grams"]), None)
+                ptype = next((g for g in groups if g and g.lower() in ["pet", "hdpe", "pvc"]), None)
+                kg = convert_to_standard(num, unit) if num and unit else None
+                if ptype or kg is not None:
+                    events["plastic"].append((p, kg, ptype.upper() if ptype else None))
+                if kg is not None:
+                    break
+
+    # SPA_CY fallbacks: food and shopping, from lemmas and alias labels. They
+    # only count when no pattern matched in the whole text, which a clause
+    # can't know, so they are always recorded
+    with stage("food"):
+        words = list(canonical_words(doc, aliases))
+        events["food_fallback"].extend((item,) for item in detect_food_spacy(words, tables.factors))
+    with stage("shopping"):
+        spend, category = detect_shopping_spacy(words)
+        if spend is not None or category:
+            events["shopping_fallback"].append((spend, category))
+
+    return events
+
+def replay_events(events, name, ranks=None):
+    """Events ``name`` (without clause index) in whole-text loop order: keyword, then pattern, then clause.
+
+    The sort is stable, so events of one clause and pattern keep their order.
+    """
+    if ranks is None:
+        ordered = sorted(events[name], key=lambda e: (e[1], e[0]))
+    else:
+        ordered = sorted(events[name], key=lambda e: (ranks.get(e[1], len(ranks)), e[2], e[0]))
+    return [event[1:] for event in ordered]
+
+def combine_clause_events(events, tables):
+    """calculate_carbon keyword arguments from the clause events of one text (see extract_clause_events)."""
+    transport_data = {}
+    food_data = {}
+    electricity_kwh = 0
+    shopping_spend = 0
+    shopping_type = "clothes"
+    flight_km = 0
+    flight_type = "domestic"
+    water_liters = 0
+    water_type = "tap"
+    plastic_kg = 0
+    plastic_type = "PET"
+
+    for mode, p, km in replay_events(events, "transport", table_ranks(tables.transport_patterns)):
+        transport_data[mode] = transport_data.get(mode, 0) + km
+
+    for p, kwh in replay_events(events, "electricity"):
+        electricity_kwh += kwh
+
+    for item, p, value in replay_events(events, "food", table_ranks(tables.food_patterns)):
+        food_data[item] = food_data.get(item, 0) + value
+
+    for item, p, amount in replay_events(events, "shopping", table_ranks(tables.shopping_patterns)):
+        shopping_spend += amount
+        shopping_type = item
 
     if shopping_spend == 0:
+        matched_items = {label for ci, label in events["aliases"]}
         for label in matched_items:
-            for cat in SHOPPING_FACTORS:
-                if label in raw_aliases.get("shopping", {}).get(cat, []):
+            for cat in tables.shopping_patterns:
+                if label in tables.raw_aliases.get("shopping", {}).get(cat, []):
                     shopping_type = cat
                     shopping_spend = 2000  
                     break
 
-    # --- FLIGHT ---
-    matched_flight_spans = []
-    flight_patterns = [
-        r"(\d+(\.\d+)?)\s*(km|kilometers?|miles)\s+(domestic|international|business|economy)?\s*flight",
-        r"(domestic|international|business|economy)?\s*flight\s+of\s+(\d+(\.\d+)?)\s*(km|kilometers?|miles)",
-        r"flight.*?(\d+(\.\d+)?)\s*(km|kilometers?|miles).*?(domestic|international|business|economy)?"
-    ]
-    for pattern in flight_patterns:
-        for match in re.finditer(pattern, user_input):
-            span = match.span()
-            if is_overlapping(span, matched_flight_spans):
-                continue
-            groups = match.groups()
-            print("Flight match groups:", groups)
-            distance = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
-            unit = next((g for g in groups if g in ["km", "kilometers", "miles"]), None)
-            ftype = next((g for g in groups if g in ["domestic", "international", "business", "economy"]), None)
-            if ftype:
-                flight_type = ftype
-            if distance and unit:
-                flight_km += convert_to_standard(distance, unit)
-                matched_flight_spans.append(span)
-                
-    # --- WATER ---
-    matched_water_spans = []
-    water_patterns = [
-        r"(\d+(\.\d+)?)\s*(liters?|litres?|l|ml).*?(tap|bottled)?\s*water",
-        r"(tap|bottled)\s*water.*?(\d+(\.\d+)?)\s*(liters?|litres?|l|ml)",
-        r"water\s*(tap|bottled).*?(\d+(\.\d+)?)\s*(liters?|litres?|l|ml)",
-        r"drank\s*(\d+(\.\d+)?)\s*(liters?|litres?|l|ml)\s*of\s*(tap|bottled)?\s*water"
-    ]
-    for pattern in water_patterns:
-        matched = False
-        for match in re.finditer(pattern, user_input):
-            groups = match.groups()
-            num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
-            unit = next((g for g in groups if g and g.lower() in ["liters", "litres", "l", "ml"]), None)
-            wtype = next((g for g in groups if g and g.lower() in ["tap", "bottled"]), None)
-            if wtype:
-                water_type = wtype.lower()
-            if num and unit:
-                water_liters += convert_to_standard(num, unit)
-                matched = True
-                break
-        if matched:
+    for p, km, ftype in replay_events(events, "flight"):
+        if ftype:
+            flight_type = ftype
+        if km is not None:
+            flight_km += km
+
+    for p, liters, wtype in replay_events(events, "water"):
+        if wtype:
+            water_type = wtype
+        if liters is not None:
+            water_liters += liters
             break
-        
-    # --- PLASTIC ---
-    plastic_patterns = [
-        r"used\s*(\d+(\.\d+)?)\s*(kg|g|gram|grams)\s*(of\s*)?(pet|hdpe|pvc)?\s*plastic",
-        r"(\d+(\.\d+)?)\s*(kg|g|gram|grams)\s*(of\s*)?(pet|hdpe|pvc)?\s*plastic",
-        r"plastic.*?(pet|hdpe|pvc)?\s*(\d+(\.\d+)?)\s*(kg|g|gram|grams)"
-    ]
-    matched = False
-    for pattern in plastic_patterns:
-        if matched:
+
+    for p, kg, ptype in replay_events(events, "plastic"):
+        if ptype:
+            plastic_type = ptype
+        if kg is not None:
+            plastic_kg += kg
             break
-        for match in re.finditer(pattern, user_input):
-            groups = match.groups()
-            num = next((g for g in groups if g and re.match(r"\d+(\.\d+)?", g)), None)
-            unit = next((g for g in groups if g and g.lower() in ["kg", "g", "gram", "grams"]), None)
-            ptype = next((g for g in groups if g and g.lower() in ["pet", "hdpe", "pvc"]), None)
-            if ptype:
-                plastic_type = ptype.upper()
-            if num and unit:
-                plastic_kg += convert_to_standard(num, unit)
-                matched = True
-                break
-        doc = nlp(user_input)
 
     # SPA_CY fallback: food
     if len(food_data) == 0:
-        spacy_food_data = detect_food_spacy(doc)
-        for item, qty in spacy_food_data.items():
-            food_data[item] = food_data.get(item, 0) + qty
+        for ci, item in events["food_fallback"]:
+            food_data[item] = food_data.get(item, 0) + 0.15  # Default to 150g
 
     # SPA_CY fallback: shopping
     if shopping_spend == 0:
-        spacy_spend, spacy_category = detect_shopping_spacy(doc)
-        if spacy_spend > 0:
+        spacy_spend, spacy_category = None, None
+        for ci, spend, category in events["shopping_fallback"]:
+            if spend is not None:
+                spacy_spend = spend
+            if category:
+                spacy_category = category
+        if spacy_spend and spacy_spend > 0:
             shopping_spend = spacy_spend
         if spacy_category:
             shopping_type = spacy_category
 
-    #* Debug Print
-    print("Transport Data:", transport_data)
-    print("Electricity (kWh):", electricity_kwh)
-    print("Food Data:", food_data)
-    print("Shopping Spend:", shopping_spend)
-    print("Flight KM:", flight_km)
-    print("Flight Type:", flight_type)
-    print("Water (liters):", water_liters)
-    print("Plastic (kg):", plastic_kg)
-    print("Plastic Type:", plastic_type)
-
-    return calculate_carbon(
+    log_event(
+        "extracted",
+        transport=transport_data,
+        electricity_kwh=electricity_kwh,
+        food=food_data,
+        shopping_spend=shopping_spend,
+        shopping_type=shopping_type,
+        flight_km=flight_km,
+        flight_type=flight_type,
+        water_liters=water_liters,
+        water_type=water_type,
+        plastic_kg=plastic_kg,
+        plastic_type=plastic_type
+    )
+
+    return dict(
         transport_data=transport_data,
         electricity_kwh=electricity_kwh,
         food_data=food_data,
@@ -774,65 +1388,413 @@ def parse_input_to_data(user_input):
         plastic_kg=plastic_kg,
         plastic_type=plastic_type
     )
+
+def clause_texts(text, tables=None):
+    """The clauses of ``text``, cut with the tokenizer alone.
+
+    Clauses end after sentence punctuation or a line break; a break inside a
+    phrase an alias matcher finds is ignored. With CROSS_CLAUSE_MATCHING=1 the
+    whole text is one clause.
+    """
+    if CROSS_CLAUSE_MATCHING:
+        return [text.strip()] if text.strip() else []
+    doc = nlp.make_doc(text)
+    matchers = (tables or TABLES).phrase_matchers
+    inside = {i for matcher in matchers.values() for _, start, end in matcher(doc) for i in range(start, end)}
+    pieces = []
+    start = 0
+    for token in doc:
+        if token.i in inside or not is_clause_break(token):
+            continue
+        piece = doc[start:token.i + 1].text.strip()
+        if piece:
+            pieces.append(piece)
+        start = token.i + 1
+    piece = doc[start:].text.strip()
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+def extract_activities(texts, batch_size=BATCH_SIZE, n_process=1, tables=None):
+    """calculate_carbon keyword arguments for each of ``texts`` (lowercased).
+
+    Inputs are split into clauses with the tokenizer alone, and every clause
+    is extracted on its own, aliases included, so an input's result only
+    depends on its clauses. That is what lets CLAUSE_MEMO serve them: only
+    clauses the memo has not seen (under the current alias/factor tables) go
+    through the spaCy pipeline. ``tables`` defaults to the current TABLES.
+    """
+    tables = tables or TABLES
+    with stage("clause_split"):
+        split = [clause_texts(text, tables) for text in texts]
+        clauses = list(dict.fromkeys(clause for pieces in split for clause in pieces))
+
+    events = {}
+    if CLAUSE_MEMO is not None:
+        prefix = f"{CLAUSE_MEMO_PREFIX}:{tables.version}:"
+        with stage("clause_memo"):
+            stored = CLAUSE_MEMO.get_many(prefix + clause for clause in clauses)
+        events = {clause: stored[prefix + clause] for clause in clauses if prefix + clause in stored}
+    missing = [clause for clause in clauses if clause not in events]
+    if missing:
+        with stage("spacy"):
+            docs = list(nlp.pipe(missing, batch_size=batch_size, n_process=n_process))
+        for clause, doc in zip(missing, docs):
+            events[clause] = extract_clause_events(doc, tables)
+        if CLAUSE_MEMO is not None:
+            with stage("clause_memo"):
+                CLAUSE_MEMO.set_many({prefix + clause: events[clause] for clause in missing})
+
+    return [combine_clause_events(concat_clause_events(events[clause] for clause in pieces), tables) for pieces in split]
     
+# Startup / readiness
+
+def warmup(reports=True):
+    """Run one parse (and build the report renderer) so the first request pays nothing extra.
+
+    Under gunicorn --preload this runs once in the master and the warmed state
+    is shared copy-on-write with every forked worker.
+    """
+    started = time.perf_counter()
+    parse_input_to_data("took the metro 10 km, ate 200 g rice and drank 2 litres of water")
+    STARTUP['warmed'] = ['nlp', 'phrase_matchers', 'keyword_patterns']
+    if reports:
+        get_report_renderer()
+        STARTUP['warmed'].append('report_renderer')
+    STARTUP['warmup_seconds'] = round(time.perf_counter() - started, 3)
+    STARTUP['ready'] = True
+
+def freeze_for_fork():
+    # Move everything built so far out of the GC's reach; collections in the
+    # workers then stop touching (and un-sharing) the preloaded pages
+    gc.collect()
+    gc.freeze()
+
+def summarize_result(result):
+    return {
+        'total_emission': result['total_emission'],
+        'category_percentages': result.get('category_percentages', {}),
+        'tips': result.get('tips', []),
+        'badges': result.get('badges', []),
+        'transport_total': result.get('transport_total', 0),
+        'electricity_kwh': result.get('electricity_kwh', 0),
+        'food_total': result.get('food_total', 0),
+        'shopping_spend': result.get('shopping_spend', 0),
+        'water_liters': result.get('water_liters', 0),
+        'plastic_kg': result.get('plastic_kg', 0),
+        'factor_version': result.get('factor_version')
+    }
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    reload_tables_if_changed()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The route pattern, not the raw path, so job ids don't explode the label set
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), content_type=Registry.CONTENT_TYPE)
+
 @app.route('/')
 def home():
-    print("Home route hit!", file=sys.stderr)
+    log_event("home")
     return "Backend is working!"
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    return jsonify(STARTUP), 200 if STARTUP['ready'] else 503
+
 @app.route('/api/calculate', methods=['POST'])
 def api_calculate():
     try:
         data = request.get_json()
         if not data or 'user_input' not in data:
             return jsonify({'error': 'Invalid request format'}), 400
+
+        # With a user_id the result is also added to that user's history
+        user_id = data.get('user_id')
+        if user_id is not None and not (isinstance(user_id, str) and USER_ID_PATTERN.fullmatch(user_id)):
+            return jsonify({'error': 'user_id must be 1-128 letters, digits or _.@-'}), 400
+        try:
+            day = parse_day(data.get('date'))
+        except ValueError:
+            return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+        try:
+            cohort = parse_cohort(data.get('cohort'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
             
-        result = parse_input_to_data(data['user_input'])
+        result = parse_input_cached(data['user_input'], timeout=request_timeout())
         
         # Return the result directly (not nested in 'data' property)
+        response = summarize_result(result)
+        # Compared before it is counted, so nobody is ranked against themselves
+        response['population'] = population_comparison(result, cohort)
+        response['badges'] += population_badges(response['population'])
+        observe_result(result, cohort)
+        if user_id is not None:
+            response['entry_id'] = get_history_store().record(user_id, result, day=day)
+        return jsonify(response)
+    except NLPPoolError as e:
+        return nlp_pool_error(e)
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+@app.route('/api/calculate/batch', methods=['POST'])
+def api_calculate_batch():
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('user_inputs'), list):
+        return jsonify({'error': 'Invalid request format'}), 400
+
+    user_inputs = data['user_inputs']
+    if len(user_inputs) > BATCH_MAX_INPUTS:
+        return jsonify({'error': f'At most {BATCH_MAX_INPUTS} inputs per batch'}), 413
+
+    try:
+        batch_size = max(1, int(data.get('batch_size', BATCH_SIZE)))
+        n_process = min(max(1, int(data.get('n_process', 1))), BATCH_MAX_PROCESSES)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'batch_size and n_process must be integers'}), 400
+    try:
+        cohort = parse_cohort(data.get('cohort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        results = parse_inputs_batch(user_inputs, batch_size=batch_size, n_process=n_process)
+        for result in results:
+            if 'error' not in result:
+                observe_result(result, cohort)
+        return jsonify({
+            'results': [r if 'error' in r else summarize_result(r) for r in results]
+        })
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+@app.route('/api/calculate/structured', methods=['POST'])
+def api_calculate_structured():
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('records'), list):
+        return jsonify({'error': 'Invalid request format'}), 400
+
+    if len(data['records']) > BATCH_MAX_INPUTS:
+        return jsonify({'error': f'At most {BATCH_MAX_INPUTS} records per batch'}), 413
+    try:
+        cohort = parse_cohort(data.get('cohort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        results = calculate_carbon_records(data['records'])
+        for result in results:
+            if 'error' not in result:
+                observe_result(result, cohort)
         return jsonify({
-            'total_emission': result['total_emission'],
-            'category_percentages': result.get('category_percentages', {}),
-            'tips': result.get('tips', []),
-            'badges': result.get('badges', []),  # 👈 ADD THIS
-            'transport_total': result.get('transport_total', 0),
-            'electricity_kwh': result.get('electricity_kwh', 0),
-            'food_total': result.get('food_total', 0),
-            'shopping_spend': result.get('shopping_spend', 0),
-            'water_liters': result.get('water_liters', 0),
-            'plastic_kg': result.get('plastic_kg', 0) 
+            'results': [r if 'error' in r else summarize_result(r) for r in results]
         })
     except Exception as e:
         return jsonify({
             'error': str(e)
         }), 500
 
+@app.route('/api/calculate/stream', methods=['POST'])
+def api_calculate_stream():
+    """One entry per line (plain text, or NDJSON by Content-Type) in; NDJSON out.
+
+    Entries are read and parsed a batch at a time (BATCH_SIZE entries or
+    STREAM_BATCH_CHARS of text) while the response is being sent, so memory
+    stays flat however large the upload is. Each entry
+    gets a result line, and a final line has the running totals as one
+    calculate_carbon-style summary.
+    """
+    try:
+        cohort = parse_cohort(request.args.get('cohort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    ndjson = request.mimetype in NDJSON_MIMETYPES
+    entries = iter_entries(request.stream, ndjson=ndjson, max_line_bytes=STREAM_MAX_LINE_BYTES)
+
+    def generate():
+        totals = RunningTotals()
+        for batch in batched(entries, BATCH_SIZE, STREAM_BATCH_CHARS):
+            parsed = iter(parse_inputs_batch([entry for _, entry in batch if isinstance(entry, str)]))
+            for line, entry in batch:
+                result = {'error': str(entry)} if isinstance(entry, EntryError) else next(parsed)
+                if 'error' in result:
+                    totals.add_error()
+                    yield json.dumps({'line': line, 'error': result['error']}) + "\n"
+                else:
+                    totals.add(result)
+                    observe_result(result, cohort)
+                    yield json.dumps({'line': line, **summarize_result(result)}) + "\n"
+
+        summary = totals.summary(tree_factor=TABLES.factors.tree_factor)
+        apply_rules(summary)
+        yield json.dumps({'summary': summary, 'entries': totals.entries, 'errors': totals.errors}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/calculate/bulk', methods=['POST'])
+def api_calculate_bulk():
+    """Structured records as CSV (or Parquet by Content-Type) in; one CSV result row per record out.
+
+    Columns are described in bulk.py; ?keep=id,site names the columns copied
+    to the output. Records are calculated BULK_CHUNK_ROWS at a time while the
+    response is being sent. A Parquet upload is spooled to a temporary file
+    first, since its footer (the schema) comes last.
+    """
+    keep = [name.strip() for name in request.args.get('keep', 'id').split(',') if name.strip()]
+    bulk = BulkCalculator(TABLES.factors, keep=keep, chunk_rows=BULK_CHUNK_ROWS)
+    try:
+        if request.mimetype in PARQUET_MIMETYPES:
+            spooled = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES)
+            shutil.copyfileobj(request.stream, spooled)
+            spooled.seek(0)
+            schema, chunks = bulk.read_parquet(spooled)
+        else:
+            text = TextIOWrapper(BufferedReader(request.stream), encoding='utf-8-sig', newline='')
+            schema, chunks = bulk.read_csv(text)
+    except BulkFormatError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        started = time.perf_counter()
+        with stage("bulk"):
+            yield from bulk.iter_csv(schema, chunks)
+        log_event("bulk_calculated", rows=bulk.rows, errors=bulk.errors,
+                  seconds=round(time.perf_counter() - started, 3))
+
+    return Response(stream_with_context(generate()), mimetype='text/csv')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    tables = TABLES
+    return jsonify({'parse': PARSE_CACHE.stats(), 'tables_version': tables.version,
+                    'clause_memo': CLAUSE_MEMO.stats() if CLAUSE_MEMO is not None else None,
+                    'factor_version': tables.factors.version})
+
+@app.route('/api/nlp-pool/stats', methods=['GET'])
+def api_nlp_pool_stats():
+    """Queue depth, busy workers, queue wait and outcome counts of the NLP pool, for autoscaling."""
+    if nlp_pool is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **nlp_pool.stats()})
+
+@app.route('/api/population', methods=['GET'])
+def api_population():
+    """Where a value sits in a cohort (?category=total&value=12.5&cohort=...), or the cohort's quantiles without value."""
+    category = request.args.get('category', 'total')
+    if category not in POPULATION_CATEGORIES:
+        return jsonify({'error': f'category must be one of {list(POPULATION_CATEGORIES)}'}), 400
+    try:
+        cohort = parse_cohort(request.args.get('cohort')) or 'all'
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        value = float(request.args['value']) if 'value' in request.args else None
+    except ValueError:
+        value = math.nan
+    if value is not None and not math.isfinite(value):
+        return jsonify({'error': 'value must be a number'}), 400
+
+    store = get_population_store()
+    with stage("population"):
+        if value is not None:
+            percentile, count = store.percentile(cohort, category, value)
+            return jsonify({'cohort': cohort, 'category': category, 'value': value,
+                            'percentile': percentile, 'count': count})
+        categories = {}
+        for name in POPULATION_CATEGORIES:
+            quantiles, count = store.quantiles(cohort, name)
+            categories[name] = {'count': count, **quantiles}
+    return jsonify({'cohort': cohort, 'count': categories['total']['count'], 'categories': categories})
+
+def history_range_args():
+    """(start, end) dates from the query string; ValueError if malformed."""
+    return parse_day(request.args.get('start')), parse_day(request.args.get('end'))
+
+@app.route('/api/history/<user_id>/rollups', methods=['GET'])
+def api_history_rollups(user_id):
+    """Per-period totals for trend charts: ?period=day|week|month&start=YYYY-MM-DD&end=YYYY-MM-DD."""
+    if not USER_ID_PATTERN.fullmatch(user_id):
+        return jsonify({'error': 'Invalid user_id'}), 400
+    period = request.args.get('period', 'week')
+    if period not in PERIODS:
+        return jsonify({'error': f'period must be one of {PERIODS}'}), 400
+    try:
+        start, end = history_range_args()
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD'}), 400
+
+    with stage("history"):
+        rollups = get_history_store().rollups(user_id, period, start=start, end=end)
+    return jsonify({'user_id': user_id, 'period': period, 'rollups': rollups})
+
+@app.route('/api/history/<user_id>/entries', methods=['GET'])
+def api_history_entries(user_id):
+    """Recorded entries, newest first: ?start=YYYY-MM-DD&end=YYYY-MM-DD&limit=N."""
+    if not USER_ID_PATTERN.fullmatch(user_id):
+        return jsonify({'error': 'Invalid user_id'}), 400
+    try:
+        start, end = history_range_args()
+        limit = min(max(1, int(request.args.get('limit', 100))), HISTORY_MAX_ENTRIES)
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD and limit an integer'}), 400
+
+    with stage("history"):
+        entries = get_history_store().entries(user_id, start=start, end=end, limit=limit)
+    return jsonify({'user_id': user_id, 'entries': entries})
+
 @app.route('/recognize', methods=['POST'])
 def recognize_speech():
+    # Checked before request.files parses (and spools) the upload
+    if request.content_length and request.content_length > SPEECH_MAX_BYTES + 64 * 1024:
+        return jsonify({'error': f'Audio larger than {SPEECH_MAX_BYTES} bytes'}), 413
+
     if 'audio' not in request.files:
         return jsonify({'error': 'No audio file provided'}), 400
 
-    audio_file = request.files['audio']
-    file_path = "temp_audio.wav"
-    audio_file.save(file_path)
-
-    recognizer = sr.Recognizer()
     try:
-        with sr.AudioFile(file_path) as source:
-            audio = recognizer.record(source)
-
-        text = recognizer.recognize_google(audio)
+        # Decoded from memory; nothing is written under a shared path, so
+        # concurrent requests can't see each other's audio
+        audio = load_audio(read_limited(request.files['audio'].stream, SPEECH_MAX_BYTES))
+        service = get_speech_service()
+        segments = split_on_silence(audio, max_segments=service.max_workers, min_segment=SPEECH_MIN_SEGMENT)
+
+        with stage("speech"):
+            text = service.transcribe_segments(segments)
         return jsonify({'text': text})
 
-    except sr.UnknownValueError:
+    except AudioTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        # sr.AudioFile: not PCM WAV, AIFF or FLAC
+        return jsonify({'error': f'Unsupported audio: {e}'}), 400
+    except SpeechNotUnderstood:
         return jsonify({'error': 'Speech not understood'}), 400
-    except sr.RequestError as e:
-        return jsonify({'error': f'Request failed: {e}'}), 500
+    except SpeechBackendError as e:
+        return jsonify({'error': str(e)}), 500
+    except SpeechOverloaded as e:
+        response = jsonify({'error': f'Speech recognition is busy: {e}'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except SpeechDeadlineExceeded as e:
+        return jsonify({'error': f'Speech recognition timed out: {e}'}), 504
     except Exception as e:
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
 
 @app.route('/api/download-report', methods=['POST'])
 def api_download_report():
@@ -841,119 +1803,146 @@ def api_download_report():
     
     if not user_input:
         return jsonify({'error': 'Empty input'}), 400
+    try:
+        cohort = parse_cohort(data.get('cohort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     try:
-        result = parse_input_to_data(user_input)
-
-        # --- Create Word Document ---
-        doc = Document()
-        doc.add_heading('🌱 Carbon Footprint Report', 0)
-
-        # Summary
-        doc.add_paragraph().add_run("Total Emissions: ").bold = True
-        doc.add_paragraph(f"{result['total_emission']} kg CO₂", style='Intense Quote')
-
-        doc.add_paragraph().add_run("📊 Emission Breakdown:").bold = True
-        doc.add_paragraph(f"• Transport: {result['transport_total']} kg CO₂")
-        doc.add_paragraph(f"• Electricity: {result['electricity_kwh']} kg CO₂")
-        doc.add_paragraph(f"• Food: {result['food_total']} kg CO₂")
-        doc.add_paragraph(f"• Shopping: {result['shopping_spend']} kg CO₂")
-        if result.get('flight_km', 0) > 0:
-            doc.add_paragraph(f"• Flight: {result['flight_km']} kg CO₂")
-        doc.add_paragraph(f"• Water: {result['water_liters']} liters")
-        doc.add_paragraph(f"• Plastic: {result['plastic_kg']} kg")
-        
-        doc.add_paragraph().add_run("🌳 Trees Required to Offset: ").bold = True
-        doc.add_paragraph(f"{result['trees_required']} trees")
-        
-        doc.add_paragraph().add_run("🏅 Badges Earned: ").bold = True
-        
-        if result.get('badges'):
-            for badge in result['badges']:
-                p = doc.add_paragraph()
-                run = p.add_run()
-                print(badge)
-                badge_image_path = f"badges/{badge}.png"
-                
-                if os.path.exists(badge_image_path):
-                    run.add_picture(badge_image_path, width=Inches(0.4)) 
-                    run.add_text(f"  {badge}") 
-                else:
-                    p.add_run(f"• {badge}") 
-        else:
-            doc.add_paragraph("• No badges earned yet!", style='List Bullet')
-        
-        global_avg_annual_kg = 4.8 * 1000
-        global_avg_daily_kg = global_avg_annual_kg / 365
-        total_emission_daily = result['total_emission'] 
-        doc.add_paragraph().add_run("🌍 Global Average Comparison: ").bold = True   
-        
-        
-        if total_emission_daily > global_avg_daily_kg:
-            excess = total_emission_daily - global_avg_daily_kg
-            percent = (excess / global_avg_daily_kg) * 100
-            doc.add_paragraph(
-                f"Your daily carbon footprint is {total_emission_daily:.2f} kg CO₂, "
-                f"which is about {percent:.1f}% higher than the global average daily footprint "
-                f"of 13.15 kg CO₂ (4.8 tons per year)."
-            )
-        elif total_emission_daily < global_avg_daily_kg:
-            less = global_avg_daily_kg - total_emission_daily
-            percent = (less / global_avg_daily_kg) * 100
-            doc.add_paragraph(
-                f"Great job! Your daily carbon footprint is {total_emission_daily:.2f} kg CO₂, "
-                f"which is about {percent:.1f}% lower than the global average daily footprint "
-                f"of 13.15 kg CO₂ (4.8 tons per year)."
-            )
-        else:
-            doc.add_paragraph(
-                f"Your daily carbon footprint matches the global average daily footprint "
-                f"of 13.15 kg CO₂ (4.8 tons per year)."
-            )
-
-        # --- Create Pie Chart ---
-        labels = ['Transport', 'Electricity', 'Food', 'Shopping', 'Plastic', 'Flight']
-        values = [
-            result.get('transport_total', 0),
-            result.get('electricity_kwh', 0),
-            result.get('food_total', 0),
-            result.get('shopping_spend', 0),
-            result.get('plastic_kg', 0),
-            result.get('flight_km', 0)
-        ]
-        # Remove zero values to keep chart clean
-        chart_data = [(l, v) for l, v in zip(labels, values) if v > 0]
-        chart_labels, chart_values = zip(*chart_data)
-
-        # Generate pie chart
-        fig, ax = plt.subplots()
-        ax.pie(chart_values, labels=chart_labels, autopct='%1.1f%%', startangle=140)
-        ax.axis('equal')
-        chart_buf = BytesIO()
-        plt.savefig(chart_buf, format='png')
-        plt.close(fig)
-        chart_buf.seek(0)
-
-        # Insert chart into Word doc
-        doc.add_page_break()
-        doc.add_heading('📈 Visual Breakdown', level=1)
-        doc.add_picture(chart_buf, width=Inches(5.5))
-
-        # Save the document to a buffer
-        doc_buffer = BytesIO()
-        doc.save(doc_buffer)
-        doc_buffer.seek(0)
+        doc_buffer = BytesIO(build_report(user_input, timeout=request_timeout(), cohort=cohort))
 
         return send_file(
             doc_buffer,
             as_attachment=True,
             download_name="carbon_report.docx",
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            mimetype=DOCX_MIMETYPE
         )
     
+    except NLPPoolError as e:
+        return nlp_pool_error(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+@app.route('/api/download-report/jobs', methods=['POST'])
+def api_submit_report_job():
+    data = request.get_json(silent=True) or {}
+    user_input = data.get('user_input', '')
+    if not isinstance(user_input, str) or not user_input.strip():
+        return jsonify({'error': 'Empty input'}), 400
+    try:
+        cohort = parse_cohort(data.get('cohort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job_id = REPORT_JOBS.submit({'user_input': user_input.strip(), 'cohort': cohort})
+    except QueueFull as e:
+        response = jsonify({'error': f'Report queue is full: {e}'})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+
+    return jsonify({
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': f'/api/download-report/jobs/{job_id}',
+        'download_url': f'/api/download-report/jobs/{job_id}/file'
+    }), 202
+
+@app.route('/api/download-report/jobs/<job_id>', methods=['GET'])
+def api_report_job_status(job_id):
+    status = REPORT_JOBS.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify({'job_id': job_id, **status})
+
+@app.route('/api/download-report/jobs/<job_id>/file', methods=['GET'])
+def api_report_job_file(job_id):
+    path = REPORT_JOBS.artifact(job_id)
+    if path is None:
+        status = REPORT_JOBS.status(job_id)
+        if status is None:
+            return jsonify({'error': 'Unknown or expired job'}), 404
+        return jsonify({'job_id': job_id, **status}), 409
+
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name="carbon_report.docx",
+        mimetype=DOCX_MIMETYPE
+    )
+
+def export_item(i, item):
+    """An export item as {"id", "user_input"} or {"id", "result"}; a bare string is a user_input."""
+    if isinstance(item, str):
+        item = {'user_input': item}
+    if not isinstance(item, dict) or ('user_input' in item) == ('result' in item):
+        raise ValueError(f"items[{i}] must be a string or an object with either user_input or result")
+    if 'user_input' in item and not (isinstance(item['user_input'], str) and item['user_input'].strip()):
+        raise ValueError(f"items[{i}].user_input must be a non-empty string")
+    item_id = item.get('id', i + 1)
+    if isinstance(item_id, bool) or not isinstance(item_id, (str, int)):
+        raise ValueError(f"items[{i}].id must be a string or an integer")
+    if 'result' in item:
+        return {'id': item_id, 'result': item['result']}
+    return {'id': item_id, 'user_input': item['user_input'].strip()}
+
+@app.route('/api/download-report/bulk', methods=['POST'])
+def api_submit_report_export():
+    """Queue a ZIP of one report per item, in DOCX or (lighter, no chart image) HTML format."""
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > EXPORT_MAX_ITEMS:
+        return jsonify({'error': f'At most {EXPORT_MAX_ITEMS} items per export'}), 413
+    fmt = data.get('format', 'docx')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {sorted(EXPORT_FORMATS)}'}), 400
+    try:
+        cohort = parse_cohort(data.get('cohort'))
+        items = [export_item(i, item) for i, item in enumerate(items)]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job_id = REPORT_EXPORTS.submit({'items': items, 'format': fmt, 'cohort': cohort})
+    except QueueFull as e:
+        response = jsonify({'error': f'Export queue is full: {e}'})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+
+    return jsonify({
+        'job_id': job_id,
+        'status': 'pending',
+        'items': len(items),
+        'format': fmt,
+        'status_url': f'/api/download-report/bulk/{job_id}',
+        'download_url': f'/api/download-report/bulk/{job_id}/file'
+    }), 202
+
+@app.route('/api/download-report/bulk/<job_id>', methods=['GET'])
+def api_report_export_status(job_id):
+    status = REPORT_EXPORTS.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify({'job_id': job_id, **status})
+
+@app.route('/api/download-report/bulk/<job_id>/file', methods=['GET'])
+def api_report_export_file(job_id):
+    path = REPORT_EXPORTS.artifact(job_id)
+    if path is None:
+        status = REPORT_EXPORTS.status(job_id)
+        if status is None:
+            return jsonify({'error': 'Unknown or expired job'}), 404
+        return jsonify({'job_id': job_id, **status}), 409
+
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name="carbon_reports.zip",
+        mimetype="application/zip"
+    )
+
 @app.route('/api/download-tips', methods=['POST'])
 def api_download_tips():
     data = request.get_json()
@@ -963,38 +1952,47 @@ def api_download_tips():
         return jsonify({'error': 'Empty input'}), 400
     
     try:
-        result = parse_input_to_data(user_input)
-        tips = generate_tips(result)
+        result = parse_input_cached(user_input, timeout=request_timeout())
+        tips = result.get('tips', [])
         
         if not tips:
             return jsonify({'error': 'No tips available for the provided input'}), 404
 
-        # Create Word document
-        doc = Document()
-        doc.add_heading('🌿 Personalized Carbon Reduction Tips', 0)
+        with stage("tips_document"):
+            from docx import Document
 
-        intro = doc.add_paragraph()
-        intro.add_run("Based on your input, here are some sustainability tips to reduce your carbon footprint:\n").italic = True
+            # Create Word document
+            doc = Document()
+            doc.add_heading('🌿 Personalized Carbon Reduction Tips', 0)
 
-        for tip in tips:
-            doc.add_paragraph(tip, style='List Bullet')
+            intro = doc.add_paragraph()
+            intro.add_run("Based on your input, here are some sustainability tips to reduce your carbon footprint:\n").italic = True
 
-        doc.add_paragraph("\n💡 Small steps can lead to big impact. Stay green!", style='Intense Quote')
+            for tip in tips:
+                doc.add_paragraph(tip, style='List Bullet')
 
-        # Save document to in-memory buffer
-        buffer = BytesIO()
-        doc.save(buffer)
+            doc.add_paragraph("\n💡 Small steps can lead to big impact. Stay green!", style='Intense Quote')
+
+            # Save document to in-memory buffer
+            buffer = BytesIO()
+            doc.save(buffer)
         buffer.seek(0)
 
         return send_file(
             buffer,
             as_attachment=True,
             download_name="carbon_tips.docx",
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            mimetype=DOCX_MIMETYPE
         )
     
+    except NLPPoolError as e:
+        return nlp_pool_error(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+STARTUP['import_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 3)
+if os.environ.get("WARMUP", "1") == "1":
+    warmup(reports=os.environ.get("WARMUP_REPORTS", "0") == "1")
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
\ No newline at end of file
@@ -0,0 +1,346 @@
+"""Async serving mode: the Flask routes behind an asyncio ASGI front end.
+
+    uvicorn --host 0.0.0.0 --port $PORT src.components.asgi:app
+
+One event loop owns every connection. Handlers that are CPU-bound (spaCy
+parsing, report and tips documents, audio decoding) run whole in a process
+pool forked after the model is loaded, so a slow report or recording never
+holds up a cheap request. The remaining routes, whose work is file or SQLite
+I/O, run in a thread pool with request and response bodies streamed to and
+from the loop. Routes, status codes and JSON bodies are the Flask app's own.
+
+Each endpoint has a concurrency limit (ASYNC_LIMITS="recognize_speech=2,
+api_download_report=4"); a request that waits longer than
+ASYNC_QUEUE_TIMEOUT seconds for a slot gets a 503 with Retry-After. Metrics
+of handlers that ran in the pool stay in the pool processes; /metrics has
+this front end's per-endpoint latency, in-flight and rejection counts.
+"""
+import asyncio
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.exceptions import HTTPException
+
+from .app import METRICS, app as flask_app, freeze_for_fork
+from .logs import log_event
+
+# Handlers that run in the process pool; their bodies are read in full first
+PROCESS_ENDPOINTS = {
+    "api_calculate", "api_calculate_batch", "api_calculate_structured",
+    "api_download_report", "api_download_tips", "recognize_speech",
+}
+
+
+def parse_limits(spec):
+    """{endpoint: limit} from "endpoint=N,endpoint=N"."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        endpoint, _, value = item.partition("=")
+        if endpoint.strip() not in flask_app.view_functions or not value.strip().isdigit() or int(value) < 1:
+            raise ValueError(f"ASYNC_LIMITS: expected endpoint=N with a known endpoint, got {item!r}")
+        limits[endpoint.strip()] = int(value)
+    return limits
+
+
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", os.cpu_count() or 2))
+ASYNC_THREADS = int(os.environ.get("ASYNC_THREADS", 16))
+ASYNC_DEFAULT_LIMIT = int(os.environ.get("ASYNC_DEFAULT_LIMIT", 64))
+ASYNC_QUEUE_TIMEOUT = float(os.environ.get("ASYNC_QUEUE_TIMEOUT", 10))
+ASYNC_MAX_BODY = int(os.environ.get("ASYNC_MAX_BODY", 16 * 1024 * 1024))
+# Pool endpoints may keep every worker busy with one more request queued
+# behind each, except the slow documents and recordings: they leave a worker
+# free so parses don't wait behind them in the pool. The stream endpoint
+# parses on this process, so it gets few.
+SLOW_ENDPOINTS = {"api_download_report", "api_download_tips", "recognize_speech"}
+ASYNC_LIMITS = {
+    **{endpoint: 2 * ASYNC_WORKERS for endpoint in PROCESS_ENDPOINTS - SLOW_ENDPOINTS},
+    **{endpoint: max(1, ASYNC_WORKERS - 1) for endpoint in SLOW_ENDPOINTS},
+    "api_calculate_stream": 2,
+    **parse_limits(os.environ.get("ASYNC_LIMITS", "")),
+}
+
+ASYNC_SECONDS = METRICS.histogram(
+    "carbon_async_request_seconds", "Async front end latency by endpoint, queueing included.", ["endpoint"]
+)
+ASYNC_REJECTED = METRICS.counter(
+    "carbon_async_rejected_total", "Requests turned away because an endpoint's limit stayed full.", ["endpoint"]
+)
+
+
+def wsgi_environ(scope):
+    """The WSGI environ of an ASGI http scope, minus wsgi.input/wsgi.errors (so it pickles)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0] if client else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        # Bodies without a Content-Length (chunked uploads) are read to EOF
+        "wsgi.input_terminated": True,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else "HTTP_" + name
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+def run_wsgi(environ, body):
+    # Runs in a pool process, which inherited the loaded app at fork
+    environ = dict(environ, **{"wsgi.input": io.BytesIO(body), "wsgi.errors": sys.stderr})
+    started = []
+    chunks = flask_app(environ, lambda status, headers, exc_info=None: started.extend([status, headers]))
+    try:
+        data = b"".join(chunks)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return started[0], started[1], data
+
+
+def _start_message(status, headers):
+    return {
+        "type": "http.response.start",
+        "status": int(status.split(" ", 1)[0]),  # "200 OK"
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    }
+
+
+class ReceiveStream(io.RawIOBase):
+    """wsgi.input for a handler thread, pulling body chunks from the event loop."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b""
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                self._done = True
+            else:
+                self._buffer += message.get("body", b"")
+                self._done = not message.get("more_body", False)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def serve_in_thread(environ, loop, receive, send):
+    # Runs in the thread pool; every send goes through the loop, so a
+    # streamed response goes out chunk by chunk as the handler yields it
+    def send_now(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    environ = dict(environ, **{"wsgi.input": io.BufferedReader(ReceiveStream(receive, loop)), "wsgi.errors": sys.stderr})
+    started = []
+    chunks = flask_app(environ, lambda status, headers, exc_info=None: started.extend([status, headers]))
+    try:
+        sent_start = False
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if not sent_start:
+                send_now(_start_message(*started))
+                sent_start = True
+            send_now({"type": "http.response.body", "body": chunk, "more_body": True})
+        if not sent_start:
+            send_now(_start_message(*started))
+        send_now({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+async def send_json(send, status, body, headers=()):
+    data = json.dumps(body).encode("utf-8")
+    await send(_start_message(str(status), [("Content-Type", "application/json"), ("Content-Length", str(len(data))), *headers]))
+    await send({"type": "http.response.body", "body": data})
+
+
+class Limiter:
+    """Concurrency slots for one endpoint; waiters give up after ``timeout`` seconds."""
+
+    def __init__(self, limit, timeout):
+        self.limit = limit
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class AsyncApp:
+    """ASGI application serving ``flask_app``'s routes from an event loop (see the module docstring)."""
+
+    def __init__(self, wsgi_app, workers, threads, limits, default_limit, queue_timeout, max_body):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.threads = threads
+        self.limits = limits
+        self.default_limit = default_limit
+        self.queue_timeout = queue_timeout
+        self.max_body = max_body
+        self.process_pool = None
+        self.thread_pool = None
+        self.limiters = {}
+        self.urls = wsgi_app.url_map.bind("localhost")
+        METRICS.register_collector(self.metrics)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.handle(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _new_process_pool(self):
+        # Forked so the workers share the loaded model pages copy-on-write
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    async def start(self):
+        if self.process_pool is not None:
+            return
+        freeze_for_fork()
+        self.process_pool = self._new_process_pool()
+        self.thread_pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="async-handler")
+        # Start every pool process now rather than on the first slow request
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.process_pool, os.getpid) for _ in range(self.workers)])
+        log_event("async_started", sampled=False, workers=self.workers, threads=self.threads)
+
+    def stop(self):
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False)
+            self.thread_pool.shutdown(wait=False)
+            self.process_pool = self.thread_pool = None
+
+    def endpoint(self, scope):
+        try:
+            endpoint, _ = self.urls.match(scope["path"], method=scope["method"])
+            return endpoint
+        except HTTPException:
+            # Flask answers 404/405 itself
+            return None
+
+    def limiter(self, endpoint):
+        limiter = self.limiters.get(endpoint)
+        if limiter is None:
+            limiter = Limiter(self.limits.get(endpoint, self.default_limit), self.queue_timeout)
+            self.limiters[endpoint] = limiter
+        return limiter
+
+    async def handle(self, scope, receive, send):
+        if self.process_pool is None:
+            # Servers without lifespan support
+            await self.start()
+        started = time.perf_counter()
+        endpoint = self.endpoint(scope)
+        label = endpoint or "unmatched"
+        limiter = self.limiter(label)
+        if not await limiter.acquire():
+            ASYNC_REJECTED.inc(endpoint=label)
+            await send_json(send, 503, {"error": "Server is busy, try again later"}, [("Retry-After", "5")])
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            environ = wsgi_environ(scope)
+            if endpoint in PROCESS_ENDPOINTS:
+                await self.handle_in_process(environ, receive, send)
+            else:
+                await loop.run_in_executor(self.thread_pool, serve_in_thread, environ, loop, receive, send)
+        finally:
+            limiter.release()
+            ASYNC_SECONDS.observe(time.perf_counter() - started, endpoint=label)
+
+    async def handle_in_process(self, environ, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > self.max_body:
+                await send_json(send, 413, {"error": f"Request body larger than {self.max_body} bytes"})
+                return
+            if not message.get("more_body", False):
+                break
+
+        loop = asyncio.get_running_loop()
+        try:
+            status, headers, data = await loop.run_in_executor(self.process_pool, run_wsgi, environ, bytes(body))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); replace the pool for later requests
+            log_event("async_pool_broken", level=logging.ERROR)
+            self.process_pool = self._new_process_pool()
+            await send_json(send, 503, {"error": "Worker pool restarted, try again"}, [("Retry-After", "1")])
+            return
+        await send(_start_message(status, headers))
+        await send({"type": "http.response.body", "body": data})
+
+    def metrics(self):
+        limiters = sorted(self.limiters.items())
+        yield ("carbon_async_in_flight", "gauge", "Requests being handled by endpoint.",
+               [({"endpoint": name}, limiter.in_flight) for name, limiter in limiters])
+        yield ("carbon_async_waiting", "gauge", "Requests waiting for an endpoint slot.",
+               [({"endpoint": name}, limiter.waiting) for name, limiter in limiters])
+
+
+app = AsyncApp(
+    flask_app,
+    workers=ASYNC_WORKERS,
+    threads=ASYNC_THREADS,
+    limits=ASYNC_LIMITS,
+    default_limit=ASYNC_DEFAULT_LIMIT,
+    queue_timeout=ASYNC_QUEUE_TIMEOUT,
+    max_body=ASYNC_MAX_BODY,
+)
@@ -0,0 +1,340 @@
+"""Bulk calculation over structured activity records in CSV (or Parquet) files.
+
+One row per record; columns map onto calculate_carbon's inputs:
+
+    id,transport.car,transport.bus,electricity_kwh,food.beef,shopping_spend,shopping_type
+    site-1,120,35,840,2.5,15000,gadgets
+
+``transport.<mode>`` columns are kilometres and ``food.<item>`` columns
+kilograms; the other inputs use calculate_carbon's argument names. Empty
+cells mean "not given". Columns listed in ``keep`` (default: id) are copied
+to the output unchanged; any other column is an error, so a misspelt header
+can't silently drop data.
+
+Rows are read and calculated ``chunk_rows`` at a time with ColumnarCalculator,
+so memory stays flat however long the file is. Each output row has the
+emission totals or, for a row that could not be read, an error message.
+Parquet needs pyarrow (pip install pyarrow).
+
+    python -m src.components.bulk records.csv -o results.csv --keep id,site
+"""
+import csv
+import io
+import itertools
+
+import numpy as np
+
+from .columnar import ActivityColumns, ColumnarCalculator
+
+NUMBER_FIELDS = ["electricity_kwh", "shopping_spend", "flight_km", "water_liters", "plastic_kg"]
+# Defaults as in calculate_carbon, for empty cells
+TYPE_DEFAULTS = {"shopping_type": "clothes", "flight_type": "domestic", "water_type": "tap", "plastic_type": "PET"}
+RESULT_FIELDS = [
+    "transport_total", "electricity_kwh", "food_total", "shopping_spend", "flight_km",
+    "water_liters", "plastic_kg", "total_emission", "trees_required", "factor_version", "error",
+]
+PARQUET_MIMETYPES = {"application/vnd.apache.parquet", "application/x-parquet"}
+
+
+class BulkFormatError(ValueError):
+    pass
+
+
+class RecordSchema:
+    """Where each calculate_carbon input sits in a file's columns."""
+
+    def __init__(self, header, keep=("id",)):
+        header = [name.strip() for name in header]
+        if not header or header == [""]:
+            raise BulkFormatError("the file has no header row")
+        duplicates = sorted({name for name in header if header.count(name) > 1})
+        if duplicates:
+            raise BulkFormatError(f"duplicate columns: {', '.join(duplicates)}")
+
+        self.header = header
+        self.keep = [i for i, name in enumerate(header) if name in keep]
+        self.transport = []
+        self.food = []
+        self.numbers = {}
+        self.types = {}
+        unknown = []
+        for i, name in enumerate(header):
+            group, _, item = name.partition(".")
+            if name in keep:
+                continue
+            if group == "transport" and item:
+                self.transport.append((i, item))
+            elif group == "food" and item:
+                self.food.append((i, item))
+            elif name in NUMBER_FIELDS:
+                self.numbers[name] = i
+            elif name in TYPE_DEFAULTS:
+                self.types[name] = i
+            else:
+                unknown.append(name)
+        if unknown:
+            raise BulkFormatError(
+                f"unknown columns: {', '.join(unknown)} (expected transport.<mode>, food.<item>, "
+                f"{', '.join(NUMBER_FIELDS + list(TYPE_DEFAULTS))} or a kept column)"
+            )
+
+    def output_header(self):
+        return [self.header[i] for i in self.keep] + RESULT_FIELDS
+
+
+def parse_numbers(name, cells, errors):
+    """Float array of a column (str cells, or numbers from Parquet); bad cells become row errors and 0."""
+    if isinstance(cells, np.ndarray) and cells.dtype.kind in "fiu":
+        values = cells.astype(float)
+    else:
+        # float() per cell beats numpy's str -> float casts several times over
+        try:
+            values = np.fromiter((float(cell) if cell else 0.0 for cell in cells), float, len(cells))
+        except (TypeError, ValueError):
+            values = np.zeros(len(cells))
+            for i, cell in enumerate(cells):
+                try:
+                    values[i] = float(cell.strip() or 0)
+                except ValueError:
+                    errors.setdefault(i, f"{name}: {cell!r} is not a number")
+    for i in np.flatnonzero(~(np.isfinite(values) & (values >= 0))):
+        errors.setdefault(int(i), f"{name} must be a finite, non-negative number")
+        values[i] = 0.0
+    return values
+
+
+def type_ids(vector, cells, default, n, prefix=""):
+    """FactorVector ids of a type column (None: not in the file); encoded once per distinct value."""
+    if cells is None:
+        return np.full(n, vector.id_of(prefix + default), dtype=np.int64)
+    names, inverse = np.unique(np.asarray(cells, dtype=str), return_inverse=True)
+    ids = np.array([vector.id_of(prefix + (name.strip() or default)) for name in names], dtype=np.int64)
+    return ids[inverse.reshape(-1)]
+
+
+def sparse_items(vector, group, columns, name_columns, errors):
+    """(rows, ids, amounts) of the nonzero cells of ``group``.<item> columns, in column order per row."""
+    rows, ids, amounts = [], [], []
+    for index, item in name_columns:
+        values = parse_numbers(f"{group}.{item}", columns[index], errors)
+        nonzero = np.flatnonzero(values)
+        rows.append(nonzero)
+        ids.append(np.full(len(nonzero), vector.id_of(item), dtype=np.int64))
+        amounts.append(values[nonzero])
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    rows = np.concatenate(rows)
+    # Stable, so each row keeps its items in column order (and calculate_carbon's summation order)
+    order = np.argsort(rows, kind="stable")
+    return rows[order], np.concatenate(ids)[order], np.concatenate(amounts)[order]
+
+
+class BulkCalculator:
+    """ColumnarCalculator over CSV/Parquet chunks; see the module docstring."""
+
+    def __init__(self, factors, keep=("id",), chunk_rows=20000):
+        self.calculator = ColumnarCalculator(factors)
+        self.keep = tuple(keep)
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.errors = 0
+
+    def encode(self, schema, columns, n, errors):
+        c = self.calculator
+        transport = sparse_items(c.transport, "transport", columns, schema.transport, errors)
+        food = sparse_items(c.food, "food", columns, schema.food, errors)
+        numbers = {
+            name: parse_numbers(name, columns[i], errors) if i is not None else np.zeros(n)
+            for name, i in ((name, schema.numbers.get(name)) for name in NUMBER_FIELDS)
+        }
+
+        def type_column(name):
+            i = schema.types.get(name)
+            return columns[i] if i is not None else None
+
+        shopping = type_column("shopping_type")
+        shop_ids = type_ids(c.shopping, shopping, TYPE_DEFAULTS["shopping_type"], n)
+        shop_cost_ids = type_ids(c.shopping_cost, shopping, TYPE_DEFAULTS["shopping_type"], n)
+        flight_ids = type_ids(c.air, type_column("flight_type"), TYPE_DEFAULTS["flight_type"], n, prefix="flight_")
+        water_ids = type_ids(c.water, type_column("water_type"), TYPE_DEFAULTS["water_type"], n)
+        plastic_ids = type_ids(c.plastic, type_column("plastic_type"), TYPE_DEFAULTS["plastic_type"], n)
+
+        return ActivityColumns(
+            n=n,
+            transport_rows=transport[0], transport_ids=transport[1], transport_km=transport[2],
+            food_rows=food[0], food_ids=food[1], food_qty=food[2],
+            electricity=numbers["electricity_kwh"],
+            shop_spend=numbers["shopping_spend"],
+            shop_ids=shop_ids,
+            shop_cost_ids=shop_cost_ids,
+            flight_km=numbers["flight_km"],
+            flight_ids=flight_ids,
+            # An empty flight_type cell means the default, so any distance counts
+            has_flight=numbers["flight_km"] > 0,
+            water_liters=numbers["water_liters"],
+            water_ids=water_ids,
+            plastic_kg=numbers["plastic_kg"],
+            plastic_ids=plastic_ids,
+        )
+
+    def calculate_chunk(self, schema, columns, n, errors):
+        """Output rows (lists) for one chunk of ``n`` records given as columns."""
+        result = self.calculator.compute(self.encode(schema, columns, n, errors))
+        for i in np.flatnonzero(~np.isfinite(result.total_emission)):
+            # Every amount is finite, but together they overflow
+            errors.setdefault(int(i), "amounts are too large to calculate")
+        values = [
+            result.transport_total, result.electricity_kwh, result.food_total, result.shopping_spend,
+            result.flight_km, result.water_liters, result.plastic_kg, result.total_emission,
+        ]
+        out = [list(columns[i]) for i in schema.keep]
+        out += [column.tolist() for column in values]
+        out.append(result.trees_required.tolist())
+        out.append([result.factor_version] * n)
+        out.append([""] * n)
+        rows = [list(row) for row in zip(*out)] if errors else list(zip(*out))
+        kept = len(schema.keep)
+        for i, message in errors.items():
+            rows[i][kept:] = [""] * (len(RESULT_FIELDS) - 1) + [message]
+        self.rows += n
+        self.errors += len(errors)
+        return rows
+
+    def read_csv(self, text):
+        """(schema, chunk iterator) for a CSV text stream; the header is checked straight away."""
+        reader = csv.reader(text)
+        try:
+            header = next(reader)
+        except StopIteration:
+            raise BulkFormatError("the file is empty")
+        except csv.Error as e:
+            raise BulkFormatError(f"invalid CSV: {e}")
+        schema = RecordSchema(header, self.keep)
+        return schema, self._csv_chunks(schema, reader)
+
+    def _csv_chunks(self, schema, reader):
+        width = len(schema.header)
+        while True:
+            try:
+                batch = list(itertools.islice(reader, self.chunk_rows))
+            except csv.Error as e:
+                raise BulkFormatError(f"invalid CSV near line {reader.line_num}: {e}")
+            if not batch:
+                return
+            # Blank lines are skipped; a chunk of nothing else is not the end
+            rows = [row for row in batch if row]
+            if not rows:
+                continue
+            errors = {}
+            for i, row in enumerate(rows):
+                if len(row) != width:
+                    errors[i] = f"expected {width} fields, got {len(row)}"
+                    rows[i] = (row + [""] * width)[:width]
+            yield list(zip(*rows)), len(rows), errors
+
+    def read_parquet(self, source):
+        """(schema, chunk iterator) for a Parquet file (path or seekable binary file)."""
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise BulkFormatError("Parquet support needs pyarrow (pip install pyarrow)")
+
+        try:
+            parquet = pq.ParquetFile(source)
+        except Exception as e:
+            raise BulkFormatError(f"invalid Parquet file: {e}")
+        schema = RecordSchema(parquet.schema_arrow.names, self.keep)
+
+        def chunks():
+            for batch in parquet.iter_batches(batch_size=self.chunk_rows):
+                columns = []
+                for column in batch.columns:
+                    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+                        # Nulls are cells not given
+                        columns.append(pc.fill_null(column, 0).to_numpy(zero_copy_only=False))
+                    else:
+                        columns.append(["" if value is None else str(value) for value in column.to_pylist()])
+                yield columns, batch.num_rows, {}
+
+        return schema, chunks()
+
+    def iter_csv(self, schema, chunks):
+        """CSV text of the results: the header, then one string per chunk."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(schema.output_header())
+        for columns, n, errors in chunks:
+            writer.writerows(self.calculate_chunk(schema, columns, n, errors))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def write_parquet(self, schema, chunks, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        names = schema.output_header()
+        writer = None
+        try:
+            for columns, n, errors in chunks:
+                rows = self.calculate_chunk(schema, columns, n, errors)
+                kept = len(schema.keep)
+                arrays = [pa.array([row[i] for row in rows]).cast(pa.string()) if i < kept
+                          else pa.array([row[i] if row[i] != "" else None for row in rows])
+                          for i in range(len(names))]
+                table = pa.Table.from_arrays(arrays, names=names)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+def main(argv=None):
+    import argparse
+    import os
+    import sys
+    import time
+
+    from .factors import load_registry
+
+    parser = argparse.ArgumentParser(description="Calculate emissions for structured records in a CSV or Parquet file.")
+    parser.add_argument("input", help="CSV or .parquet file ('-' for CSV on stdin)")
+    parser.add_argument("-o", "--output", default="-", help="CSV or .parquet file ('-' for CSV on stdout)")
+    parser.add_argument("--keep", default="id", help="comma-separated columns copied to the output")
+    parser.add_argument("--chunk-rows", type=int, default=20000)
+    parser.add_argument("--factors", default=os.path.join(os.path.dirname(__file__), "factors.json"))
+    args = parser.parse_args(argv)
+
+    bulk = BulkCalculator(load_registry(args.factors), keep=[c for c in args.keep.split(",") if c],
+                          chunk_rows=args.chunk_rows)
+    started = time.perf_counter()
+    try:
+        if args.input.endswith(".parquet"):
+            schema, chunks = bulk.read_parquet(args.input)
+        else:
+            source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8-sig", newline="")
+            schema, chunks = bulk.read_csv(source)
+        if args.output.endswith(".parquet"):
+            bulk.write_parquet(schema, chunks, args.output)
+        else:
+            out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+            with out:
+                for text in bulk.iter_csv(schema, chunks):
+                    out.write(text)
+    except BulkFormatError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    seconds = time.perf_counter() - started
+    print(f"{bulk.rows} rows ({bulk.errors} with errors) in {seconds:.2f} s, "
+          f"{bulk.rows / seconds * 60 / 1e6:.2f} M rows/min", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
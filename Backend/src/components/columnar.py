@@ -0,0 +1,214 @@
+from types import MappingProxyType
+
+import numpy as np
+
+# Column order of ColumnarResult.percentages, matching result["category_percentages"]
+PERCENT_CATEGORIES = ["transport", "electricity", "food", "shopping", "flight", "water", "plastic"]
+
+
+def round_like_python(values, ndigits):
+    """Vectorized round() that agrees with Python's builtin on every element.
+
+    np.round scales by 10**ndigits first, which can push a value that sits
+    next to a .5 boundary onto the other side. Those few near-ties are
+    re-rounded with the builtin.
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    near_tie = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in near_tie:
+        rounded.flat[i] = round(float(values.flat[i]), ndigits)
+    return rounded
+
+
+class FactorVector:
+    """Read-only factor table as a float vector; unknown names map to a trailing default slot."""
+
+    def __init__(self, factors, default, normalize=str.lower):
+        self.names = tuple(factors)
+        self.ids = MappingProxyType({normalize(name): i for i, name in enumerate(self.names)})
+        self.values = np.array([factors[name] for name in self.names] + [default], dtype=float)
+        self.values.setflags(write=False)
+        self.unknown_id = len(self.names)
+        self.normalize = normalize
+
+    def __contains__(self, name):
+        return self.normalize(name) in self.ids
+
+    def id_of(self, name):
+        return self.ids.get(self.normalize(name), self.unknown_id)
+
+    def factor(self, name):
+        """The factor for ``name``, or the default for an unknown name."""
+        return float(self.values[self.id_of(name)])
+
+
+class ActivityColumns:
+    """calculate_carbon inputs of N records as arrays.
+
+    Transport and food are sparse: one (row, id, amount) entry per item, in
+    each record's item order. Names are FactorVector ids; ``has_flight``
+    marks rows whose flight counts (km > 0 and a flight type given).
+    """
+
+    def __init__(self, **columns):
+        self.__dict__.update(columns)
+
+
+class ColumnarResult:
+    """Per-record category totals of a batch, one array entry per record."""
+
+    def __init__(self, **columns):
+        self.__dict__.update(columns)
+
+    def __len__(self):
+        return len(self.total_emission)
+
+    def row(self, i):
+        """The i-th record in the shape calculate_carbon returns (minus details/tips/badges)."""
+        result = {
+            "transport_total": float(self.transport_total[i]),
+            "electricity_kwh": float(self.electricity_kwh[i]),
+            "food_total": float(self.food_total[i]),
+            "shopping_spend": float(self.shopping_spend[i]),
+            "water_liters": float(self.water_liters[i]),
+            "plastic_kg": float(self.plastic_kg[i]),
+        }
+        if self.has_flight[i]:
+            result["flight_km"] = float(self.flight_km[i])
+        if self.raw_total[i] > 0:
+            result["category_percentages"] = {
+                name: float(value) for name, value in zip(PERCENT_CATEGORIES, self.percentages[i])
+            }
+        result["total_emission"] = float(self.total_emission[i])
+        result["trees_required"] = int(self.trees_required[i])
+        result["factor_version"] = self.factor_version
+        return result
+
+
+class ColumnarCalculator:
+    """calculate_carbon over N structured records in one vectorized pass.
+
+    Records use calculate_carbon's keyword arguments; ``factors`` is a
+    FactorRegistry. Every per-item round(..., 2) of the scalar path is
+    reproduced so totals match it exactly.
+    """
+
+    def __init__(self, factors):
+        self.version = factors.version
+        self.transport = factors.transport
+        self.food = factors.food
+        self.shopping = factors.shopping
+        self.shopping_cost = factors.shopping_cost
+        self.water = factors.water
+        self.plastic = factors.plastic
+        self.air = factors.air
+        self.electricity_factor = factors.electricity_factor
+        self.tree_factor = factors.tree_factor
+
+    def calculate(self, records):
+        return self.compute(self.encode(records))
+
+    def encode(self, records):
+        """Activity columns (see compute) of calculate_carbon-style record dicts."""
+        n = len(records)
+        transport_rows, transport_ids, transport_km = [], [], []
+        food_rows, food_ids, food_qty = [], [], []
+        electricity = np.zeros(n)
+        shop_spend = np.zeros(n)
+        shop_ids = np.zeros(n, dtype=np.int64)
+        shop_cost_ids = np.zeros(n, dtype=np.int64)
+        flight_km = np.zeros(n)
+        flight_ids = np.zeros(n, dtype=np.int64)
+        has_flight = np.zeros(n, dtype=bool)
+        water_liters = np.zeros(n)
+        water_ids = np.zeros(n, dtype=np.int64)
+        plastic_kg = np.zeros(n)
+        plastic_ids = np.zeros(n, dtype=np.int64)
+
+        # Encode names to integer ids; everything after this is array math
+        for i, record in enumerate(records):
+            for mode, km in record.get("transport_data", {}).items():
+                transport_rows.append(i)
+                transport_ids.append(self.transport.id_of(mode))
+                transport_km.append(km)
+            for item, qty in record.get("food_data", {}).items():
+                food_rows.append(i)
+                food_ids.append(self.food.id_of(item))
+                food_qty.append(qty)
+            electricity[i] = record.get("electricity_kwh", 0)
+            shopping_type = record.get("shopping_type", "clothes")
+            shop_spend[i] = record.get("shopping_spend", 0)
+            shop_ids[i] = self.shopping.id_of(shopping_type)
+            shop_cost_ids[i] = self.shopping_cost.id_of(shopping_type)
+            flight_type = record.get("flight_type", "domestic")
+            flight_km[i] = record.get("flight_km", 0)
+            has_flight[i] = flight_km[i] > 0 and bool(flight_type)
+            if has_flight[i]:
+                flight_ids[i] = self.air.id_of("flight_" + flight_type)
+            water_liters[i] = record.get("water_liters", 0)
+            water_ids[i] = self.water.id_of(record.get("water_type", "tap"))
+            plastic_kg[i] = record.get("plastic_kg", 0)
+            plastic_ids[i] = self.plastic.id_of(record.get("plastic_type", "PET"))
+
+        return ActivityColumns(
+            n=n,
+            transport_rows=np.asarray(transport_rows, dtype=np.int64),
+            transport_ids=np.asarray(transport_ids, dtype=np.int64),
+            transport_km=np.asarray(transport_km, dtype=float),
+            food_rows=np.asarray(food_rows, dtype=np.int64),
+            food_ids=np.asarray(food_ids, dtype=np.int64),
+            food_qty=np.asarray(food_qty, dtype=float),
+            electricity=electricity,
+            shop_spend=shop_spend,
+            shop_ids=shop_ids,
+            shop_cost_ids=shop_cost_ids,
+            flight_km=flight_km,
+            flight_ids=flight_ids,
+            has_flight=has_flight,
+            water_liters=water_liters,
+            water_ids=water_ids,
+            plastic_kg=plastic_kg,
+            plastic_ids=plastic_ids,
+        )
+
+    def compute(self, c):
+        """The vectorized calculation over ActivityColumns ``c``."""
+        n = c.n
+        transport_items = round_like_python(c.transport_km * self.transport.values[c.transport_ids], 2)
+        transport = np.bincount(c.transport_rows, weights=transport_items, minlength=n)
+        food_items = round_like_python(c.food_qty * self.food.values[c.food_ids], 2)
+        food = np.bincount(c.food_rows, weights=food_items, minlength=n)
+
+        elec = round_like_python(c.electricity * self.electricity_factor, 2)
+        shop = round_like_python(
+            c.shop_spend / self.shopping_cost.values[c.shop_cost_ids] * self.shopping.values[c.shop_ids], 2
+        )
+        flight = np.where(c.has_flight, round_like_python(c.flight_km * self.air.values[c.flight_ids], 2), 0.0)
+        water = round_like_python((c.water_liters / 100) * self.water.values[c.water_ids], 2)
+        plastic = round_like_python(c.plastic_kg * self.plastic.values[c.plastic_ids], 2)
+
+        total = transport + elec + food + shop + flight + water + plastic
+        parts = np.stack([transport, elec, food, shop, flight, water, plastic], axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shares = parts / total[:, None] * 100
+        percentages = round_like_python(np.where(total[:, None] > 0, shares, 0.0), 1)
+        total_emission = round_like_python(total, 2)
+
+        return ColumnarResult(
+            transport_total=round_like_python(transport, 2),
+            electricity_kwh=elec,
+            food_total=round_like_python(food, 2),
+            shopping_spend=shop,
+            flight_km=flight,
+            has_flight=c.has_flight,
+            water_liters=water,
+            plastic_kg=plastic,
+            raw_total=total,
+            percentages=percentages,
+            total_emission=total_emission,
+            # An overflowing (infinite) total has no tree count; callers report those rows
+            trees_required=np.ceil(np.where(np.isfinite(total_emission), total_emission, 0.0) / self.tree_factor).astype(np.int64),
+            factor_version=self.version,
+        )
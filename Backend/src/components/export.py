@@ -0,0 +1,176 @@
+"""Bulk report export: many per-user reports rendered on a process pool, streamed into one ZIP.
+
+Items are rendered ``chunk_size`` at a time by ``render_chunk(items)``, which
+runs in a forked pool process and returns one (document bytes or None,
+error or None, seconds) per item. At most two chunks per process are in
+flight, and each document is written into the ZIP as soon as its chunk
+comes back, so memory holds a few chunks' documents however many items
+there are. The archive ends with manifest.csv: one line per item with its
+file name, size and render time, or why it failed.
+"""
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .jobs import write_progress
+from .logs import log_event
+
+# Extension and compression per format; DOCX files are already deflated zips
+FORMATS = {
+    "docx": ("docx", zipfile.ZIP_STORED),
+    "html": ("html", zipfile.ZIP_DEFLATED),
+}
+MANIFEST_FIELDS = ["index", "id", "file", "status", "bytes", "render_ms", "error"]
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def entry_name(index, item_id, extension):
+    """ZIP member name: zero-padded position (so listings keep input order) and a filesystem-safe id."""
+    safe = _UNSAFE.sub("_", str(item_id)).strip("._")[:64] or "report"
+    return f"{index + 1:06d}-{safe}.{extension}"
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class ExportProgress:
+    """Counts and timings of one export; snapshot() is what the .progress file and the summary hold."""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.render_seconds = []
+        self.started = time.monotonic()
+
+    def add(self, size, error, seconds):
+        if error is None:
+            self.done += 1
+            self.bytes += size
+            self.render_seconds.append(seconds)
+        else:
+            self.failed += 1
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        finished = self.done + self.failed
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        render_ms = sorted(s * 1000 for s in self.render_seconds)
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 2),
+            "reports_per_s": round(rate, 2),
+            "eta_s": round((self.total - finished) / rate, 1) if rate else None,
+            "bytes": self.bytes,
+            "render_ms": {
+                "p50": _round(_percentile(render_ms, 0.5)),
+                "p95": _round(_percentile(render_ms, 0.95)),
+                "max": _round(render_ms[-1] if render_ms else None),
+            },
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+
+def _new_pool(processes):
+    # Forked so the workers share the loaded model pages copy-on-write
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    return ProcessPoolExecutor(max_workers=processes, mp_context=context)
+
+
+def _rendered(items, render_chunk, chunk_size, processes):
+    """(start, chunk, rendered) for every chunk, in completion order."""
+    if processes <= 1:
+        for start, chunk in _chunks(items, chunk_size):
+            yield start, chunk, render_chunk(chunk)
+        return
+
+    pending = _chunks(items, chunk_size)
+    with _new_pool(processes) as pool:
+        in_flight = {}
+        for start, chunk in pending:
+            in_flight[pool.submit(render_chunk, chunk)] = (start, chunk)
+            if len(in_flight) >= 2 * processes:
+                break
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                start, chunk = in_flight.pop(future)
+                try:
+                    rendered = future.result()
+                except Exception as e:
+                    # A crashed chunk (e.g. a killed worker) fails its items, not the export
+                    rendered = [(None, str(e) or e.__class__.__name__, 0.0)] * len(chunk)
+                yield start, chunk, rendered
+                for start, chunk in pending:
+                    in_flight[pool.submit(render_chunk, chunk)] = (start, chunk)
+                    break
+
+
+def export_reports(items, render_chunk, path, fmt="docx", processes=1, chunk_size=8,
+                   progress_path=None, progress_interval=0.5):
+    """Render ``items`` (dicts with an optional "id") into a ZIP at ``path``; returns the final snapshot.
+
+    ``render_chunk`` must be picklable (a module-level function or a
+    functools.partial of one). With ``processes`` <= 1 everything renders in
+    this process. The progress file, if any, is rewritten at most every
+    ``progress_interval`` seconds and once more at the end.
+    """
+    extension, compression = FORMATS[fmt]
+    progress = ExportProgress(len(items))
+    manifest = []
+    written_at = 0.0
+    if progress_path:
+        write_progress(progress_path, progress.snapshot())
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for start, chunk, rendered in _rendered(items, render_chunk, chunk_size, processes):
+            for offset, (item, (data, error, seconds)) in enumerate(zip(chunk, rendered)):
+                index = start + offset
+                item_id = item.get("id", index + 1) if isinstance(item, dict) else index + 1
+                name = None
+                if error is None:
+                    name = entry_name(index, item_id, extension)
+                    archive.writestr(name, data, compress_type=compression)
+                progress.add(len(data) if data else 0, error, seconds)
+                manifest.append([index + 1, item_id, name or "", "failed" if error else "ok",
+                                 len(data) if data else 0, round(seconds * 1000, 1), error or ""])
+            if progress_path and time.monotonic() - written_at >= progress_interval:
+                write_progress(progress_path, progress.snapshot())
+                written_at = time.monotonic()
+
+        manifest.sort(key=lambda row: row[0])
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(MANIFEST_FIELDS)
+        writer.writerows(manifest)
+        archive.writestr("manifest.csv", text.getvalue())
+
+    summary = progress.snapshot()
+    summary["zip_bytes"] = os.path.getsize(path)
+    if progress_path:
+        write_progress(progress_path, summary)
+    log_event("report_export", level=logging.WARNING if progress.failed else logging.INFO, sampled=False,
+              format=fmt, processes=processes, total=summary["total"], done=summary["done"],
+              failed=summary["failed"], seconds=summary["elapsed_s"], reports_per_s=summary["reports_per_s"],
+              render_p95_ms=summary["render_ms"]["p95"], zip_bytes=summary["zip_bytes"])
+    return summary
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import numbers
+
+from .columnar import FactorVector
+
+# Name -> factor tables in factors.json; "transport" is grouped one level deeper
+TABLES = ["food", "shopping", "water", "plastic"]
+DEFAULTS = ["transport", "air", "food", "shopping", "shopping_rupee_per_kg", "water", "plastic"]
+SCALARS = ["electricity_per_kwh", "kg_per_tree"]
+
+
+class FactorFileError(ValueError):
+    pass
+
+
+def _check_factor(where, value):
+    if isinstance(value, bool) or not isinstance(value, numbers.Real) or value < 0:
+        raise FactorFileError(f"{where} must be a non-negative number, got {value!r}")
+
+
+def validate(data):
+    """Raise FactorFileError unless ``data`` has the shape of factors.json."""
+    if not isinstance(data, dict):
+        raise FactorFileError("factor file must be a JSON object")
+    if not isinstance(data.get("version"), (str, int)) or isinstance(data.get("version"), bool) \
+            or not str(data["version"]).strip():
+        raise FactorFileError("factor file needs a non-empty \"version\"")
+
+    groups = data.get("transport")
+    if not isinstance(groups, dict) or not isinstance(groups.get("air"), dict):
+        raise FactorFileError("\"transport\" must map groups (including \"air\") to factor tables")
+    tables = {f"transport.{group}": table for group, table in groups.items()}
+    tables.update({name: data.get(name) for name in TABLES})
+    for name, table in tables.items():
+        if not isinstance(table, dict):
+            raise FactorFileError(f"\"{name}\" must be an object of name: factor")
+        for item, value in table.items():
+            _check_factor(f"{name}.{item}", value)
+
+    costs = data.get("shopping_cost_estimates")
+    if not isinstance(costs, dict):
+        raise FactorFileError("\"shopping_cost_estimates\" must be an object")
+    for item, cost in costs.items():
+        if not isinstance(cost, dict):
+            raise FactorFileError(f"shopping_cost_estimates.{item} must be {{\"rupee_per_kg\": ...}}")
+        _check_factor(f"shopping_cost_estimates.{item}.rupee_per_kg", cost.get("rupee_per_kg"))
+        if cost["rupee_per_kg"] == 0:
+            raise FactorFileError(f"shopping_cost_estimates.{item}.rupee_per_kg must be positive")
+
+    defaults = data.get("defaults")
+    if not isinstance(defaults, dict):
+        raise FactorFileError("\"defaults\" must be an object")
+    for name in DEFAULTS:
+        _check_factor(f"defaults.{name}", defaults.get(name))
+    for name in SCALARS:
+        _check_factor(name, data.get(name))
+    if defaults["shopping_rupee_per_kg"] == 0 or data["kg_per_tree"] == 0:
+        raise FactorFileError("defaults.shopping_rupee_per_kg and kg_per_tree must be positive")
+
+
+class FactorRegistry:
+    """One version of factors.json, compiled into read-only FactorVector tables.
+
+    Names get integer ids and factors sit in float arrays with a trailing
+    default slot for unknown names. A registry is never changed after it is
+    built: a reload builds a new one and swaps the reference, so anything
+    holding a registry computes with one consistent version.
+    """
+
+    def __init__(self, data, digest):
+        self.version = str(data["version"])
+        self.digest = digest
+        self.source = data
+        defaults = data["defaults"]
+
+        # Flattened in file order; the extraction patterns are tried in this order
+        self.transport = FactorVector(
+            {mode: factor for group in data["transport"].values() for mode, factor in group.items()},
+            defaults["transport"]
+        )
+        self.air = FactorVector(data["transport"]["air"], defaults["air"])
+        self.food = FactorVector(data["food"], defaults["food"])
+        self.shopping = FactorVector(data["shopping"], defaults["shopping"])
+        self.shopping_cost = FactorVector(
+            {item: cost["rupee_per_kg"] for item, cost in data["shopping_cost_estimates"].items()},
+            defaults["shopping_rupee_per_kg"]
+        )
+        self.water = FactorVector(data["water"], defaults["water"])
+        self.plastic = FactorVector(data["plastic"], defaults["plastic"], normalize=str.upper)
+        self.electricity_factor = float(data["electricity_per_kwh"])
+        self.tree_factor = float(data["kg_per_tree"])
+
+    def tables_json(self):
+        """Canonical JSON of the factor data (without the version), for content hashes."""
+        return json.dumps({k: v for k, v in self.source.items() if k != "version"}, sort_keys=True)
+
+
+def load_registry(path):
+    """Read, validate and compile the factor file at ``path``."""
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        data = json.loads(content.decode("utf-8"))
+    except ValueError as e:
+        raise FactorFileError(f"{path} is not valid JSON: {e}")
+    validate(data)
+    return FactorRegistry(data, hashlib.sha256(content).hexdigest())
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check a factor file before deploying it.")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+    try:
+        registry = load_registry(args.path)
+    except (OSError, FactorFileError) as e:
+        print(f"invalid: {e}")
+        return 1
+    sizes = {name: len(getattr(registry, name).names)
+             for name in ["transport", "air", "food", "shopping", "water", "plastic"]}
+    print(f"version {registry.version} ({registry.digest[:12]}): {sizes}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+
+from .streaming import CATEGORY_FIELDS
+
+CATEGORIES = list(CATEGORY_FIELDS)
+PERIODS = ["day", "week", "month"]
+
+_COLUMNS = ", ".join(CATEGORIES)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    factor_version TEXT,
+    total_emission REAL NOT NULL,
+    {", ".join(f"{name} REAL NOT NULL" for name in CATEGORIES)}
+);
+CREATE INDEX IF NOT EXISTS entries_user_day ON entries (user_id, day);
+CREATE TABLE IF NOT EXISTS rollups (
+    user_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    total_emission REAL NOT NULL,
+    {", ".join(f"{name} REAL NOT NULL" for name in CATEGORIES)},
+    PRIMARY KEY (user_id, period, start)
+) WITHOUT ROWID;
+"""
+
+# One statement per period: add the entry's numbers to its day/week/month row
+_ROLLUP_UPSERT = f"""
+INSERT INTO rollups (user_id, period, start, entries, total_emission, {_COLUMNS})
+VALUES (?, ?, ?, 1, ?, {", ".join("?" for _ in CATEGORIES)})
+ON CONFLICT (user_id, period, start) DO UPDATE SET
+    entries = entries + 1,
+    total_emission = total_emission + excluded.total_emission,
+    {", ".join(f"{name} = {name} + excluded.{name}" for name in CATEGORIES)}
+"""
+
+
+def period_start(day, period):
+    """First day of the day/week (ISO, Monday)/month containing ``day``."""
+    if period == "day":
+        return day
+    if period == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"period must be one of {PERIODS}")
+
+
+def breakdown(result):
+    """(total_emission, per-category values in CATEGORIES order) of a calculate_carbon result."""
+    return result.get("total_emission", 0.0), [float(result.get(field, 0.0)) for field in CATEGORY_FIELDS.values()]
+
+
+class HistoryStore:
+    """Per-user results in SQLite, with day/week/month rollups maintained on insert.
+
+    Each insert adds its numbers to the three rollup rows it falls in, in the
+    same transaction, so a trend query reads one row per period from the
+    (user_id, period, start) primary key instead of scanning entries. The
+    database is in WAL mode so every gunicorn worker can share the file;
+    connections are per thread and reopened after fork. Only the numbers are
+    kept: the history routes take any user_id, so the raw input never is.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def record(self, user_id, result, day=None):
+        """Store one result for ``user_id`` on ``day`` (default today, UTC); returns the entry id."""
+        return self.record_many(user_id, [(day, result)])[0]
+
+    def record_many(self, user_id, items):
+        """Store (day, result) items in one transaction; returns their entry ids."""
+        now = time.time()
+        today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).date()
+        ids = []
+        conn = self._connect()
+        with conn:
+            for day, result in items:
+                day = day or today
+                total, values = breakdown(result)
+                cursor = conn.execute(
+                    f"INSERT INTO entries (user_id, day, recorded_at, factor_version, total_emission, {_COLUMNS}) "
+                    f"VALUES (?, ?, ?, ?, ?, {', '.join('?' for _ in CATEGORIES)})",
+                    [user_id, day.isoformat(), now, result.get("factor_version"), total] + values
+                )
+                ids.append(cursor.lastrowid)
+                conn.executemany(_ROLLUP_UPSERT, [
+                    [user_id, period, period_start(day, period).isoformat(), total] + values
+                    for period in PERIODS
+                ])
+        return ids
+
+    def rollups(self, user_id, period, start=None, end=None):
+        """Rollup rows of ``period`` whose start lies in [start, end], oldest first."""
+        if period not in PERIODS:
+            raise ValueError(f"period must be one of {PERIODS}")
+        # Widen start to its period so a range beginning mid-week/month keeps that period
+        low = period_start(start, period).isoformat() if start else ""
+        high = end.isoformat() if end else "9999-12-31"
+        rows = self._connect().execute(
+            f"SELECT start, entries, total_emission, {_COLUMNS} FROM rollups "
+            "WHERE user_id = ? AND period = ? AND start BETWEEN ? AND ? ORDER BY start",
+            (user_id, period, low, high)
+        ).fetchall()
+        return [{
+            "start": start,
+            "entries": entries,
+            "total_emission": round(total, 2),
+            "categories": {name: round(value, 2) for name, value in zip(CATEGORIES, values)},
+        } for start, entries, total, *values in rows]
+
+    def entries(self, user_id, start=None, end=None, limit=100):
+        """Entries of ``user_id`` with day in [start, end], newest first."""
+        rows = self._connect().execute(
+            f"SELECT id, day, recorded_at, factor_version, total_emission, {_COLUMNS} FROM entries "
+            "WHERE user_id = ? AND day BETWEEN ? AND ? ORDER BY day DESC, id DESC LIMIT ?",
+            (user_id, start.isoformat() if start else "", end.isoformat() if end else "9999-12-31", limit)
+        ).fetchall()
+        return [{
+            "id": row["id"],
+            "day": row["day"],
+            "recorded_at": row["recorded_at"],
+            "factor_version": row["factor_version"],
+            "total_emission": row["total_emission"],
+            "categories": {name: row[name] for name in CATEGORIES},
+        } for row in rows]
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            "entries": conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            "rollups": conn.execute("SELECT COUNT(*) FROM rollups").fetchone()[0],
+        }
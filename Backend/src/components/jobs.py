@@ -0,0 +1,170 @@
+import functools
+import glob
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def write_progress(path, progress):
+    """Replace the JSON progress file at ``path`` in one step, so readers never see half of it."""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+    os.replace(path + ".tmp", path)
+
+
+def _fail_job(base, error):
+    with open(base + ".error", "w", encoding="utf-8") as f:
+        f.write(str(error) or error.__class__.__name__)
+    for suffix in [".tmp", ".pending"]:
+        try:
+            os.remove(base + suffix)
+        except OSError:
+            pass
+
+
+def _run_job(build, job_dir, job_id, payload, suffix, to_file):
+    # Runs in a pool process. The artifact is renamed into place so readers
+    # never see a partial file; the .pending marker goes last.
+    base = os.path.join(job_dir, job_id)
+    try:
+        if to_file:
+            build(payload, base + ".tmp", base + ".progress")
+        else:
+            data = build(payload)
+            with open(base + ".tmp", "wb") as f:
+                f.write(data)
+        os.replace(base + ".tmp", base + suffix)
+    except Exception as e:
+        _fail_job(base, e)
+    finally:
+        try:
+            os.remove(base + ".pending")
+        except OSError:
+            pass
+
+
+class FileJobQueue:
+    """Background jobs on a bounded process pool, with state kept in ``job_dir``.
+
+    Each job is a set of files named after its id: ``.pending`` while queued or
+    running, then the artifact (``suffix``) or an ``.error`` message. Any
+    process sharing the directory (e.g. every gunicorn worker) can report
+    status or serve the artifact, and the number of ``.pending`` files bounds
+    the queue across all of them. Files older than ``ttl`` seconds are removed.
+    A job whose pool process dies fails with an ``.error``, and the next
+    submit starts a new pool.
+
+    With ``to_file`` the job is ``build(payload, path, progress_path)``: it
+    writes the artifact to ``path`` itself (for outputs too large to hold in
+    memory) and may keep a JSON ``.progress`` file up to date with
+    write_progress(); status() includes it.
+    """
+
+    def __init__(self, job_dir, build, suffix, max_workers=2, max_queue=16, ttl=3600, to_file=False):
+        self.job_dir = job_dir
+        self.build = build
+        self.suffix = suffix
+        self.to_file = to_file
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self._pool = None
+        self._pool_pid = None
+        os.makedirs(job_dir, exist_ok=True)
+
+    def _get_pool(self):
+        # Pools don't survive fork; each worker process gets its own
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def depth(self):
+        return len(glob.glob(os.path.join(self.job_dir, "*.pending")))
+
+    def submit(self, payload):
+        self.expire()
+        if self.depth() >= self.max_queue:
+            raise QueueFull(f"{self.max_queue} jobs already queued")
+
+        job_id = uuid.uuid4().hex
+        pending = os.path.join(self.job_dir, job_id + ".pending")
+        open(pending, "w").close()
+        args = (_run_job, self.build, self.job_dir, job_id, payload, self.suffix, self.to_file)
+        try:
+            try:
+                pool = self._get_pool()
+                future = pool.submit(*args)
+            except BrokenProcessPool:
+                self._pool = None
+                pool = self._get_pool()
+                future = pool.submit(*args)
+        except Exception:
+            os.remove(pending)
+            raise
+        future.add_done_callback(functools.partial(self._finished, job_id, pool))
+        return job_id
+
+    def _finished(self, job_id, pool, future):
+        # _run_job records its own errors, so an exception here means the job
+        # never finished: a pool process died (BrokenProcessPool, which fails
+        # every job still queued on that pool) or the job couldn't be sent to
+        # one. Without this its .pending would count against max_queue until
+        # the TTL and it would never fail.
+        if future.cancelled() or future.exception() is None:
+            return
+        if isinstance(future.exception(), BrokenProcessPool) and self._pool is pool:
+            self._pool = None
+        _fail_job(os.path.join(self.job_dir, job_id), future.exception())
+
+    def _path(self, job_id, suffix):
+        if not _JOB_ID.fullmatch(job_id or ""):
+            return None
+        return os.path.join(self.job_dir, job_id + suffix)
+
+    def status(self, job_id):
+        """'done', 'failed' (with message), 'pending', or None for unknown/expired jobs."""
+        path = self._path(job_id, self.suffix)
+        if path is None:
+            return None
+        if os.path.exists(path):
+            status = {"status": "done"}
+        elif os.path.exists(self._path(job_id, ".error")):
+            with open(self._path(job_id, ".error"), encoding="utf-8") as f:
+                status = {"status": "failed", "error": f.read()}
+        elif os.path.exists(self._path(job_id, ".pending")):
+            status = {"status": "pending"}
+        else:
+            return None
+        try:
+            with open(self._path(job_id, ".progress"), encoding="utf-8") as f:
+                status["progress"] = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return status
+
+    def artifact(self, job_id):
+        path = self._path(job_id, self.suffix)
+        return path if path and os.path.exists(path) else None
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        for path in glob.glob(os.path.join(self.job_dir, "*")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"depth": self.depth(), "max_queue": self.max_queue, "workers": self.max_workers}
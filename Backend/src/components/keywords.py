@@ -0,0 +1,80 @@
+import re
+
+
+def _trie_pattern(words):
+    # Nest the keywords into a prefix trie so the regex engine walks one
+    # branch per character instead of retrying every keyword at every offset.
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def render(node):
+        branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # Greedy optional: prefer the longer keyword, fall back to this one
+            body = "(?:" + body + ")?"
+        return body
+
+    return render(trie)
+
+
+class KeywordIndex:
+    """Finds every keyword of a fixed vocabulary that occurs in a text, in one scan.
+
+    Keywords are matched as plain substrings (overlapping ones included), which is
+    exactly the condition under which an un-anchored pattern containing the
+    keyword can match at all.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(dict.fromkeys(kw for kw in keywords if kw))
+        self._regex = re.compile("(?=(" + _trie_pattern(self.keywords) + "))") if self.keywords else None
+        # The scan reports the longest keyword starting at each offset; every
+        # keyword contained in it occurs in the text as well.
+        self._contained = {
+            kw: [other for other in self.keywords if other in kw]
+            for kw in self.keywords
+        }
+
+    def state(self):
+        """Plain-data form of the index (keywords, trie regex source, containment map)."""
+        return {
+            "keywords": self.keywords,
+            "pattern": self._regex.pattern if self._regex else None,
+            "contained": self._contained,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls.__new__(cls)
+        index.keywords = state["keywords"]
+        index._regex = re.compile(state["pattern"]) if state["pattern"] else None
+        index._contained = state["contained"]
+        return index
+
+    def find(self, text):
+        return set(self.locate(text))
+
+    def locate(self, text):
+        """Map each keyword found to the offsets where an occurrence (or a longer keyword containing it) starts."""
+        found = {}
+        if self._regex is None:
+            return found
+        for match in self._regex.finditer(text):
+            for kw in self._contained[match.group(1)]:
+                found.setdefault(kw, []).append(match.start())
+        return found
+
+
+def compile_keyword_patterns(keywords, templates):
+    """Compile each ``{kw}`` template once per keyword, preserving keyword order."""
+    return {
+        kw: [re.compile(template.replace("{kw}", re.escape(kw))) for template in templates]
+        for kw in keywords
+    }
@@ -0,0 +1,22 @@
+import json
+import logging
+import os
+import random
+
+logger = logging.getLogger("carbon")
+
+# Fraction of per-request events that are logged; 1 logs every event
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.01))
+
+
+def log_event(event, level=logging.INFO, sampled=True, **fields):
+    """Log ``event`` with ``fields`` as one JSON line.
+
+    Sampled events (the default) are kept with probability LOG_SAMPLE_RATE, so
+    hot paths can log per request without paying for it on every call.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sampled and random.random() >= LOG_SAMPLE_RATE:
+        return
+    logger.log(level, json.dumps({"event": event, **fields}, default=str, ensure_ascii=False))
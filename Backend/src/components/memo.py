@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .logs import log_event
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memo (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS memo_used ON memo (used);
+"""
+
+# SQLite's default limit on host parameters is 999
+_CHUNK = 500
+
+
+class ClauseMemo:
+    """JSON values by string key in a SQLite file shared by every worker process, LRU-bounded.
+
+    Lookups are read-only unless an entry's last-use time is more than
+    ``touch_interval`` seconds old, so hot entries don't turn every read into
+    a write. After every ``check_every`` inserts (per process) the table is
+    trimmed back to ``maxsize`` rows, least recently used first. Errors from
+    SQLite (a locked or unwritable file) are logged and treated as misses:
+    the memo only ever saves work.
+    """
+
+    def __init__(self, path, maxsize=100000, touch_interval=60.0, check_every=1000, timeout=1.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.touch_interval = touch_interval
+        self.check_every = check_every
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _error(self, operation, error):
+        with self._lock:
+            self.errors += 1
+        log_event("memo_error", level=logging.WARNING, operation=operation, error=str(error))
+
+    def get_many(self, keys):
+        """{key: value} for the ``keys`` that are stored."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        stale = []
+        now = time.time()
+        try:
+            conn = self._connect()
+            for i in range(0, len(keys), _CHUNK):
+                chunk = keys[i:i + _CHUNK]
+                rows = conn.execute(
+                    f"SELECT key, value, used FROM memo WHERE key IN ({', '.join('?' for _ in chunk)})", chunk
+                )
+                for key, value, used in rows:
+                    found[key] = json.loads(value)
+                    if used < now - self.touch_interval:
+                        stale.append(key)
+            if stale:
+                with conn:
+                    conn.executemany("UPDATE memo SET used = ? WHERE key = ?", [(now, key) for key in stale])
+        except sqlite3.Error as e:
+            self._error("get", e)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        """Store {key: value}; values must be JSON-serializable."""
+        if not items:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO memo (key, value, used) VALUES (?, ?, ?)",
+                    [(key, json.dumps(value, separators=(",", ":")), now) for key, value in items.items()]
+                )
+            with self._lock:
+                self._inserts += len(items)
+                check = self._inserts >= self.check_every
+                if check:
+                    self._inserts = 0
+            if check:
+                self.trim()
+        except sqlite3.Error as e:
+            self._error("set", e)
+
+    def trim(self):
+        """Delete least recently used rows beyond ``maxsize``; returns how many."""
+        conn = self._connect()
+        with conn:
+            excess = conn.execute("SELECT COUNT(*) FROM memo").fetchone()[0] - self.maxsize
+            if excess <= 0:
+                return 0
+            conn.execute(
+                "DELETE FROM memo WHERE key IN (SELECT key FROM memo ORDER BY used LIMIT ?)", (excess,)
+            )
+        with self._lock:
+            self.evictions += excess
+        return excess
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM memo")
+
+    def stats(self):
+        """Counters of this process; ``size`` is the shared table."""
+        try:
+            size = self._connect().execute("SELECT COUNT(*) FROM memo").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,231 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from .logs import log_event
+
+# Shared outcome counters, in this order: callers count ok/error/rejected/timeout,
+# workers count the queued tasks they dropped because the caller had given up
+OUTCOMES = ["ok", "error", "rejected", "timeout", "expired"]
+
+
+class NLPPoolError(Exception):
+    pass
+
+
+class NLPOverloaded(NLPPoolError):
+    pass
+
+
+class NLPDeadlineExceeded(NLPPoolError):
+    pass
+
+
+class NLPUnavailable(NLPPoolError):
+    pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _serve(handler, tasks, replies, busy, waited, outcomes):
+    # Runs in an NLP worker process. Ctrl-C reaches the whole process group;
+    # shutdown is the master's call (a None task), not ours.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        slot, task_id, enqueued, deadline, payload = task
+        started = time.monotonic()
+        with waited.get_lock():
+            waited[0] += started - enqueued
+            waited[1] += 1
+        if started >= deadline:
+            # The caller has given up (or is about to); don't spend a worker on it
+            with outcomes.get_lock():
+                outcomes[OUTCOMES.index("expired")] += 1
+            replies[slot].put((task_id, "expired", None))
+            continue
+        with busy.get_lock():
+            busy.value += 1
+        try:
+            reply = (task_id, "ok", handler(payload))
+        except Exception as e:
+            reply = (task_id, "error", str(e) or e.__class__.__name__)
+        finally:
+            with busy.get_lock():
+                busy.value -= 1
+        replies[slot].put(reply)
+
+
+class NLPPool:
+    """Dedicated worker processes for ``handler``, shared by every gunicorn worker.
+
+    start() belongs in the gunicorn master after the app is preloaded: the
+    workers fork from it and share the loaded model copy-on-write, and the
+    gunicorn workers forked later inherit the queues. Submissions go through
+    one queue of ``max_queue`` tasks; when it is full run() raises
+    NLPOverloaded at once. A caller waits at most ``timeout`` seconds (or
+    its own, shorter, deadline) and then gets NLPDeadlineExceeded; a task
+    whose deadline passed while it was queued is dropped by the worker that
+    dequeues it. Replies come back on one of ``clients`` slots, each claimed
+    by one calling thread and reclaimed once its process is gone.
+    """
+
+    def __init__(self, handler, workers=2, max_queue=32, timeout=5.0, clients=64):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.clients = clients
+        context = multiprocessing.get_context("fork")
+        self._context = context
+        self._tasks = context.Queue(max_queue)
+        self._replies = [context.Queue() for _ in range(clients)]
+        self._owners = context.Array("i", clients)
+        # Worker pids, readable from any process (Process objects only work in the master)
+        self._pids = context.Array("i", workers)
+        self._busy = context.Value("i", 0)
+        # Queue wait: total seconds, tasks
+        self._waited = context.Array("d", 2)
+        self._outcomes = context.Array("q", len(OUTCOMES))
+        self._processes = []
+        self._local = threading.local()
+        self._ids = itertools.count()
+        self._stopping = False
+
+    def start(self, supervise=True):
+        for i in range(self.workers):
+            self._spawn(i)
+        if supervise:
+            threading.Thread(target=self._supervise, name="nlp-pool-supervisor", daemon=True).start()
+        log_event("nlp_pool_started", sampled=False, workers=self.workers, max_queue=self.max_queue)
+        return self
+
+    def _spawn(self, i):
+        process = self._context.Process(
+            target=_serve, args=(self.handler, self._tasks, self._replies, self._busy, self._waited, self._outcomes),
+            name=f"nlp-worker-{i}", daemon=True
+        )
+        process.start()
+        self._processes[i:i + 1] = [process]
+        self._pids[i] = process.pid
+
+    def _supervise(self):
+        # Replace workers that died (OOM kill, segfault in a model)
+        while not self._stopping:
+            time.sleep(1.0)
+            for i, process in enumerate(list(self._processes)):
+                if not process.is_alive() and not self._stopping:
+                    process.join()
+                    log_event("nlp_worker_died", level=logging.ERROR, pid=process.pid, exitcode=process.exitcode)
+                    self._spawn(i)
+
+    def stop(self):
+        self._stopping = True
+        for _ in self._processes:
+            try:
+                self._tasks.put_nowait(None)
+            except queue.Full:
+                break
+        for process in self._processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def _record(self, outcome):
+        with self._outcomes.get_lock():
+            self._outcomes[OUTCOMES.index(outcome)] += 1
+
+    def _slot(self):
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) == pid:
+            return self._local.slot
+        with self._owners.get_lock():
+            for slot, owner in enumerate(self._owners):
+                if owner == 0 or not _pid_alive(owner):
+                    self._owners[slot] = pid
+                    break
+            else:
+                raise NLPUnavailable(f"all {self.clients} client slots are taken")
+        # Replies meant for the slot's previous owner
+        try:
+            while True:
+                self._replies[slot].get_nowait()
+        except queue.Empty:
+            pass
+        self._local.pid, self._local.slot = pid, slot
+        return slot
+
+    def release(self):
+        """Give this thread's client slot back (e.g. when a thread pool shuts down)."""
+        if getattr(self._local, "pid", None) == os.getpid():
+            with self._owners.get_lock():
+                self._owners[self._local.slot] = 0
+            self._local.pid = None
+
+    def run(self, payload, timeout=None):
+        """handler(payload) on a pool worker; ``timeout`` can only shorten the pool's."""
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        if not self.alive():
+            self._record("rejected")
+            raise NLPUnavailable("no NLP worker is running")
+        slot = self._slot()
+        task_id = (os.getpid(), next(self._ids))
+        now = time.monotonic()
+        deadline = now + timeout
+        try:
+            self._tasks.put_nowait((slot, task_id, now, deadline, payload))
+        except queue.Full:
+            self._record("rejected")
+            raise NLPOverloaded(f"{self.max_queue} parses already queued")
+
+        replies = self._replies[slot]
+        while True:
+            try:
+                reply_id, status, value = replies.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self._record("timeout")
+                raise NLPDeadlineExceeded(f"no parse within {timeout} s")
+            if reply_id != task_id:
+                continue  # reply to an earlier call of ours that timed out
+            if status == "expired":
+                self._record("timeout")
+                raise NLPDeadlineExceeded(f"queued for longer than {timeout} s")
+            self._record(status)
+            if status == "ok":
+                return value
+            raise RuntimeError(value)
+
+    def alive(self):
+        """How many workers are running."""
+        return sum(1 for pid in self._pids[:] if pid and _pid_alive(pid))
+
+    def stats(self):
+        with self._waited.get_lock():
+            waited, dequeued = self._waited[0], self._waited[1]
+        return {
+            "workers": self.workers,
+            "alive": self.alive(),
+            "depth": self._tasks.qsize(),
+            "max_queue": self.max_queue,
+            "busy": self._busy.value,
+            "timeout": self.timeout,
+            "queue_wait_seconds_total": round(waited, 6),
+            "dequeued": int(dequeued),
+            "outcomes": dict(zip(OUTCOMES, self._outcomes[:])),
+        }
@@ -0,0 +1,249 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .cache import TTLCache
+from .logs import log_event
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    layout TEXT NOT NULL,
+    cohort TEXT NOT NULL,
+    category TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (layout, cohort, category, bucket)
+) WITHOUT ROWID;
+"""
+
+# Workers add their counts to the shared rows; merging is addition
+_UPSERT = """
+INSERT INTO buckets (layout, cohort, category, bucket, count) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (layout, cohort, category, bucket) DO UPDATE SET count = count + excluded.count
+"""
+
+
+class QuantileSketch:
+    """Counts of values in logarithmic buckets, so any two sketches merge by adding counts.
+
+    Bucket 0 holds values up to ``min_value`` (zero included); bucket i holds
+    (min_value * gamma**(i-1), min_value * gamma**i] with gamma = (1+alpha)/(1-alpha),
+    so a quantile read back is within ``alpha`` relative error of a value in
+    the stream. Values above ``max_value`` share the last bucket; NaN and
+    infinities are not counted. The array has a fixed size (about 1150
+    buckets for the defaults), and rank() is an index computation plus a
+    lookup in the cumulative counts.
+    """
+
+    def __init__(self, alpha=0.01, min_value=1e-3, max_value=1e7, counts=None):
+        self.alpha = alpha
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.size = int(math.ceil(math.log(max_value / min_value) / self._log_gamma)) + 1
+        self.counts = np.zeros(self.size, dtype=np.int64) if counts is None else counts
+        self._cumulative = None
+
+    @property
+    def layout(self):
+        """Identifies the bucket boundaries; only sketches with the same layout can merge."""
+        return f"log:{self.alpha!r}:{self.min_value!r}:{self.max_value!r}"
+
+    def bucket(self, value):
+        if value <= self.min_value:
+            return 0
+        return min(self.size - 1, int(math.ceil(math.log(value / self.min_value) / self._log_gamma)))
+
+    def buckets(self, values):
+        values = np.asarray(values, dtype=float)
+        scaled = np.log(np.maximum(values, self.min_value) / self.min_value) / self._log_gamma
+        return np.minimum(self.size - 1, np.ceil(scaled)).astype(np.int64)
+
+    def add(self, value, count=1):
+        if not math.isfinite(value):
+            return
+        self.counts[self.bucket(value)] += count
+        self._cumulative = None
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        self.counts += np.bincount(self.buckets(values[np.isfinite(values)]), minlength=self.size)
+        self._cumulative = None
+
+    def merge(self, other):
+        if other.layout != self.layout:
+            raise ValueError(f"cannot merge a {other.layout} sketch into a {self.layout} one")
+        self.counts += other.counts
+        self._cumulative = None
+        return self
+
+    @property
+    def count(self):
+        return int(self.cumulative[-1])
+
+    @property
+    def cumulative(self):
+        if self._cumulative is None:
+            self._cumulative = np.cumsum(self.counts)
+        return self._cumulative
+
+    def rank(self, value):
+        """Fraction of the values below ``value`` (half of its own bucket counts as below); None if unknown."""
+        cumulative = self.cumulative
+        if not cumulative[-1] or not math.isfinite(value):
+            return None
+        i = self.bucket(value)
+        return (cumulative[i] - self.counts[i] / 2) / cumulative[-1]
+
+    def value_of(self, i):
+        # Midpoint (in relative terms) of bucket i
+        return 0.0 if i == 0 else self.min_value * 2 * self.gamma ** i / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Value below which a fraction ``q`` of the stream lies, or None for an empty sketch."""
+        cumulative = self.cumulative
+        if not cumulative[-1]:
+            return None
+        i = int(np.searchsorted(cumulative, max(q * cumulative[-1], 1), side="left"))
+        return self.value_of(min(i, self.size - 1))
+
+
+class PopulationStore:
+    """QuantileSketch per (cohort, category) in a SQLite file shared by every worker process.
+
+    observe() adds to in-memory counts, which are written out as additive
+    upserts every ``flush_every`` observations or ``refresh_interval``
+    seconds. Readers load a cohort's merged sketches from the file and keep
+    them for ``refresh_interval`` seconds, so queries are answered from
+    memory and see other workers' results with that much delay. Like the
+    clause memo, SQLite errors are logged and counted, never raised: a
+    percentile is a nice-to-have next to the result itself.
+    """
+
+    def __init__(self, path, categories, alpha=0.01, flush_every=100, refresh_interval=30.0,
+                 max_cohorts=256, timeout=1.0):
+        self.path = path
+        self.categories = list(categories)
+        self.alpha = alpha
+        self.flush_every = flush_every
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        # Only used for its bucket boundaries
+        self._shape = QuantileSketch(alpha)
+        self.layout = self._shape.layout
+        self.observed = 0
+        self.flushed = 0
+        self.errors = 0
+        self._pending = {}
+        self._pending_count = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._loaded = TTLCache(maxsize=max_cohorts, ttl=refresh_interval)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _error(self, operation, error):
+        with self._lock:
+            self.errors += 1
+        log_event("population_error", level=logging.WARNING, operation=operation, error=str(error))
+
+    def observe(self, values, cohorts=("all",)):
+        """Count {category: value} once in each of ``cohorts``; unknown categories and non-finite values are ignored."""
+        buckets = [
+            (category, self._shape.bucket(value)) for category, value in values.items()
+            if category in self.categories and math.isfinite(value)
+        ]
+        with self._lock:
+            for cohort in cohorts:
+                for category, bucket in buckets:
+                    key = (cohort, category, bucket)
+                    self._pending[key] = self._pending.get(key, 0) + 1
+            self.observed += 1
+            self._pending_count += 1
+            due = (self._pending_count >= self.flush_every
+                   or time.monotonic() - self._flushed_at >= self.refresh_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the pending counts to the shared file; returns how many observations that was."""
+        with self._lock:
+            pending, count = self._pending, self._pending_count
+            self._pending, self._pending_count = {}, 0
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            with self._connect() as conn:
+                conn.executemany(_UPSERT, [(self.layout, *key, n) for key, n in pending.items()])
+        except sqlite3.Error as e:
+            # Dropped rather than retried, so a broken file can't grow memory
+            self._error("flush", e)
+            return 0
+        with self._lock:
+            self.flushed += count
+        return count
+
+    def sketches(self, cohort):
+        """{category: QuantileSketch} of ``cohort`` as of at most ``refresh_interval`` seconds ago."""
+        loaded = self._loaded.get(cohort)
+        if loaded is not None:
+            return loaded
+        self.flush()
+        loaded = {category: QuantileSketch(self.alpha) for category in self.categories}
+        try:
+            rows = self._connect().execute(
+                "SELECT category, bucket, count FROM buckets WHERE layout = ? AND cohort = ?", (self.layout, cohort)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self._error("load", e)
+            rows = []
+        for category, bucket, count in rows:
+            if category in loaded and 0 <= bucket < loaded[category].size:
+                loaded[category].counts[bucket] = count
+        self._loaded.set(cohort, loaded)
+        return loaded
+
+    def percentile(self, cohort, category, value):
+        """(percent of the cohort's values below ``value``, cohort size); percent is None when empty."""
+        sketch = self.sketches(cohort)[category]
+        rank = sketch.rank(value)
+        return (None if rank is None else round(float(rank) * 100, 1)), sketch.count
+
+    def quantiles(self, cohort, category, qs=(0.1, 0.25, 0.5, 0.75, 0.9)):
+        sketch = self.sketches(cohort)[category]
+        return {f"p{round(q * 100):g}": _round(sketch.quantile(q)) for q in qs}, sketch.count
+
+    def stats(self):
+        with self._lock:
+            return {
+                "observed": self.observed,
+                "flushed": self.flushed,
+                "pending": self._pending_count,
+                "errors": self.errors,
+                "cohorts_loaded": len(self._loaded),
+                "alpha": self.alpha,
+            }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
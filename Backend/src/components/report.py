@@ -0,0 +1,336 @@
+import os
+import re
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.shared import Inches
+from matplotlib.figure import Figure
+
+BADGE_NAMES = [
+    "Low Carbon Hero",
+    "Below Global Average",
+    "Plastic Reducer",
+    "Eco Commuter",
+    "Green Eater",
+    "Energy Saver",
+    "Minimal Shopper",
+    "Water Wise",
+    "Lower Than Most",
+]
+
+GLOBAL_AVG_ANNUAL_KG = 4.8 * 1000
+GLOBAL_AVG_DAILY_KG = GLOBAL_AVG_ANNUAL_KG / 365
+
+CHART_SIZE = (6.4, 4.8)  # inches, at 100 dpi
+BADGE_MAX_PX = 160
+
+_PARAGRAPH = re.compile(r"<w:p(?: [^>]*)?>.*?</w:p>", re.S)
+_CONDITION = re.compile(r"\[\[if:([^\]]+)\]\]")
+_PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+
+# Label and result field of each slice of the breakdown chart
+CHART_CATEGORIES = [
+    ('Transport', 'transport_total'),
+    ('Electricity', 'electricity_kwh'),
+    ('Food', 'food_total'),
+    ('Shopping', 'shopping_spend'),
+    ('Plastic', 'plastic_kg'),
+    ('Flight', 'flight_km'),
+]
+
+
+def render_chart_png(result):
+    """Pie chart of the non-zero categories as PNG bytes, or None when there is nothing to plot."""
+    # Remove zero values to keep chart clean
+    chart_data = [(label, result.get(field, 0)) for label, field in CHART_CATEGORIES if result.get(field, 0) > 0]
+    if not chart_data:
+        return None
+    chart_labels, chart_values = zip(*chart_data)
+
+    # A bare Figure skips pyplot's global state and its extra draw on savefig
+    fig = Figure(figsize=CHART_SIZE)
+    ax = fig.subplots()
+    ax.pie(chart_values, labels=chart_labels, autopct='%1.1f%%', startangle=140)
+    ax.axis('equal')
+    chart_buf = BytesIO()
+    fig.savefig(chart_buf, format='png')
+    return chart_buf.getvalue()
+
+
+def _shrink_png(data, max_px=BADGE_MAX_PX):
+    # Badges are shown 0.4" wide; the source PNGs are up to 800px and would
+    # make every report several MB
+    from PIL import Image
+
+    image = Image.open(BytesIO(data))
+    if max(image.size) <= max_px:
+        return data
+    image.thumbnail((max_px, max_px))
+    buf = BytesIO()
+    image.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def _blank_png(size):
+    buf = BytesIO()
+    Figure(figsize=size).savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def report_fields(result):
+    """(placeholder values, enabled [[if:...]] conditions) of a result, shared by the DOCX and HTML reports."""
+    total_emission_daily = result['total_emission']
+    values = {
+        'total_emission': result['total_emission'],
+        'transport_total': result['transport_total'],
+        'electricity_kwh': result['electricity_kwh'],
+        'food_total': result['food_total'],
+        'shopping_spend': result['shopping_spend'],
+        'flight_km': result.get('flight_km', 0),
+        'water_liters': result['water_liters'],
+        'plastic_kg': result['plastic_kg'],
+        'trees_required': result['trees_required'],
+        'daily': f"{total_emission_daily:.2f}",
+        'percent': f"{abs(total_emission_daily - GLOBAL_AVG_DAILY_KG) / GLOBAL_AVG_DAILY_KG * 100:.1f}",
+    }
+    population = result.get('population')
+    if population:
+        values.update({
+            'population_percentile': f"{population['percentiles']['total']:.0f}",
+            'population_count': population['count'],
+            'population_name': "all users" if population['cohort'] == "all" else f"users in {population['cohort']}",
+            'population_median': f"{population['median_total']:.2f}",
+        })
+
+    badges = result.get('badges') or []
+    values['other_badges'] = ", ".join(badge for badge in badges if badge not in BADGE_NAMES)
+    enabled = {f"badge:{badge}" for badge in badges}
+    enabled.update(name for name, on in [
+        ('flight', result.get('flight_km', 0) > 0),
+        ('no_badges', not badges),
+        ('other_badges', bool(values['other_badges'])),
+        ('population', bool(population)),
+        ('above_average', not population and total_emission_daily > GLOBAL_AVG_DAILY_KG),
+        ('below_average', not population and total_emission_daily < GLOBAL_AVG_DAILY_KG),
+        ('at_average', not population and total_emission_daily == GLOBAL_AVG_DAILY_KG),
+    ] if on)
+    return values, enabled
+
+
+def build_report_template(badge_images, chart_placeholder):
+    """The report as a DOCX with {{placeholders}}; paragraphs tagged [[if:name]] are optional."""
+    doc = Document()
+    doc.add_heading('🌱 Carbon Footprint Report', 0)
+
+    # Summary
+    doc.add_paragraph().add_run("Total Emissions: ").bold = True
+    doc.add_paragraph("{{total_emission}} kg CO₂", style='Intense Quote')
+
+    doc.add_paragraph().add_run("📊 Emission Breakdown:").bold = True
+    doc.add_paragraph("• Transport: {{transport_total}} kg CO₂")
+    doc.add_paragraph("• Electricity: {{electricity_kwh}} kg CO₂")
+    doc.add_paragraph("• Food: {{food_total}} kg CO₂")
+    doc.add_paragraph("• Shopping: {{shopping_spend}} kg CO₂")
+    doc.add_paragraph("[[if:flight]]• Flight: {{flight_km}} kg CO₂")
+    doc.add_paragraph("• Water: {{water_liters}} liters")
+    doc.add_paragraph("• Plastic: {{plastic_kg}} kg")
+
+    doc.add_paragraph().add_run("🌳 Trees Required to Offset: ").bold = True
+    doc.add_paragraph("{{trees_required}} trees")
+
+    doc.add_paragraph().add_run("🏅 Badges Earned: ").bold = True
+    for badge in BADGE_NAMES:
+        p = doc.add_paragraph()
+        if badge in badge_images:
+            run = p.add_run(f"[[if:badge:{badge}]]")
+            run.add_picture(BytesIO(badge_images[badge]), width=Inches(0.4))
+            run.add_text(f"  {badge}")
+        else:
+            p.add_run(f"[[if:badge:{badge}]]• {badge}")
+    # Badges added in rules.json after this list was written
+    doc.add_paragraph("[[if:other_badges]]• {{other_badges}}")
+    doc.add_paragraph("[[if:no_badges]]• No badges earned yet!", style='List Bullet')
+
+    doc.add_paragraph().add_run("🌍 How You Compare: ").bold = True
+    doc.add_paragraph(
+        "[[if:population]]Your daily carbon footprint of {{daily}} kg CO₂ is higher than about "
+        "{{population_percentile}}% of the {{population_count}} footprints calculated by {{population_name}}; "
+        "half of them are below {{population_median}} kg CO₂."
+    )
+    # Without enough results to compare against, the global average is the yardstick
+    doc.add_paragraph(
+        "[[if:above_average]]Your daily carbon footprint is {{daily}} kg CO₂, "
+        "which is about {{percent}}% higher than the global average daily footprint "
+        "of 13.15 kg CO₂ (4.8 tons per year)."
+    )
+    doc.add_paragraph(
+        "[[if:below_average]]Great job! Your daily carbon footprint is {{daily}} kg CO₂, "
+        "which is about {{percent}}% lower than the global average daily footprint "
+        "of 13.15 kg CO₂ (4.8 tons per year)."
+    )
+    doc.add_paragraph(
+        "[[if:at_average]]Your daily carbon footprint matches the global average daily footprint "
+        "of 13.15 kg CO₂ (4.8 tons per year)."
+    )
+
+    # Visual breakdown on its own page
+    doc.add_paragraph().add_run("[[if:chart]]").add_break(WD_BREAK.PAGE)
+    doc.add_heading('[[if:chart]]📈 Visual Breakdown', level=1)
+    doc.add_paragraph().add_run("[[if:chart]]").add_picture(BytesIO(chart_placeholder), width=Inches(5.5))
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class ReportRenderer:
+    """Renders carbon reports by filling an in-memory DOCX template.
+
+    Badge images and the template are loaded once. Per request the document
+    body is assembled from precomputed paragraph segments, placeholders are
+    substituted and the chart image part is swapped in; python-docx is not
+    involved after startup.
+    """
+
+    def __init__(self, badge_dir):
+        self.badge_images = {}
+        for badge in BADGE_NAMES:
+            path = os.path.join(badge_dir, f"{badge}.png")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+                # Unreadable images fall back to a text bullet
+                if data.startswith(b"\x89PNG"):
+                    self.badge_images[badge] = _shrink_png(data)
+
+        placeholder = _blank_png(CHART_SIZE)
+        template = build_report_template(self.badge_images, placeholder)
+
+        parts = []
+        self.chart_part = None
+        with zipfile.ZipFile(BytesIO(template)) as archive:
+            for info in archive.infolist():
+                data = archive.read(info)
+                if info.filename.startswith("word/media/") and data == placeholder:
+                    self.chart_part = info.filename
+                parts.append((info.filename, data))
+
+        self.chart_placeholder = placeholder
+        self.segments = self._split_segments(dict(parts)["word/document.xml"].decode("utf-8"))
+
+        # Everything except the body and the chart is identical in every report,
+        # so it is compressed once; render() appends the two variable parts.
+        base = BytesIO()
+        with zipfile.ZipFile(base, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in parts:
+                if name not in ("word/document.xml", self.chart_part):
+                    archive.writestr(name, data, compress_type=self._compression(name))
+        self.base_archive = base.getvalue()
+
+    @staticmethod
+    def _split_segments(xml):
+        # (condition, xml) pairs; condition None means always included
+        segments = []
+        cursor = 0
+        for match in _PARAGRAPH.finditer(xml):
+            segments.append((None, xml[cursor:match.start()]))
+            paragraph = match.group(0)
+            condition = _CONDITION.search(paragraph)
+            if condition:
+                segments.append((condition.group(1), _CONDITION.sub("", paragraph)))
+            else:
+                segments.append((None, paragraph))
+            cursor = match.end()
+        segments.append((None, xml[cursor:]))
+        return segments
+
+    def render(self, result):
+        """DOCX bytes for a calculate_carbon result."""
+        values, enabled = report_fields(result)
+        chart = render_chart_png(result)
+        if chart is not None:
+            enabled.add('chart')
+
+        body = "".join(xml for condition, xml in self.segments if condition is None or condition in enabled)
+        body = _PLACEHOLDER.sub(lambda m: escape(str(values[m.group(1)])), body)
+
+        buffer = BytesIO(self.base_archive)
+        buffer.seek(0, os.SEEK_END)
+        with zipfile.ZipFile(buffer, "a", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("word/document.xml", body.encode("utf-8"))
+            if self.chart_part:
+                archive.writestr(self.chart_part, chart or self.chart_placeholder,
+                                 compress_type=zipfile.ZIP_STORED)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _compression(name):
+        # PNG/JPEG media is already compressed
+        return zipfile.ZIP_STORED if name.startswith(("word/media/", "docProps/thumbnail")) else zipfile.ZIP_DEFLATED
+
+
+# The HTML report: the DOCX report's content, one [[if:...]]-able line at a
+# time, with a CSS bar chart instead of the matplotlib pie
+_HTML_LINES = [
+    '<!DOCTYPE html>',
+    '<html lang="en"><head><meta charset="utf-8"><title>Carbon Footprint Report</title>',
+    '<style>body{font-family:sans-serif;max-width:40em;margin:2em auto}td{padding:2px 8px}'
+    '.bar{background:#4a8;height:1em}</style></head><body>',
+    '<h1>🌱 Carbon Footprint Report</h1>',
+    '<p><b>Total Emissions:</b> {{total_emission}} kg CO₂</p>',
+    '<p><b>📊 Emission Breakdown:</b></p><ul>',
+    '<li>Transport: {{transport_total}} kg CO₂</li>',
+    '<li>Electricity: {{electricity_kwh}} kg CO₂</li>',
+    '<li>Food: {{food_total}} kg CO₂</li>',
+    '<li>Shopping: {{shopping_spend}} kg CO₂</li>',
+    '[[if:flight]]<li>Flight: {{flight_km}} kg CO₂</li>',
+    '<li>Water: {{water_liters}} liters</li>',
+    '<li>Plastic: {{plastic_kg}} kg</li>',
+    '</ul>',
+    '<p><b>🌳 Trees Required to Offset:</b> {{trees_required}} trees</p>',
+    '<p><b>🏅 Badges Earned:</b></p><ul>',
+    *(f'[[if:badge:{badge}]]<li>{escape(badge)}</li>' for badge in BADGE_NAMES),
+    '[[if:other_badges]]<li>{{other_badges}}</li>',
+    '[[if:no_badges]]<li>No badges earned yet!</li>',
+    '</ul>',
+    '<p><b>🌍 How You Compare:</b></p>',
+    '[[if:population]]<p>Your daily carbon footprint of {{daily}} kg CO₂ is higher than about '
+    '{{population_percentile}}% of the {{population_count}} footprints calculated by {{population_name}}; '
+    'half of them are below {{population_median}} kg CO₂.</p>',
+    '[[if:above_average]]<p>Your daily carbon footprint is {{daily}} kg CO₂, which is about {{percent}}% higher '
+    'than the global average daily footprint of 13.15 kg CO₂ (4.8 tons per year).</p>',
+    '[[if:below_average]]<p>Great job! Your daily carbon footprint is {{daily}} kg CO₂, which is about {{percent}}% '
+    'lower than the global average daily footprint of 13.15 kg CO₂ (4.8 tons per year).</p>',
+    '[[if:at_average]]<p>Your daily carbon footprint matches the global average daily footprint '
+    'of 13.15 kg CO₂ (4.8 tons per year).</p>',
+    '[[if:chart]]<h2>📈 Visual Breakdown</h2><table>',
+    *(f'[[if:chart:{field}]]<tr><td>{label}</td><td style="width:20em"><div class="bar" '
+      f'style="width:{{{{share:{field}}}}}%"></div></td><td>{{{{share:{field}}}}}%</td></tr>'
+      for label, field in CHART_CATEGORIES),
+    '[[if:chart]]</table>',
+    '</body></html>',
+]
+_HTML_SEGMENTS = [
+    (match.group(1), line[match.end():]) if match else (None, line)
+    for line, match in ((line, _CONDITION.match(line)) for line in _HTML_LINES)
+]
+_HTML_PLACEHOLDER = re.compile(r"\{\{([\w:]+)\}\}")
+
+
+def render_html(result):
+    """A self-contained HTML page for a calculate_carbon result; no images, so no matplotlib."""
+    values, enabled = report_fields(result)
+    slices = {field: result.get(field, 0) for _, field in CHART_CATEGORIES if result.get(field, 0) > 0}
+    total = sum(slices.values())
+    for field, value in slices.items():
+        values[f"share:{field}"] = f"{value / total * 100:.1f}"
+        enabled.add(f"chart:{field}")
+    if slices:
+        enabled.add('chart')
+
+    page = "\n".join(line for condition, line in _HTML_SEGMENTS if condition is None or condition in enabled)
+    return _HTML_PLACEHOLDER.sub(lambda m: escape(str(values[m.group(1)]), {'"': "&quot;"}), page).encode("utf-8")
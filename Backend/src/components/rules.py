@@ -0,0 +1,192 @@
+import hashlib
+import json
+import numbers
+import operator
+import string
+
+import numpy as np
+
+from .streaming import CATEGORY_FIELDS
+
+# Result field each rule category is compared on
+RULE_FIELDS = {**CATEGORY_FIELDS, "total": "total_emission"}
+OPERATORS = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}
+SCALAR_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+class RuleFileError(ValueError):
+    pass
+
+
+def _check_rule(where, rule, kind):
+    if not isinstance(rule, dict):
+        raise RuleFileError(f"{where} must be an object")
+    if rule.get("category") not in RULE_FIELDS:
+        raise RuleFileError(f"{where}.category must be one of {list(RULE_FIELDS)}, got {rule.get('category')!r}")
+    if rule.get("op") not in OPERATORS:
+        raise RuleFileError(f"{where}.op must be one of {list(OPERATORS)}, got {rule.get('op')!r}")
+    threshold = rule.get("threshold")
+    if isinstance(threshold, bool) or not isinstance(threshold, numbers.Real):
+        raise RuleFileError(f"{where}.threshold must be a number, got {threshold!r}")
+    if kind == "tips":
+        messages = rule.get("messages")
+        if not isinstance(messages, list) or not messages or not all(isinstance(m, str) for m in messages):
+            raise RuleFileError(f"{where}.messages must be a non-empty list of strings")
+        for message in messages:
+            try:
+                fields = {name for _, name, _, _ in string.Formatter().parse(message) if name is not None}
+            except ValueError as e:
+                raise RuleFileError(f"{where}: bad message template {message!r}: {e}")
+            if fields - {"value"}:
+                raise RuleFileError(f"{where}: messages can only use {{value}}, got {sorted(fields - {'value'})}")
+    elif not isinstance(rule.get("badge"), str) or not rule["badge"].strip():
+        raise RuleFileError(f"{where}.badge must be a non-empty string")
+
+
+def validate(data):
+    """Raise RuleFileError unless ``data`` has the shape of rules.json."""
+    if not isinstance(data, dict):
+        raise RuleFileError("rule file must be a JSON object")
+    if not isinstance(data.get("version"), (str, int)) or isinstance(data.get("version"), bool) \
+            or not str(data["version"]).strip():
+        raise RuleFileError("rule file needs a non-empty \"version\"")
+    for kind in ["tips", "badges"]:
+        if not isinstance(data.get(kind), list):
+            raise RuleFileError(f"\"{kind}\" must be a list of rules")
+        for i, rule in enumerate(data[kind]):
+            _check_rule(f"{kind}[{i}]", rule, kind)
+
+
+class RuleSet:
+    """Tip and badge rules of one rules.json, compiled into a threshold table.
+
+    Every rule compares one result field with a threshold. Tip rules of a
+    category are tiers: only the first one that matches (in file order)
+    adds its messages, like an if/elif chain. Badge rules are independent.
+    The table is a (field, operator, threshold) column per rule, so a batch
+    of results is evaluated with one comparison over an (n, rules) matrix;
+    apply() walks the same table for a single result.
+    """
+
+    def __init__(self, data, digest):
+        self.version = str(data["version"])
+        self.digest = digest
+        self.source = data
+        rules = [("tip", rule) for rule in data["tips"]] + [("badge", rule) for rule in data["badges"]]
+        self.fields = list(dict.fromkeys(RULE_FIELDS[rule["category"]] for _, rule in rules))
+        self.field_index = np.array([self.fields.index(RULE_FIELDS[rule["category"]]) for _, rule in rules], dtype=np.int64)
+        self.thresholds = np.array([float(rule["threshold"]) for _, rule in rules])
+        self.op_masks = {op: np.array([rule["op"] == op for _, rule in rules], dtype=bool) for op in OPERATORS}
+        # shadows[j, r]: tip rule j comes before tip rule r of the same category, so a match of j rules r out
+        categories = [rule["category"] if kind == "tip" else None for kind, rule in rules]
+        self.shadows = np.array([
+            [categories[j] is not None and categories[j] == categories[r] and j < r for r in range(len(rules))]
+            for j in range(len(rules))
+        ], dtype=np.int64).reshape(len(rules), len(rules))
+        # Tips: (messages, (position, template) of those with placeholders); the others are used as they are
+        outputs = [
+            (tuple(rule["messages"]), tuple((i, _template(m)) for i, m in enumerate(rule["messages"]) if "{" in m or "}" in m))
+            if kind == "tip" else rule["badge"]
+            for kind, rule in rules
+        ]
+        # The same table as plain tuples, for the per-result path
+        self.rules = [
+            (kind == "tip", RULE_FIELDS[rule["category"]], SCALAR_OPERATORS[rule["op"]], float(rule["threshold"]),
+             rule["category"] if kind == "tip" else None, output)
+            for (kind, rule), output in zip(rules, outputs)
+        ]
+
+    def apply(self, result):
+        """(tips, badges) of one calculate_carbon result."""
+        tips, badges = [], []
+        done = set()
+        for is_tip, field, op, threshold, category, output in self.rules:
+            if category in done:
+                continue
+            value = result.get(field, 0)
+            if op(value, threshold):
+                if is_tip:
+                    done.add(category)
+                    _extend(tips, output, value)
+                else:
+                    badges.append(output)
+        return tips, badges
+
+    def matches(self, columns):
+        """Bool matrix (n, rules) of the rules that fire for each row of ``columns`` (field -> array)."""
+        values = np.column_stack([np.asarray(columns[field], dtype=float) for field in self.fields])
+        values = values[:, self.field_index]
+        hits = np.zeros(values.shape, dtype=bool)
+        for op, mask in self.op_masks.items():
+            if mask.any():
+                hits |= mask & OPERATORS[op](values, self.thresholds)
+        return hits & ((hits.astype(np.int64) @ self.shadows) == 0)
+
+    def apply_many(self, columns):
+        """[(tips, badges)] for every row of ``columns``, a mapping of result field -> array."""
+        hits = self.matches(columns)
+        out = [([], []) for _ in range(len(hits))]
+        values = {field: np.asarray(columns[field]).tolist() for field in self.fields}
+        # Row-major, so each row's rules come out in file order
+        for i, r in zip(*(index.tolist() for index in np.nonzero(hits))):
+            is_tip, field, _, _, _, output = self.rules[r]
+            tips, badges = out[i]
+            if is_tip:
+                _extend(tips, output, values[field][i])
+            else:
+                badges.append(output)
+        return out
+
+
+def _template(message):
+    # Plain {value} placeholders are filled by joining the pieces around them,
+    # a few times faster than str.format; anything fancier keeps format()
+    pieces = message.split("{value}")
+    if any("{" in piece or "}" in piece for piece in pieces):
+        return message
+    return tuple(pieces)
+
+
+def _extend(tips, output, value):
+    messages, templated = output
+    start = len(tips)
+    tips.extend(messages)
+    for i, template in templated:
+        tips[start + i] = str(value).join(template) if type(template) is tuple else template.format(value=value)
+
+
+def result_columns(results, fields):
+    """calculate_carbon results (dicts) as field -> float array, missing fields as 0."""
+    return {field: np.array([result.get(field, 0) for result in results], dtype=float) for field in fields}
+
+
+def load_rules(path):
+    """Read, validate and compile the rule file at ``path``."""
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        data = json.loads(content.decode("utf-8"))
+    except ValueError as e:
+        raise RuleFileError(f"{path} is not valid JSON: {e}")
+    validate(data)
+    return RuleSet(data, hashlib.sha256(content).hexdigest())
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check a tips/badges rule file before deploying it.")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+    try:
+        rules = load_rules(args.path)
+    except (OSError, RuleFileError) as e:
+        print(f"invalid: {e}")
+        return 1
+    print(f"version {rules.version} ({rules.digest[:12]}): "
+          f"{len(rules.source['tips'])} tip rules, {len(rules.source['badges'])} badge rules")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import pickle
+
+import spacy
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Doc
+
+from .keywords import KeywordIndex
+
+# Bump when the layout of the snapshot dict changes
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_key(aliases_bytes, factor_tables, nlp):
+    """Content hash of everything a snapshot is derived from.
+
+    Tokenization depends on the spaCy and model versions, so both are part of
+    the key alongside aliases.json and the (JSON-serialized) factor tables.
+    """
+    digest = hashlib.sha256()
+    for part in (
+        str(SNAPSHOT_FORMAT),
+        spacy.__version__,
+        f"{nlp.meta.get('name')}-{nlp.meta.get('version')}",
+        factor_tables,
+    ):
+        digest.update(part.encode("utf-8") + b"\0")
+    digest.update(aliases_bytes)
+    return digest.hexdigest()
+
+
+def build_snapshot(nlp, aliases, keywords, key):
+    """Tokenize every alias once and precompute the keyword automaton.
+
+    spaCy has no stable binary form for a PhraseMatcher, so the snapshot keeps
+    the tokenized alias docs (words and spaces) instead; rebuilding docs from
+    them skips the tokenizer, which is most of the cost of a fresh build.
+    """
+    categories = {}
+    for category, mapping in aliases.items():
+        categories[category] = [
+            (standard, [[(token.text, bool(token.whitespace_)) for token in nlp.make_doc(alias)]
+                        for alias in variants])
+            for standard, variants in mapping.items()
+        ]
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "key": key,
+        "aliases": aliases,
+        "categories": categories,
+        "keywords": KeywordIndex(keywords).state(),
+    }
+
+
+def load_snapshot(path, key):
+    """The snapshot at ``path`` if it was built for ``key``, else None."""
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT or snapshot.get("key") != key:
+        return None
+    return snapshot
+
+
+def save_snapshot(path, snapshot):
+    """Write atomically; returns False when the location is not writable."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        return True
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def build_matchers(nlp, snapshot):
+    """Phrase matchers, one per category, from a snapshot's tokenized aliases."""
+    matchers = {}
+    for category, labels in snapshot["categories"].items():
+        matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+        for standard, variants in labels:
+            docs = [
+                Doc(nlp.vocab, words=[word for word, _ in tokens], spaces=[space for _, space in tokens])
+                for tokens in variants
+            ]
+            matcher.add(standard, docs)
+        matchers[category] = matcher
+    return matchers
+
+
+def _verify(app):
+    # Matchers rebuilt from the on-disk snapshot must agree with ones built
+    # straight from aliases.json on every alias and on the benchmark corpus
+    import json
+
+    with open(app.file_path, "rb") as f:
+        content = f.read()
+    aliases = json.loads(content.decode("utf-8"))
+    key = snapshot_key(content, app.factor_tables_json(), app.nlp)
+    loaded = load_snapshot(app.ALIAS_SNAPSHOT_PATH, key)
+    if loaded is None:
+        print(f"no snapshot for the current tables at {app.ALIAS_SNAPSHOT_PATH}")
+        return 1
+    fresh = build_snapshot(app.nlp, aliases, app.pattern_keywords(), key)
+    fresh_matchers = build_matchers(app.nlp, fresh)
+    loaded_matchers = build_matchers(app.nlp, loaded)
+
+    texts = [alias for mapping in aliases.values() for variants in mapping.values() for alias in variants]
+    try:
+        from benchmarks.corpus import build_corpus
+        texts += build_corpus(500)
+    except ImportError:
+        pass
+
+    fresh_index = KeywordIndex(app.pattern_keywords())
+    loaded_index = KeywordIndex.from_state(loaded["keywords"])
+    mismatches = 0
+    for text in texts:
+        doc = app.nlp.make_doc(text.lower())
+        for category in fresh_matchers:
+            # In order: the alias rewrite replays the matches as they come
+            if fresh_matchers[category](doc) != loaded_matchers[category](doc):
+                mismatches += 1
+                print(f"{category}: matches differ for {text!r}")
+        if fresh_index.find(doc.text) != loaded_index.find(doc.text):
+            mismatches += 1
+            print(f"keywords differ for {text!r}")
+    print(f"{len(texts)} texts checked, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+def main(argv=None):
+    import argparse
+    import importlib
+
+    parser = argparse.ArgumentParser(description="Build or check the precompiled alias/keyword snapshot.")
+    parser.add_argument("command", choices=["build", "verify"])
+    args = parser.parse_args(argv)
+
+    # Importing the app loads (or rebuilds) the snapshot as a side effect
+    os.environ.setdefault("WARMUP", "0")
+    app = importlib.import_module(__package__ + ".app")
+    if args.command == "build":
+        app.load_aliases(force=True)
+        print(f"wrote {app.ALIAS_SNAPSHOT_PATH} ({app.STARTUP['alias_snapshot']})")
+        return 0
+    return _verify(app)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
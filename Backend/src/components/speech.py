@@ -0,0 +1,260 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from io import BytesIO
+
+import numpy as np
+
+
+class SpeechNotUnderstood(Exception):
+    pass
+
+
+class SpeechBackendError(Exception):
+    pass
+
+
+class SpeechOverloaded(Exception):
+    pass
+
+
+class SpeechDeadlineExceeded(Exception):
+    pass
+
+
+class AudioTooLarge(Exception):
+    pass
+
+
+def read_limited(stream, max_bytes, chunk_size=64 * 1024):
+    """Copy ``stream`` into a BytesIO in chunks, failing once it exceeds ``max_bytes``."""
+    buffer = BytesIO()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if buffer.tell() + len(chunk) > max_bytes:
+            raise AudioTooLarge(f"audio is larger than {max_bytes} bytes")
+        buffer.write(chunk)
+    buffer.seek(0)
+    return buffer
+
+
+def load_audio(buffer):
+    """Decode a WAV/AIFF/FLAC file object into speech_recognition AudioData, in memory."""
+    import speech_recognition as sr
+
+    with sr.AudioFile(buffer) as source:
+        return sr.Recognizer().record(source)
+
+
+def split_on_silence(audio, max_segments, min_segment=5.0, min_silence=0.5, threshold=300, window=0.03):
+    """Split AudioData at pauses into at most ``max_segments`` pieces, in order.
+
+    A pause is at least ``min_silence`` seconds of windows whose RMS (as
+    16-bit samples) is below ``threshold``; cuts go in the middle of a pause
+    and no piece is shorter than ``min_segment`` seconds.
+    """
+    import speech_recognition as sr
+
+    raw = audio.get_raw_data()
+    rate, width = audio.sample_rate, audio.sample_width
+    total = len(raw) // width
+    if max_segments <= 1 or total < 2 * min_segment * rate:
+        return [audio]
+
+    samples = np.frombuffer(audio.get_raw_data(convert_width=2), dtype="<i2")
+    size = max(1, int(rate * window))
+    count = len(samples) // size
+    frames = samples[:count * size].reshape(count, size).astype(np.float64)
+    quiet = np.sqrt((frames ** 2).mean(axis=1)) < threshold
+
+    cuts = []
+    last = 0
+    run_start = None
+    min_run = max(1, int(min_silence / window))
+    for i, is_quiet in enumerate(np.append(quiet, False)):
+        if is_quiet and run_start is None:
+            run_start = i
+        elif not is_quiet and run_start is not None:
+            if i - run_start >= min_run:
+                cut = (run_start + i) // 2 * size
+                if cut - last >= min_segment * rate and total - cut >= min_segment * rate:
+                    cuts.append(cut)
+                    last = cut
+                    if len(cuts) == max_segments - 1:
+                        break
+            run_start = None
+
+    bounds = [0] + cuts + [total]
+    return [
+        sr.AudioData(raw[start * width:end * width], rate, width)
+        for start, end in zip(bounds, bounds[1:])
+    ]
+
+
+class GoogleBackend:
+    """The free Google Web Speech API; needs network access."""
+
+    name = "google"
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def transcribe(self, audio):
+        import speech_recognition as sr
+
+        recognizer = sr.Recognizer()
+        # Bounds the HTTP round-trip so a stuck request frees its pool thread
+        recognizer.operation_timeout = self.timeout
+        try:
+            return recognizer.recognize_google(audio)
+        except sr.UnknownValueError:
+            raise SpeechNotUnderstood()
+        except sr.RequestError as e:
+            raise SpeechBackendError(f"Request failed: {e}")
+
+
+class SphinxBackend:
+    """Offline CMU PocketSphinx recognition (pip install pocketsphinx)."""
+
+    name = "sphinx"
+
+    def __init__(self, timeout=None):
+        try:
+            import pocketsphinx  # noqa: F401
+        except ImportError:
+            raise RuntimeError("SPEECH_BACKEND=sphinx needs the pocketsphinx package")
+
+    def transcribe(self, audio):
+        import speech_recognition as sr
+
+        try:
+            return sr.Recognizer().recognize_sphinx(audio)
+        except sr.UnknownValueError:
+            raise SpeechNotUnderstood()
+        except sr.RequestError as e:
+            raise SpeechBackendError(f"Sphinx failed: {e}")
+
+
+class StubBackend:
+    """Deterministic stand-in for tests and air-gapped environments.
+
+    Returns SPEECH_STUB_TEXT for any audio that is not silent, and raises
+    SpeechNotUnderstood for silence. "{digest}" in the text is replaced with a
+    hash of the audio, so callers can tell which audio a transcript came from.
+    SPEECH_STUB_DELAY (seconds) simulates a slow recognizer.
+    """
+
+    name = "stub"
+
+    def __init__(self, timeout=None, text=None, delay=None):
+        self.text = text if text is not None else os.environ.get("SPEECH_STUB_TEXT", "took the metro 10 km")
+        self.delay = delay if delay is not None else float(os.environ.get("SPEECH_STUB_DELAY", 0))
+
+    def transcribe(self, audio):
+        if self.delay:
+            time.sleep(self.delay)
+        # AudioData is signed PCM, so digital silence is all zero bytes
+        raw = audio.get_raw_data()
+        if not raw.strip(b"\x00"):
+            raise SpeechNotUnderstood()
+        return self.text.replace("{digest}", hashlib.sha256(raw).hexdigest()[:12])
+
+
+BACKENDS = {backend.name: backend for backend in (GoogleBackend, SphinxBackend, StubBackend)}
+
+
+def make_backend(name, timeout=None):
+    try:
+        return BACKENDS[name](timeout=timeout)
+    except KeyError:
+        raise ValueError(f"Unknown speech backend {name!r}; expected one of {sorted(BACKENDS)}")
+
+
+class SpeechService:
+    """Runs a backend on a bounded thread pool with per-request deadlines.
+
+    At most ``max_workers`` transcriptions run and ``max_queue`` more wait;
+    beyond that transcribe() raises SpeechOverloaded straight away instead of
+    tying up the calling worker. A caller that waits past ``timeout`` gets
+    SpeechDeadlineExceeded; its recognition keeps its slot until it finishes.
+    """
+
+    def __init__(self, backend, max_workers=2, max_queue=4, timeout=15.0):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speech")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.outcomes = {}
+
+    def _record(self, outcome):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def _run(self, audio):
+        try:
+            return self.backend.transcribe(audio)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def transcribe(self, audio):
+        return self.transcribe_segments([audio])
+
+    def transcribe_segments(self, segments):
+        """Transcribe the pieces of one recording in parallel and join them in order.
+
+        Each piece takes a slot; pieces that are not understood (e.g. silence)
+        are left out, and only if none is understood is the whole not understood.
+        """
+        acquired = 0
+        while acquired < len(segments) and self._slots.acquire(blocking=False):
+            acquired += 1
+        if acquired < len(segments):
+            for _ in range(acquired):
+                self._slots.release()
+            self._record("overloaded")
+            raise SpeechOverloaded(f"{self.max_workers + self.max_queue} recognitions already in progress")
+
+        with self._lock:
+            self.in_flight += len(segments)
+        futures = [self._pool.submit(self._run, segment) for segment in segments]
+        deadline = time.monotonic() + self.timeout
+        texts = []
+        try:
+            for future in futures:
+                try:
+                    texts.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+                except SpeechNotUnderstood:
+                    pass
+        except FutureTimeout:
+            self._record("timeout")
+            raise SpeechDeadlineExceeded(f"recognition took longer than {self.timeout} s")
+        except Exception:
+            self._record("error")
+            raise
+        if not texts:
+            self._record("not_understood")
+            raise SpeechNotUnderstood()
+        self._record("ok")
+        return " ".join(texts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "in_flight": self.in_flight,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "timeout": self.timeout,
+                "outcomes": dict(self.outcomes),
+            }
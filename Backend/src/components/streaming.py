@@ -0,0 +1,120 @@
+import json
+import math
+
+from .columnar import PERCENT_CATEGORIES
+
+# calculate_carbon result fields that add up across entries, keyed by the
+# category name used in category_percentages
+CATEGORY_FIELDS = {
+    "transport": "transport_total",
+    "electricity": "electricity_kwh",
+    "food": "food_total",
+    "shopping": "shopping_spend",
+    "flight": "flight_km",
+    "water": "water_liters",
+    "plastic": "plastic_kg",
+}
+
+
+class EntryError(Exception):
+    pass
+
+
+def iter_entries(stream, ndjson=False, max_line_bytes=64 * 1024):
+    """Yield (line_number, user_input or EntryError) from a binary line stream.
+
+    Only one line is held at a time; lines longer than ``max_line_bytes`` are
+    skipped (reported as an error) without being buffered. Blank lines are
+    ignored. NDJSON lines are either a JSON string or {"user_input": ...}.
+    """
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_line_bytes and not line.endswith(b"\n"):
+            # Drain the rest of the oversized line in bounded reads
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(max_line_bytes + 1)
+            yield line_number, EntryError(f"entry longer than {max_line_bytes} bytes")
+            continue
+
+        try:
+            text = line.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            yield line_number, EntryError("entry is not valid UTF-8")
+            continue
+        if not text:
+            continue
+        if not ndjson:
+            yield line_number, text
+            continue
+
+        try:
+            value = json.loads(text)
+        except ValueError:
+            yield line_number, EntryError("invalid JSON")
+            continue
+        if isinstance(value, dict):
+            value = value.get("user_input")
+        if not isinstance(value, str) or not value.strip():
+            yield line_number, EntryError("user_input must be a non-empty string")
+            continue
+        yield line_number, value
+
+
+def batched(entries, max_items, max_chars):
+    """Group (line_number, entry) pairs into lists of at most ``max_items``
+    entries and about ``max_chars`` characters of text.
+
+    spaCy's working memory grows with the text in a batch, so a character
+    budget (and not only a count) is what keeps memory flat when entries are long.
+    """
+    batch = []
+    chars = 0
+    for line_number, entry in entries:
+        batch.append((line_number, entry))
+        if isinstance(entry, str):
+            chars += len(entry)
+        if len(batch) >= max_items or chars >= max_chars:
+            yield batch
+            batch = []
+            chars = 0
+    if batch:
+        yield batch
+
+
+class RunningTotals:
+    """Per-category sums over a stream of calculate_carbon results, in O(1) memory."""
+
+    def __init__(self):
+        self.entries = 0
+        self.errors = 0
+        self.totals = {field: 0.0 for field in CATEGORY_FIELDS.values()}
+        self.factor_versions = set()
+
+    def add(self, result):
+        self.entries += 1
+        if result.get("factor_version"):
+            self.factor_versions.add(result["factor_version"])
+        for field in self.totals:
+            self.totals[field] += result.get(field, 0)
+
+    def add_error(self):
+        self.errors += 1
+
+    def summary(self, tree_factor=0.7):
+        """A calculate_carbon-shaped result for all entries together (without tips/badges)."""
+        result = {field: round(value, 2) for field, value in self.totals.items()}
+        total = math.fsum(self.totals.values())
+        result["total_emission"] = round(total, 2)
+        if total > 0:
+            result["category_percentages"] = {
+                name: round(self.totals[CATEGORY_FIELDS[name]] / total * 100, 1)
+                for name in PERCENT_CATEGORIES
+            }
+        result["trees_required"] = math.ceil(result["total_emission"] / tree_factor)
+        # More than one only if the factors were reloaded while the stream ran
+        result["factor_version"] = ",".join(sorted(self.factor_versions))
+        return result
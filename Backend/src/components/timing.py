@@ -0,0 +1,35 @@
+import time
+from contextlib import contextmanager
+
+# Callbacks receiving (stage, seconds) for every timed section
+_observers = []
+
+
+def add_stage_observer(observer):
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def remove_stage_observer(observer):
+    if observer in _observers:
+        _observers.remove(observer)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block and report it to every observer.
+
+    With no observers registered this only costs the context manager itself.
+    Stages may nest (e.g. "tips_badges" runs inside "calculate"), and a stage
+    entered twice in one parse is reported twice.
+    """
+    if not _observers:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        for observer in list(_observers):
+            observer(name, elapsed)
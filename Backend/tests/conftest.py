@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# Run from anywhere: the app is imported as ``src.components`` from the Backend directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Set before the app is imported: no warmup, and SQLite files of our own
+_DATA_DIR = tempfile.mkdtemp(prefix="carbon-tests-")
+os.environ["WARMUP"] = "0"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+for name in ["CLAUSE_MEMO_DB", "HISTORY_DB", "POPULATION_DB"]:
+    os.environ[name] = os.path.join(_DATA_DIR, name.lower() + ".sqlite3")
+os.environ["ALIAS_SNAPSHOT"] = os.path.join(_DATA_DIR, "aliases.snapshot")
+
+
+def pytest_configure(config):
+    # The model's attribute ruler has no patterns; spaCy warns on every call
+    config.addinivalue_line("filterwarnings", r"ignore:\[W036\]:UserWarning")
@@ -0,0 +1,63 @@
+import re
+
+import pytest
+
+from benchmarks.corpus import ALIAS_OVERLAPS, build_corpus, build_mixed_corpus
+from src.components import app
+
+
+def original_rewrite(doc):
+    # The rewrite apply_phrase_matchers reproduces: one re.sub over the whole
+    # text per matcher hit
+    text = doc.text
+    for matcher in app.TABLES.phrase_matchers.values():
+        for match_id, start, end in matcher(doc):
+            label = app.nlp.vocab.strings[match_id]
+            text = re.sub(rf"\b{re.escape(doc[start:end].text)}\b", label, text, flags=re.IGNORECASE)
+    return text
+
+
+TEXTS = build_corpus(120) + [text for _, text in build_mixed_corpus(10)] + ALIAS_OVERLAPS
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_rewrite_matches_original(text):
+    doc = app.nlp(text.lower())
+    assert app.apply_phrase_matchers(doc)[0] == original_rewrite(doc)
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Later hits rewrite earlier labels again, across the whole text
+    ("electric scooter 5 km. rode my bike 8 km, electric scooter 5 km.",
+     "bicycle 5 km. rode my bicycle 8 km, bicycle 5 km."),
+    ("took electric scooter 5 km, had black tea", "took bike 5 km, had groceries"),
+    ("threw away a soft drink bottle, used 5 g energy drink bottle, drank 5 l 1 litre bottle water, 12 g of coke",
+     "threw away a PET, used 5 g PET, drank 5 l bottled, 12 g of soft drink"),
+])
+def test_rewrite_cascades(text, expected):
+    assert app.apply_phrase_matchers(app.nlp(text))[0] == expected
+
+
+def test_regions_map_to_doc_tokens():
+    doc = app.nlp("took electric scooter 5 km, had black tea")
+    text, regions = app.apply_phrase_matchers(doc)
+    assert [(label, rewritten, doc[start:end].text) for label, rewritten, start, end in regions] == [
+        ("bike", "bike", "electric scooter"), ("groceries", "groceries", "black tea"),
+    ]
+
+
+def test_cross_clause_matching_keeps_whole_text_rewrite(monkeypatch):
+    monkeypatch.setattr(app, "CROSS_CLAUSE_MATCHING", True)
+    monkeypatch.setattr(app, "CLAUSE_MEMO", None)
+    text = "electric scooter 5 km. rode my bike 8 km, electric scooter 5 km."
+    [activity] = app.extract_activities([text])
+    assert activity["transport_data"] == {"bicycle": 18.0}
+
+
+def test_clauses_rewrite_on_their_own(monkeypatch):
+    # The deliberate difference from the whole-text rewrite: a clause's
+    # aliases don't reach into the other clauses
+    monkeypatch.setattr(app, "CLAUSE_MEMO", None)
+    text = "electric scooter 5 km. rode my bike 8 km, electric scooter 5 km."
+    [activity] = app.extract_activities([text])
+    assert activity["transport_data"] == {"bike": 10.0, "bicycle": 8.0}
@@ -0,0 +1,36 @@
+import csv
+import io
+
+import pytest
+
+from src.components import app
+from src.components.bulk import BulkCalculator, BulkFormatError
+
+
+def run_csv(text, chunk_rows=2):
+    bulk = BulkCalculator(app.TABLES.factors, chunk_rows=chunk_rows)
+    schema, chunks = bulk.read_csv(io.StringIO(text))
+    return list(csv.DictReader(io.StringIO("".join(bulk.iter_csv(schema, chunks)))))
+
+
+def test_rows_are_calculated_in_chunks():
+    rows = run_csv("id,transport.car\n" + "".join(f"r{i},{i}\n" for i in range(5)))
+    assert [row["id"] for row in rows] == ["r0", "r1", "r2", "r3", "r4"]
+    assert float(rows[4]["transport_total"]) > float(rows[1]["transport_total"]) > 0
+
+
+def test_blank_lines_do_not_end_the_file():
+    # More consecutive blank lines than a chunk holds, then more data
+    rows = run_csv("id,transport.car\nr1,10\n" + "\n" * 5 + "r2,20\n\n\nr3,30\n")
+    assert [row["id"] for row in rows] == ["r1", "r2", "r3"]
+
+
+def test_short_rows_are_reported_per_row():
+    rows = run_csv("id,transport.car,electricity_kwh\nr1,10,5\nr2,10\n")
+    assert rows[0]["error"] == ""
+    assert rows[1]["error"] == "expected 3 fields, got 2"
+
+
+def test_empty_file_is_rejected():
+    with pytest.raises(BulkFormatError):
+        run_csv("")
@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.corpus import ALIAS_OVERLAPS, build_corpus
+from src.components import app
+
+CORPUS = build_corpus(60) + ALIAS_OVERLAPS
+
+
+@pytest.fixture
+def memo():
+    app.CLAUSE_MEMO.clear()
+    yield app.CLAUSE_MEMO
+    app.CLAUSE_MEMO.clear()
+
+
+def test_clause_memo_matches_plain_pipeline(memo, monkeypatch):
+    cold = [app.parse_input_to_data(text) for text in CORPUS]
+    warm = [app.parse_input_to_data(text) for text in CORPUS]
+    monkeypatch.setattr(app, "CLAUSE_MEMO", None)
+    plain = [app.parse_input_to_data(text) for text in CORPUS]
+    assert cold == plain
+    assert warm == plain
+
+
+def test_batch_matches_single_inputs(memo):
+    single = [app.parse_input_to_data(text) for text in CORPUS]
+    memo.clear()
+    assert app.parse_inputs_batch(CORPUS, batch_size=8) == single
+
+
+def test_aliases_resolve_within_their_clause(monkeypatch):
+    monkeypatch.setattr(app, "CLAUSE_MEMO", None)
+    [activity] = app.extract_activities(["my electric car 40 km, electric scooter 5 km. rode my bike 8 km."])
+    assert activity["transport_data"] == {"car": 40.0, "bike": 5.0, "bicycle": 8.0}
+
+
+def test_clause_texts_split_at_breaks_outside_aliases():
+    assert app.clause_texts("took the metro 10 km.\nate 200 g dahi; bought a phone!") == [
+        "took the metro 10 km.", "ate 200 g dahi;", "bought a phone!",
+    ]
+    # The "." of "volkswagen id.4" does not end the clause
+    assert app.clause_texts("drove my volkswagen id.4 20 km. ate 200 g dahi") == [
+        "drove my volkswagen id.4 20 km.", "ate 200 g dahi",
+    ]
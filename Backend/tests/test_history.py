@@ -0,0 +1,26 @@
+from src.components import app
+
+
+def test_entries_return_numbers_not_raw_input():
+    client = app.app.test_client()
+    response = client.post("/api/calculate", json={
+        "user_input": "my flat at 12 Elm Street, took the metro 10 km", "user_id": "history-test", "date": "2024-03-05"
+    })
+    assert response.status_code == 200
+
+    entries = client.get("/api/history/history-test/entries").get_json()["entries"]
+    assert len(entries) == 1
+    assert entries[0]["id"] == response.get_json()["entry_id"]
+    assert entries[0]["day"] == "2024-03-05"
+    assert entries[0]["total_emission"] > 0
+    assert "user_input" not in entries[0]
+    assert "Elm Street" not in client.get("/api/history/history-test/entries").get_data(as_text=True)
+
+    rollups = client.get("/api/history/history-test/rollups?period=day").get_json()["rollups"]
+    assert [(row["start"], row["entries"]) for row in rollups] == [("2024-03-05", 1)]
+
+
+def test_raw_input_is_not_stored():
+    store = app.get_history_store()
+    columns = [row[1] for row in store._connect().execute("PRAGMA table_info(entries)")]
+    assert "user_input" not in columns
@@ -0,0 +1,144 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from src.components import app
+from src.components.nlp_pool import NLPDeadlineExceeded, NLPOverloaded, NLPPool, NLPUnavailable
+
+
+def handler(payload):
+    # Stand-in for parse_in_pool: {"sleep": seconds, "value": result}
+    time.sleep(payload.get("sleep", 0))
+    if payload.get("fail"):
+        raise ValueError("bad input")
+    return payload.get("value")
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.02)
+
+
+def in_background(function, *args, **kwargs):
+    results = []
+
+    def call():
+        try:
+            results.append(function(*args, **kwargs))
+        except Exception as e:
+            results.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    return thread, results
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(supervise=True, **kwargs):
+        pool = NLPPool(handler, **kwargs).start(supervise=supervise)
+        pools.append(pool)
+        wait_for(lambda: pool.alive() == pool.workers)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.stop()
+
+
+def test_runs_handler_in_a_worker(make_pool):
+    pool = make_pool(workers=1, timeout=5)
+    assert pool.run({"value": 42}) == 42
+    with pytest.raises(RuntimeError, match="bad input"):
+        pool.run({"fail": True})
+    assert pool.stats()["outcomes"]["ok"] == 1
+    assert pool.stats()["outcomes"]["error"] == 1
+
+
+def test_full_queue_is_rejected_at_once(make_pool):
+    pool = make_pool(workers=1, max_queue=1, timeout=5)
+    running = in_background(pool.run, {"sleep": 0.5, "value": "a"})
+    wait_for(lambda: pool.stats()["busy"] == 1)
+    queued = in_background(pool.run, {"value": "b"})
+    wait_for(lambda: pool.stats()["depth"] == 1)
+
+    start = time.monotonic()
+    with pytest.raises(NLPOverloaded):
+        pool.run({"value": "c"})
+    assert time.monotonic() - start < 0.2
+    for thread, results in (running, queued):
+        thread.join(5)
+    assert running[1] == ["a"] and queued[1] == ["b"]
+    assert pool.stats()["outcomes"]["rejected"] == 1
+
+
+def test_deadline_expiry(make_pool):
+    pool = make_pool(workers=1, timeout=5)
+    running = in_background(pool.run, {"sleep": 0.5, "value": "a"})
+    wait_for(lambda: pool.stats()["busy"] == 1)
+    # Waits past its own deadline behind the running task...
+    with pytest.raises(NLPDeadlineExceeded):
+        pool.run({"value": "b"}, timeout=0.1)
+    running[0].join(5)
+    # ...and the worker drops it instead of parsing it for nobody
+    wait_for(lambda: pool.stats()["outcomes"]["expired"] == 1)
+    assert pool.run({"value": "c"}) == "c"
+    assert pool.stats()["outcomes"]["timeout"] == 1
+
+
+def test_dead_worker_is_replaced(make_pool):
+    pool = make_pool(workers=1, timeout=1)
+    pid = pool._pids[0]
+    caller = in_background(pool.run, {"sleep": 5, "value": "lost"})
+    wait_for(lambda: pool.stats()["busy"] == 1)
+    os.kill(pid, signal.SIGKILL)
+    caller[0].join(5)
+    assert isinstance(caller[1][0], NLPDeadlineExceeded)
+
+    wait_for(lambda: pool.alive() == 1 and pool._pids[0] != pid)
+    assert pool.run({"value": "after"}) == "after"
+
+
+def kill_worker(pool):
+    os.kill(pool._pids[0], signal.SIGKILL)
+    # Reaped, as the supervisor would; a zombie still counts as running
+    pool._processes[0].join(5)
+
+
+def test_no_live_worker_is_unavailable(make_pool):
+    pool = make_pool(supervise=False, workers=1, timeout=1)
+    kill_worker(pool)
+    assert pool.alive() == 0
+    with pytest.raises(NLPUnavailable):
+        pool.run({"value": 1})
+    assert pool.stats()["outcomes"]["rejected"] == 1
+
+
+def test_calculate_route_maps_pool_errors(make_pool, monkeypatch):
+    client = app.app.test_client()
+    pool = make_pool(supervise=False, workers=1, max_queue=1, timeout=1)
+    monkeypatch.setattr(app, "nlp_pool", pool)
+
+    # Queue full: 429, retry soon
+    running = in_background(pool.run, {"sleep": 0.5})
+    wait_for(lambda: pool.stats()["busy"] == 1)
+    queued = in_background(pool.run, {"sleep": 0})
+    wait_for(lambda: pool.stats()["depth"] == 1)
+    response = client.post("/api/calculate", json={"user_input": "took the metro 11 km"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    for thread, _ in (running, queued):
+        thread.join(5)
+
+    # No worker left: 503
+    kill_worker(pool)
+    response = client.post("/api/calculate", json={"user_input": "took the metro 12 km"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
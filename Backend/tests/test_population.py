@@ -0,0 +1,42 @@
+import pytest
+
+from src.components import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "POPULATION_COHORTS", frozenset({"all", "students"}))
+    return app.app.test_client()
+
+
+def cohort_rows(cohort):
+    store = app.get_population_store()
+    store.flush()
+    return store._connect().execute("SELECT COUNT(*) FROM buckets WHERE cohort = ?", (cohort,)).fetchone()[0]
+
+
+def test_configured_cohort_is_counted(client):
+    response = client.post("/api/calculate", json={"user_input": "took the metro 10 km", "cohort": "students"})
+    assert response.status_code == 200
+    assert cohort_rows("students") > 0
+
+
+@pytest.mark.parametrize("cohort", ["teachers", "x" * 64, 42])
+def test_unknown_cohort_is_rejected_not_created(client, cohort):
+    response = client.post("/api/calculate", json={"user_input": "took the metro 10 km", "cohort": cohort})
+    assert response.status_code == 400
+    assert "unknown cohort" in response.get_json()["error"]
+    assert cohort_rows(cohort) == 0
+
+
+def test_population_endpoint_checks_the_cohort(client):
+    assert client.get("/api/population?cohort=students").status_code == 200
+    assert client.get("/api/population?cohort=all").status_code == 200
+    assert client.get("/api/population?cohort=teachers").status_code == 400
+
+
+def test_only_all_without_configuration():
+    assert app.parse_cohort("all") == "all"
+    assert app.parse_cohort(None) is None
+    with pytest.raises(ValueError):
+        app.parse_cohort("students")
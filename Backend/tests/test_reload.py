@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+
+import pytest
+
+from src.components import app
+
+
+@pytest.fixture
+def factors_file(tmp_path, monkeypatch):
+    path = tmp_path / "factors.json"
+    path.write_text(open(app.FACTORS_PATH, encoding="utf-8").read(), encoding="utf-8")
+    monkeypatch.setattr(app, "FACTORS_PATH", str(path))
+    monkeypatch.setattr(app, "factors_mtime", os.stat(path).st_mtime_ns)
+    # Restored afterwards, whatever the test swaps in
+    monkeypatch.setattr(app, "TABLES", app.TABLES)
+    monkeypatch.setattr(app, "CLAUSE_MEMO", None)
+    return path
+
+
+def edit_factors(path, version, metro):
+    factors = json.loads(path.read_text(encoding="utf-8"))
+    factors["version"] = version
+    factors["transport"]["public"]["metro"] = metro
+    path.write_text(json.dumps(factors), encoding="utf-8")
+    os.utime(path, ns=(0, app.factors_mtime + 1))
+
+
+def test_concurrent_reloads_swap_once(factors_file):
+    old = app.TABLES
+    edit_factors(factors_file, "reload-test", 1.0)
+    barrier = threading.Barrier(8)
+    outcomes = []
+
+    def reload():
+        barrier.wait()
+        outcomes.append(app.reload_factors_if_changed())
+
+    threads = [threading.Thread(target=reload) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(outcomes) == [False] * 7 + [True]
+    assert app.TABLES.factors.version == "reload-test"
+    assert app.TABLES.version != old.version
+    assert app.parse_input_to_data("took the metro 10 km")["transport_total"] == 10.0
+
+
+def test_parse_keeps_its_tables_through_a_reload(factors_file, monkeypatch):
+    old = app.TABLES
+    edit_factors(factors_file, "reload-test", 1.0)
+    extract = app.extract_clause_events
+
+    def reload_midway(doc, tables=None):
+        # Another thread reloads while this parse is extracting
+        app.reload_factors_if_changed()
+        return extract(doc, tables)
+
+    monkeypatch.setattr(app, "extract_clause_events", reload_midway)
+    result = app.parse_input_to_data("took the metro 10 km")
+    assert app.TABLES.factors.version == "reload-test"
+    assert result["factor_version"] == old.factors.version
+    assert result["transport_total"] == round(10 * old.factors.transport.factor("metro"), 2)
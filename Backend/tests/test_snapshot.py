@@ -0,0 +1,71 @@
+import json
+
+import pytest
+from spacy.matcher import PhraseMatcher
+
+from benchmarks.corpus import ALIAS_OVERLAPS, build_corpus, build_mixed_corpus
+from src.components import app
+from src.components.keywords import KeywordIndex
+from src.components.snapshot import build_matchers, build_snapshot, load_snapshot, save_snapshot, snapshot_key
+
+
+def read_aliases():
+    with open(app.file_path, "rb") as f:
+        content = f.read()
+    return content, json.loads(content.decode("utf-8"))
+
+
+def with_aliases(aliases, matchers, index):
+    tables = app.TABLES
+    return tables.with_aliases((aliases, matchers, index, tables.aliases_mtime, tables.aliases_digest))
+
+
+def fresh_tables(aliases):
+    # Straight from aliases.json, the way the matchers were built before snapshots
+    matchers = {}
+    for category, mapping in aliases.items():
+        matcher = PhraseMatcher(app.nlp.vocab, attr="LOWER")
+        for standard, variants in mapping.items():
+            matcher.add(standard, [app.nlp.make_doc(alias) for alias in variants])
+        matchers[category] = matcher
+    return with_aliases(aliases, matchers, KeywordIndex(app.pattern_keywords()))
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    content, aliases = read_aliases()
+    key = snapshot_key(content, app.factor_tables_json(), app.nlp)
+    path = str(tmp_path / "aliases.snapshot")
+    assert save_snapshot(path, build_snapshot(app.nlp, aliases, app.pattern_keywords(), key))
+    return path, key
+
+
+def test_snapshot_extraction_matches_fresh_build(snapshot_path, monkeypatch):
+    path, key = snapshot_path
+    loaded = load_snapshot(path, key)
+    assert loaded is not None
+    content, aliases = read_aliases()
+    texts = [alias for mapping in aliases.values() for variants in mapping.values() for alias in variants]
+    texts += build_corpus(200) + [text for _, text in build_mixed_corpus(10)] + ALIAS_OVERLAPS
+
+    monkeypatch.setattr(app, "CLAUSE_MEMO", None)
+    fresh = app.extract_activities([text.lower() for text in texts], tables=fresh_tables(aliases))
+
+    index = KeywordIndex.from_state(loaded["keywords"])
+    tables = with_aliases(loaded["aliases"], build_matchers(app.nlp, loaded), index)
+    from_snapshot = app.extract_activities([text.lower() for text in texts], tables=tables)
+
+    for text, expected, actual in zip(texts, fresh, from_snapshot):
+        assert actual == expected, text
+
+
+def test_snapshot_for_other_tables_is_ignored(snapshot_path):
+    path, key = snapshot_path
+    assert load_snapshot(path, "0" * len(key)) is None
+
+
+def test_unreadable_snapshot_is_ignored(snapshot_path):
+    path, key = snapshot_path
+    with open(path, "wb") as f:
+        f.write(b"not a pickle")
+    assert load_snapshot(path, key) is None
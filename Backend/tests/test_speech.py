@@ -0,0 +1,150 @@
+import threading
+import time
+import wave
+from io import BytesIO
+
+import pytest
+
+from src.components import app
+from src.components.speech import (SpeechBackendError, SpeechDeadlineExceeded, SpeechOverloaded, SpeechService,
+                                   StubBackend, load_audio)
+
+
+def wav_bytes(seconds=1.0, rate=16000):
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(bytes(range(1, 201)) * int(seconds * rate * 2 / 200))
+    return buffer.getvalue()
+
+
+AUDIO = load_audio(BytesIO(wav_bytes()))
+
+
+class GatedBackend(StubBackend):
+    """StubBackend whose recognitions wait for ``gate``, counting how many run at once."""
+
+    def __init__(self, fail=False):
+        super().__init__(text="took the metro 10 km")
+        self.gate = threading.Event()
+        self.fail = fail
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            self.gate.wait(5)
+            if self.fail:
+                raise SpeechBackendError("recognizer crashed")
+            return super().transcribe(audio)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+
+def in_background(function, *args):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function(*args)))
+    thread.start()
+    return thread, results
+
+
+def test_slots_bound_running_and_queued_recognitions():
+    backend = GatedBackend()
+    service = SpeechService(backend, max_workers=2, max_queue=1, timeout=5)
+    threads = [in_background(service.transcribe, AUDIO) for _ in range(3)]
+    wait_for(lambda: service.in_flight == 3)
+
+    with pytest.raises(SpeechOverloaded):
+        service.transcribe(AUDIO)
+    backend.gate.set()
+    for thread, results in threads:
+        thread.join(5)
+        assert results == ["took the metro 10 km"]
+    assert backend.max_running == 2
+    assert service.stats()["in_flight"] == 0
+    assert service.stats()["outcomes"] == {"ok": 3, "overloaded": 1}
+
+
+def test_segments_take_a_slot_each():
+    backend = StubBackend(text="metro 10 km")
+    service = SpeechService(backend, max_workers=1, max_queue=1, timeout=5)
+    with pytest.raises(SpeechOverloaded):
+        service.transcribe_segments([AUDIO] * 3)
+    # The slots taken before giving up are back
+    assert service.transcribe_segments([AUDIO] * 2) == "metro 10 km metro 10 km"
+
+
+def test_deadline_expiry_keeps_the_slot_until_recognition_ends():
+    service = SpeechService(StubBackend(delay=0.5), max_workers=1, max_queue=0, timeout=0.05)
+    with pytest.raises(SpeechDeadlineExceeded):
+        service.transcribe(AUDIO)
+    with pytest.raises(SpeechOverloaded):
+        service.transcribe(AUDIO)
+    wait_for(lambda: service.in_flight == 0)
+    service.timeout = 5
+    assert service.transcribe(AUDIO) == "took the metro 10 km"
+    assert service.stats()["outcomes"] == {"timeout": 1, "overloaded": 1, "ok": 1}
+
+
+def test_failed_recognition_frees_its_slot():
+    backend = GatedBackend(fail=True)
+    backend.gate.set()
+    service = SpeechService(backend, max_workers=1, max_queue=0, timeout=5)
+    for _ in range(2):
+        with pytest.raises(SpeechBackendError):
+            service.transcribe(AUDIO)
+    assert service.stats()["in_flight"] == 0
+    assert service.stats()["outcomes"] == {"error": 2}
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def post_audio(client):
+    return client.post("/recognize", data={"audio": (BytesIO(wav_bytes()), "speech.wav")},
+                       content_type="multipart/form-data")
+
+
+def test_recognize_route(client, monkeypatch):
+    monkeypatch.setattr(app, "speech_service", SpeechService(StubBackend(text="took the metro 10 km")))
+    response = post_audio(client)
+    assert response.status_code == 200
+    assert response.get_json() == {"text": "took the metro 10 km"}
+
+
+def test_recognize_route_is_503_when_overloaded(client, monkeypatch):
+    backend = GatedBackend()
+    service = SpeechService(backend, max_workers=1, max_queue=0, timeout=5)
+    monkeypatch.setattr(app, "speech_service", service)
+    thread, results = in_background(service.transcribe, AUDIO)
+    wait_for(lambda: service.in_flight == 1)
+    try:
+        response = post_audio(client)
+    finally:
+        backend.gate.set()
+        thread.join(5)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert results == ["took the metro 10 km"]
+
+
+def test_recognize_route_is_504_past_the_deadline(client, monkeypatch):
+    monkeypatch.setattr(app, "speech_service", SpeechService(StubBackend(delay=0.5), timeout=0.05))
+    response = post_audio(client)
+    assert response.status_code == 504